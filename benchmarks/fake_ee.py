@@ -0,0 +1,320 @@
+"""
+Minimal stand-in for the ``ee`` module, so the Earth Engine controllers can be
+benchmarked offline.
+
+Server-side calls are no-ops that return the same lazy object; ``getInfo`` of an
+image collection returns synthetic scenes produced by a ``scene_source`` callable
+for the geometry the collection was filtered to. Only the client-side work of the
+controllers (request building, parsing and resampling) is therefore measured.
+
+The per-field path of ``HLSMultiField`` is evaluated client-side instead: ``flatten``
+applies the mapped functions to one image per scene date, ``reduceRegions`` reads the
+value of every feature from the scene source of its geometry, and feature collections
+support ``map``, ``filter``, ``size`` and ``toList``. Every statistic of a band is its
+scene value ('count' is 1), and the valid fraction is the optional 'valid_fraction'
+column of the scenes (1 otherwise).
+
+``FlakyEndpoint`` simulates the latency and the throttling (HTTP 429) errors of the
+Earth Engine API for the request scheduler.
+"""
+import functools
+import json
+import sys
+import threading
+import time
+import types
+from collections import Counter
+
+
+class FakeObject:
+    """Lazy server-side object: every chained call returns itself."""
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def getInfo(self):
+        return None
+
+
+class FakeGeometry(FakeObject):
+    def __init__(self, coordinates, *args, **kwargs):
+        super().__init__(coordinates)
+        self.coordinates = coordinates
+
+    def serialize(self):
+        return json.dumps(self.coordinates)
+
+
+class FakeImageCollection(FakeObject):
+    scene_source = None
+
+    def __init__(self, collection_id=None):
+        super().__init__(collection_id)
+        self.geometry = None
+        self.functions = []
+
+    def filterBounds(self, geometry):
+        self.geometry = geometry
+        return self
+
+    def map(self, function):
+        self.functions.append(function)
+        return self
+
+    def flatten(self):
+        parts = getattr(self.geometry, 'parts', None) or [self.geometry]
+        dates = sorted({date for part in parts for date in self.scene_source(part)['date']})
+        features = []
+        for date in dates:
+            image = FakeImage(self.scene_source, f'HLS_{date}T000000', date)
+            result = image
+            for function in self.functions:
+                result = function(result)
+            features.extend(result.features)
+        return FakeFeatureCollection(features)
+
+    def getInfo(self):
+        scenes = self.scene_source(self.geometry)
+        return {'features': [{'id': scene_id, 'properties': {'NDVI': ndvi}}
+                             for scene_id, ndvi in zip(scenes['id'], scenes['ndvi'])]}
+
+
+class FakeImage(FakeObject):
+    """One scene date; band math returns the image itself, ``select`` and ``mask`` return views of it."""
+
+    def __init__(self, scene_source, scene_id, date, bands=(), masked=False):
+        super().__init__(scene_id)
+        self.scene_source = scene_source
+        self.scene_id = scene_id
+        self.date = date
+        self.bands = tuple(bands)
+        self.masked = masked
+
+    def select(self, bands):
+        bands = [bands] if isinstance(bands, str) else bands
+        return FakeImage(self.scene_source, self.scene_id, self.date, bands, self.masked)
+
+    def mask(self):
+        return FakeImage(self.scene_source, self.scene_id, self.date, self.bands, masked=True)
+
+    def get(self, name):
+        return {'system:index': self.scene_id, 'system:time_start': self.date}.get(name)
+
+    def value(self, scenes, band, statistic):
+        """Value of a band statistic in the scene rows of one geometry, or None when it was not observed."""
+        rows = scenes[scenes['date'] == self.date]
+        if rows.empty:
+            return None
+        if self.masked:
+            return float(rows['valid_fraction'].iloc[0]) if 'valid_fraction' in rows else 1.0
+        column = 'ndvi' if band == 'NDVI' else band.lower()
+        if column not in rows:
+            return None
+        return 1 if statistic == 'count' else float(rows[column].iloc[0])
+
+    def reduceRegions(self, collection, reducer, scale=None, **kwargs):
+        # Properties are named like Earth Engine's: reducer outputs for one band, band names for one
+        # output, '<band>_<output>' otherwise
+        outputs = list(zip(reducer.statistics, reducer.outputs))
+        features = []
+        for feature in collection.features:
+            scenes = self.scene_source(feature.geometry)
+            properties = dict(feature.properties)
+            for band in self.bands:
+                for statistic, output in outputs:
+                    if len(self.bands) == 1:
+                        key = output
+                    elif len(outputs) == 1:
+                        key = band
+                    else:
+                        key = f'{band}_{output}'
+                    properties[key] = self.value(scenes, band, statistic)
+            features.append(FakeFeature(feature.geometry, properties))
+        return FakeFeatureCollection(features)
+
+
+class FakeReducer(FakeObject):
+    def __init__(self, statistics, outputs=None):
+        super().__init__(statistics)
+        self.statistics = list(statistics)
+        self.outputs = list(outputs or statistics)
+
+    def combine(self, reducer2, sharedInputs=False):
+        return FakeReducer(self.statistics + reducer2.statistics, self.outputs + reducer2.outputs)
+
+    def setOutputs(self, outputs):
+        return FakeReducer(self.statistics, outputs)
+
+
+class FakeDate(FakeObject):
+    """Wraps a 'YYYYMMDD' date; ``format`` returns it whatever the pattern."""
+
+    def __init__(self, date, *args, **kwargs):
+        super().__init__(date)
+        self.date = date
+
+    def format(self, pattern=None):
+        return self.date
+
+
+class FakeFilter(FakeObject):
+    """Client-side predicate on feature properties; other filters keep every feature."""
+
+    def __init__(self, predicate=None):
+        super().__init__(predicate)
+        self.predicate = predicate or (lambda properties: True)
+
+    @classmethod
+    def everything(cls, *args, **kwargs):
+        return cls()
+
+    @classmethod
+    def not_null(cls, names):
+        return cls(lambda properties: all(properties.get(name) is not None for name in names))
+
+    @classmethod
+    def gte(cls, name, value):
+        return cls(lambda properties: properties.get(name) is not None and properties[name] >= value)
+
+
+class FakeFeature(FakeObject):
+    def __init__(self, geometry=None, properties=None):
+        super().__init__(geometry, properties)
+        self.geometry = geometry
+        self.properties = dict(properties or {})
+
+    def get(self, name):
+        return self.properties.get(name)
+
+    def info(self, index):
+        return {'type': 'Feature', 'geometry': None, 'id': str(index), 'properties': self.properties}
+
+
+class FakeFeatureCollection(FakeObject):
+    def __init__(self, features=None, *args, **kwargs):
+        super().__init__(features)
+        self.features = list(features or [])
+
+    def geometry(self):
+        geometry = FakeGeometry([feature.geometry.coordinates for feature in self.features])
+        geometry.parts = [feature.geometry for feature in self.features]
+        return geometry
+
+    def map(self, function):
+        return FakeFeatureCollection([function(feature) for feature in self.features])
+
+    def filter(self, condition):
+        return FakeFeatureCollection([feature for feature in self.features if condition.predicate(feature.properties)])
+
+    def size(self):
+        return FakeValue(len(self.features))
+
+    def toList(self, count, offset=0):
+        return FakeValue([feature.info(index) for index, feature
+                          in enumerate(self.features[offset:offset + count], start=offset)])
+
+
+class FakeValue(FakeObject):
+    """Server-side value whose ``getInfo`` returns it."""
+
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+
+    def getInfo(self):
+        return self.value
+
+
+def build_module(scene_source):
+    """
+    Builds the fake ``ee`` module.
+
+    Args:
+        scene_source (callable): Returns the per-scene DataFrame ('id' and 'ndvi' columns) of a geometry.
+
+    Returns:
+        types.ModuleType: The module.
+    """
+    ee = types.ModuleType('ee')
+    ee.FAKE = True
+    ee.ImageCollection = type('ImageCollection', (FakeImageCollection,), {'scene_source': staticmethod(scene_source)})
+    ee.Geometry = types.SimpleNamespace(Polygon=FakeGeometry)
+    ee.Feature = FakeFeature
+    ee.FeatureCollection = FakeFeatureCollection
+    ee.Image = FakeObject
+    ee.Date = FakeDate
+    ee.Filter = types.SimpleNamespace(date=FakeFilter.everything, notNull=FakeFilter.not_null, gte=FakeFilter.gte)
+    ee.Reducer = types.SimpleNamespace(median=lambda: FakeReducer(['median']), mean=lambda: FakeReducer(['mean']),
+                                       count=lambda: FakeReducer(['count']))
+    ee.Initialize = lambda *args, **kwargs: None
+    return ee
+
+
+def install(scene_source):
+    """
+    Installs the fake ``ee`` module in ``sys.modules``; call it before importing the controllers.
+
+    Returns:
+        types.ModuleType: The installed module.
+    """
+    existing = sys.modules.get('ee')
+    if existing is not None and not getattr(existing, 'FAKE', False):
+        raise RuntimeError("The real 'ee' module is already imported; install the fake before the controllers")
+    if existing is not None:
+        # The controllers keep a reference to the module imported first; only swap its scene source
+        existing.ImageCollection.scene_source = staticmethod(scene_source)
+        return existing
+    sys.modules['ee'] = build_module(scene_source)
+    return sys.modules['ee']
+
+
+class FlakyEndpoint:
+    """
+    Simulated Earth Engine endpoint: every call sleeps for ``latency`` seconds and the
+    first calls of each key fail with a throttling error.
+
+    Attributes:
+        calls (list): ``(key, time.monotonic())`` of every call, in start order.
+        attempts (Counter): Number of calls by key.
+        max_active (int): Largest number of calls running at once.
+    """
+
+    def __init__(self, latency=0.01, failures=0, message='429 Too Many Requests'):
+        """
+        Args:
+            latency (float): Duration of every call, in seconds.
+            failures (int or dict): Number of failing calls per key, or by key (missing keys never fail).
+            message (str): Message of the raised errors.
+        """
+        self.latency = latency
+        self.failures = failures
+        self.message = message
+        self.calls = []
+        self.attempts = Counter()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def request(self, key, result=None):
+        """Returns the blocking call without arguments for ``key``; it returns ``result`` (default ``key``)."""
+        return functools.partial(self.call, key, key if result is None else result)
+
+    def call(self, key, result):
+        with self.lock:
+            self.attempts[key] += 1
+            attempt = self.attempts[key]
+            self.calls.append((key, time.monotonic()))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.latency)
+            failures = self.failures.get(key, 0) if isinstance(self.failures, dict) else self.failures
+            if attempt <= failures:
+                raise RuntimeError(self.message)
+            return result
+        finally:
+            with self.lock:
+                self.active -= 1
@@ -0,0 +1,132 @@
+"""
+Measures the import time of the toolkit modules and checks the layer boundaries.
+
+Every module is imported in a fresh interpreter (``--repeat`` times, keeping the
+fastest run), which records the import time and the heavy libraries it pulled
+in. The compute core must not load any of ``FORBIDDEN``, so a worker that only
+smooths and computes metrics never pays for pandas, Earth Engine or plotly:
+
+    python -m benchmarks.import_time --output import_times.json
+    python -m benchmarks.import_time --compare import_times.json --tolerance 0.5  # exits with 1 on a regression
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+# Heavy libraries tracked in every import
+HEAVY = ('numpy', 'pandas', 'scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly', 'pyarrow', 'rasterio')
+
+# Module -> heavy libraries it must not load
+FORBIDDEN = {
+    'src.controllers': ('numpy', 'pandas', 'scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly'),
+    'src.controllers.smoothing': ('pandas', 'scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly'),
+    'src.controllers.phenology_batch': ('pandas', 'scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly'),
+    'src.controllers.metrics_geometrics': ('pandas', 'scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly'),
+    'src.controllers.cli': ('numpy', 'pandas', 'scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly'),
+    'src.controllers.seasons': ('scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly'),
+    'src.controllers.incremental': ('scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly'),
+    'src.controllers.sweep': ('scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly'),
+    'src.controllers.results_store': ('pandas', 'scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly', 'pyarrow'),
+    'src.controllers.local_hls': ('scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly', 'rasterio'),
+    'src.controllers.series_store': ('scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly'),
+    # Compute workers import the runner to unpickle ``compute_field``
+    'src.controllers.batch_runner': ('scipy', 'ee', 'geopandas', 'fiona', 'shapely', 'plotly'),
+}
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(repr((elapsed * 1000, [name for name in {heavy!r} if name in sys.modules])))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module, repeat=5):
+    """
+    Imports ``module`` in ``repeat`` fresh interpreters.
+
+    Returns:
+        dict: 'module', the fastest 'import_ms' and the 'loaded' heavy libraries.
+    """
+    best, loaded = None, []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        elapsed, loaded = ast.literal_eval(output.strip().splitlines()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return {'module': module, 'import_ms': best, 'loaded': loaded}
+
+
+def violations(results):
+    """Lists the forbidden libraries loaded by each module."""
+    found = []
+    for result in results:
+        loaded = sorted(set(result['loaded']) & set(FORBIDDEN[result['module']]))
+        if loaded:
+            found.append({'module': result['module'], 'loaded': loaded})
+    return found
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Compares import times against a previous run.
+
+    Returns:
+        list: Modules slower than the baseline by more than ``tolerance`` (a fraction).
+    """
+    with open(baseline_path) as file:
+        baseline = {result['module']: result for result in json.load(file)['results']}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['module'])
+        if previous is None:
+            continue
+        ratio = result['import_ms'] / previous['import_ms']
+        if ratio > 1 + tolerance:
+            regressions.append({'module': result['module'], 'baseline_ms': previous['import_ms'],
+                                'current_ms': result['import_ms'], 'ratio': ratio})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the import time of the toolkit modules.")
+    parser.add_argument('--modules', nargs='+', default=list(FORBIDDEN), choices=list(FORBIDDEN))
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per module (fastest is kept)")
+    parser.add_argument('--output', default=None, help="JSON file for the results (stdout if omitted)")
+    parser.add_argument('--compare', default=None, help="Previous results to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="Allowed slowdown before failing")
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in args.modules:
+        result = measure(module, args.repeat)
+        results.append(result)
+        print(f"{module:<36} {result['import_ms']:8.1f} ms  {' '.join(result['loaded'])}", file=sys.stderr)
+
+    report = {'python': sys.version.split()[0], 'results': results, 'violations': violations(results)}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    failed = False
+    for violation in report['violations']:
+        print(f"LAYER VIOLATION {violation}", file=sys.stderr)
+        failed = True
+    if args.compare:
+        for regression in compare(results, args.compare, args.tolerance):
+            print(f"REGRESSION {regression}", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
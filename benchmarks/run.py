@@ -0,0 +1,301 @@
+"""
+Benchmarks every stage of the pipeline on synthetic data and writes the results to JSON.
+
+Each stage is timed (wall and CPU) and, in a second pass, memory-profiled with
+``tracemalloc``, so the profiler does not inflate the timings. Per-field stages
+(the DataFrame-based controllers and the plotter) run on at most
+``--max-per-field`` fields and report their cost per field; batch stages always
+run on every field:
+
+    python -m benchmarks.run --sizes 1 1000 100000 --output benchmarks/results.json
+    python -m benchmarks.run --sizes 1000 --compare benchmarks/results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from . import fake_ee
+from .synthetic import observation_matrix, scene_table, synthetic_geopackage, synthetic_hls_scenes, synthetic_ndvi
+
+# Synthetic scenes served by the fake Earth Engine, by serialized geometry
+SCENES = {}
+ee = fake_ee.install(lambda geometry: SCENES[geometry.serialize()])
+
+from src.controllers.batch_runner import compute_field  # noqa: E402
+from src.controllers.geometry import ProcessadorGeoDataFrame  # noqa: E402
+from src.controllers.local_hls import LocalHLS  # noqa: E402
+from src.controllers.metrics_bos_eso import BosEosMetrics  # noqa: E402
+from src.controllers.metrics_geometrics import BatchPhenologyMetrics, PhenologyMetrics  # noqa: E402
+from src.controllers.metrics_vos_pos import VosPosMetrics  # noqa: E402
+from src.controllers.phenology_batch import BatchPhenology, PhenologyEvents, day_numbers  # noqa: E402
+from src.controllers.smoothing import SavitzkyGolaySmoother, WhittakerSmoother, fill_gaps  # noqa: E402
+from src.controllers.sweep import ParameterSweep  # noqa: E402
+from src.controllers.time_series_hls import HLS  # noqa: E402
+
+PARAMS = {'window_size': 30, 'poly_order': 3, 'order_ndvi': 5, 'threshold': 0.5}
+# Grid of the parameter_sweep stage (2 smoothings x 3 orders x 4 thresholds)
+SWEEP = {'smoothing': [(21, 2), (31, 3)], 'orders': [5, 10, 20], 'thresholds': [0.35, 0.45, 0.5, 0.55]}
+
+
+def measure(function, memory=True):
+    """
+    Runs ``function`` once for timing and, if ``memory`` is set, once more under ``tracemalloc``.
+
+    Returns:
+        tuple: (result of the timed run, dict with 'wall_s', 'cpu_s' and 'peak_mb').
+    """
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = function()
+    stats = {'wall_s': time.perf_counter() - wall, 'cpu_s': time.process_time() - cpu, 'peak_mb': None}
+
+    if memory:
+        tracemalloc.start()
+        function()
+        stats['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result, stats
+
+
+class Benchmark:
+    """
+    Builds the synthetic inputs of one run size and benchmarks every stage on them.
+
+    Attributes:
+        n_fields (int): Number of synthetic fields.
+        sample (int): Number of fields run through the per-field stages.
+        results (list): One dict per benchmarked stage.
+    """
+
+    def __init__(self, n_fields, workdir, max_per_field=1000, max_plots=50, n_days=212, memory=True, seed=0):
+        self.n_fields = n_fields
+        self.workdir = workdir
+        self.sample = min(n_fields, max_per_field)
+        self.max_plots = min(n_fields, max_plots)
+        self.memory = memory
+        self.results = []
+        self.dates, self.curves, self.observed = synthetic_ndvi(n_fields, n_days=n_days, seed=seed)
+
+    def record(self, stage, fields, stats, failures=0):
+        """Stores the statistics of one stage, with its per-field cost and extrapolated total."""
+        per_field = stats['wall_s'] / fields if fields else None
+        self.results.append({
+            'stage': stage,
+            'fields': self.n_fields,
+            'fields_measured': fields,
+            'failures': failures,
+            **stats,
+            'wall_ms_per_field': None if per_field is None else per_field * 1000,
+            'wall_s_extrapolated': None if per_field is None else per_field * self.n_fields,
+        })
+        print(f"{self.n_fields:>7} fields  {stage:<28} {stats['wall_s']:9.3f} s  "
+              f"({fields} measured, {failures} failed)", file=sys.stderr)
+
+    def run_stage(self, stage, fields, function):
+        """Measures a stage; ``function`` returns its output and a failure count."""
+        (output, failures), stats = measure(function, self.memory)
+        self.record(stage, fields, stats, failures)
+        return output
+
+    def per_field(self, function, items):
+        """Applies ``function`` to every item, counting the items that raise."""
+        outputs, failures = [], 0
+        for item in items:
+            try:
+                outputs.append(function(item))
+            except (ValueError, KeyError, IndexError):
+                outputs.append(None)
+                failures += 1
+        return outputs, failures
+
+    def run(self):
+        """Runs every stage and returns the list of results."""
+        path = os.path.join(self.workdir, f'fields_{self.n_fields}.gpkg')
+        synthetic_geopackage(path, self.n_fields)
+        self.run_stage('geometry_load', self.n_fields, lambda: (self.load_polygons(path), 0))
+
+        fields = range(self.sample)
+        geometries = []
+        for field in fields:
+            geometry = ee.Geometry.Polygon([[[field, 0.0]]])
+            SCENES[geometry.serialize()] = scene_table(self.dates, self.observed[field], field)
+            geometries.append(geometry)
+        start, end = str(self.dates[0].date()), str(self.dates[-1].date())
+        frames = self.run_stage('convert_to_dataframe', self.sample, lambda: self.per_field(
+            lambda geometry: HLS(geometry, start, end).convert_to_dataframe(), geometries))
+        observation_frames = self.run_stage('convert_to_dataframe_observations', self.sample, lambda: self.per_field(
+            lambda geometry: HLS(geometry, start, end).convert_to_dataframe(daily=False), geometries))
+        SCENES.clear()
+        self.run_local_hls()
+
+        smoother = SavitzkyGolaySmoother(PARAMS['window_size'], PARAMS['poly_order'])
+        frames = self.run_stage('smoothing_per_field', self.sample, lambda: self.per_field(
+            lambda df: smoother.smooth_dataframe(df.copy()), frames))
+        daily = fill_gaps(self.observed)
+        smoothed = self.run_stage('smoothing_savitzky_golay', self.n_fields, lambda: (smoother.smooth(daily), 0))
+        self.run_stage('smoothing_whittaker', self.n_fields,
+                       lambda: (WhittakerSmoother().smooth(self.observed), 0))
+
+        phenology = self.run_stage('vos_pos_metrics', self.sample, lambda: self.per_field(
+            lambda df: VosPosMetrics(df, PARAMS['order_ndvi']).analyze_phenology(), frames))
+        pairs = [(df, phenology_df) for df, phenology_df in zip(frames, phenology) if phenology_df is not None]
+        phenology = self.run_stage('bos_eos_metrics', len(pairs), lambda: self.per_field(
+            lambda pair: BosEosMetrics(pair[0], pair[1], PARAMS['threshold']).execute_analysis(), pairs))
+        pairs = [(df, phenology_df) for (df, _), phenology_df in zip(pairs, phenology) if phenology_df is not None]
+        metrics = self.run_stage('phenology_metrics', len(pairs), lambda: self.per_field(
+            lambda pair: PhenologyMetrics(pair[1].copy(), pair[0]).derivate_metrics(), pairs))
+
+        self.run_plotter(pairs, metrics)
+
+        engine = BatchPhenology(self.dates, daily, smoothed, order_ndvi=PARAMS['order_ndvi'],
+                                threshold=PARAMS['threshold'])
+        events = self.run_stage('batch_phenology', self.n_fields, lambda: (engine.execute_analysis(), 0))
+        records = PhenologyEvents.from_indexes(engine.dates, engine.smoothed, events)
+        self.run_stage('batch_phenology_metrics', self.n_fields,
+                       lambda: (BatchPhenologyMetrics(records, engine.dates, smoothed).compute(), 0))
+        self.run_stage('parameter_sweep', self.n_fields,
+                       lambda: (ParameterSweep(self.dates, daily, **SWEEP).run(), 0))
+        self.run_observations(smoother, frames, observation_frames)
+        return self.results
+
+    def run_observations(self, smoother, daily_frames, frames):
+        """Runs the smoothing and phenology stages on the observation dates only (no daily resampling)."""
+        self.run_stage('field_pipeline', self.sample, lambda: self.per_field(
+            lambda df: compute_field(None, df.copy(), **PARAMS), [df for df in daily_frames if df is not None]))
+        self.run_stage('field_pipeline_observations', self.sample, lambda: self.per_field(
+            lambda df: compute_field(None, df.copy(), **PARAMS), [df for df in frames if df is not None]))
+
+        dates, values = observation_matrix(self.dates, self.observed)
+        days = day_numbers(dates)
+        smoothed = self.run_stage('smoothing_savitzky_golay_observations', self.n_fields,
+                                  lambda: (smoother.smooth(values, days=days), 0))
+        engine = BatchPhenology(dates, values, smoothed, order_ndvi=PARAMS['order_ndvi'],
+                                threshold=PARAMS['threshold'])
+        events = self.run_stage('batch_phenology_observations', self.n_fields,
+                                lambda: (engine.execute_analysis(), 0))
+        records = PhenologyEvents.from_indexes(engine.dates, engine.smoothed, events)
+        self.run_stage('batch_phenology_metrics_observations', self.n_fields,
+                       lambda: (BatchPhenologyMetrics(records, engine.dates, smoothed).compute(), 0))
+
+    def load_polygons(self, path):
+        """Loads the GeoPackage and formats the vertices of every polygon."""
+        processador = ProcessadorGeoDataFrame(path)
+        return sum(1 for _ in processador.iterar_poligonos())
+
+    def run_local_hls(self):
+        """Extracts the sample fields from synthetic local HLS scenes in one pass; skipped without rasterio."""
+        try:
+            import rasterio  # noqa: F401
+        except ImportError:
+            print("rasterio is not installed; skipping the local_hls stage", file=sys.stderr)
+            return
+
+        directory = os.path.join(self.workdir, f'tiles_{self.n_fields}')
+        polygons, crs = synthetic_hls_scenes(directory, self.dates, self.observed[:self.sample])
+        self.run_stage('local_hls', self.sample,
+                       lambda: (LocalHLS(directory, polygons, crs=crs).convert_to_dataframe(), 0))
+
+    def run_plotter(self, pairs, metrics):
+        """Builds (without rendering) the figure of the first fields; skipped without plotly."""
+        try:
+            from src.controllers.plotter_base import PhenologyPlotter
+        except ImportError:
+            print("plotly is not installed; skipping the plotter stage", file=sys.stderr)
+            return
+
+        items = [(df.copy(), phenology_df) for (df, _), phenology_df in zip(pairs, metrics)
+                 if phenology_df is not None][:self.max_plots]
+        self.run_stage('phenology_plotter', len(items), lambda: self.per_field(
+            lambda item: PhenologyPlotter(item[0], item[1].copy()).plot_data(), items))
+
+
+def environment():
+    """Describes the interpreter, library versions and source revision of the run."""
+    import pandas
+
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pandas.__version__,
+        'params': PARAMS,
+        'sweep': SWEEP,
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Compares per-field wall times against a previous run.
+
+    Returns:
+        list: Descriptions of the stages that got slower than ``1 + tolerance`` times the baseline.
+    """
+    with open(baseline_path) as file:
+        baseline = {(entry['stage'], entry['fields']): entry for entry in json.load(file)['results']}
+
+    regressions = []
+    for entry in results:
+        previous = baseline.get((entry['stage'], entry['fields']))
+        if not previous or not previous['wall_ms_per_field'] or entry['wall_ms_per_field'] is None:
+            continue
+        ratio = entry['wall_ms_per_field'] / previous['wall_ms_per_field']
+        print(f"{entry['fields']:>7} fields  {entry['stage']:<28} x{ratio:5.2f}", file=sys.stderr)
+        if ratio > 1 + tolerance:
+            regressions.append(f"{entry['stage']} ({entry['fields']} fields): {ratio:.2f}x slower")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 1000, 100000], help="Numbers of fields")
+    parser.add_argument('--output', default=None, help="JSON file for the results (default: stdout)")
+    parser.add_argument('--max-per-field', type=int, default=1000,
+                        help="Fields run through each per-field stage")
+    parser.add_argument('--max-plots', type=int, default=50, help="Fields run through the plotter")
+    parser.add_argument('--days', type=int, default=212, help="Length of the daily series")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compare', default=None, help="Previous results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed relative slowdown per field before --compare fails")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_fields in args.sizes:
+            benchmark = Benchmark(n_fields, workdir, max_per_field=args.max_per_field, max_plots=args.max_plots,
+                                  n_days=args.days, memory=not args.no_memory, seed=args.seed)
+            results.extend(benchmark.run())
+
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def double_logistic(days, base, amplitude, sos, sos_rate, eos, eos_rate):
+    """
+    Evaluates a double-logistic NDVI season.
+
+    Args:
+        days (np.ndarray): Day offsets from the start of the series, shape (days,).
+        base, amplitude, sos, sos_rate, eos, eos_rate (np.ndarray): Per-field parameters, shape (fields, 1):
+            background NDVI, seasonal amplitude, start/end of season (day offsets) and the slope of each transition.
+
+    Returns:
+        np.ndarray: NDVI matrix (fields x days).
+    """
+    green_up = 1.0 / (1.0 + np.exp(-sos_rate * (days - sos)))
+    senescence = 1.0 / (1.0 + np.exp(eos_rate * (days - eos)))
+    return base + amplitude * (green_up + senescence - 1.0)
+
+
+def synthetic_ndvi(n_fields, start_date='2022-10-01', n_days=212, revisit=4, noise=0.03,
+                   cloud_probability=0.3, seed=0):
+    """
+    Generates one noisy, cloud-gapped double-logistic season per field.
+
+    Observations are taken every ``revisit`` days (with a random phase per field),
+    Gaussian noise is added and each observation is lost to clouds with
+    probability ``cloud_probability``.
+
+    Returns:
+        tuple[pd.DatetimeIndex, np.ndarray, np.ndarray]: Daily dates, the clean daily curves
+        (fields x days) and the observed values (fields x days, NaN where there is no scene).
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_date, periods=n_days, freq='D')
+    days = np.arange(n_days, dtype=float)
+
+    def parameter(low, high):
+        return rng.uniform(low, high, size=(n_fields, 1))
+
+    curves = double_logistic(days,
+                             base=parameter(0.15, 0.3),
+                             amplitude=parameter(0.4, 0.6),
+                             sos=parameter(0.2, 0.35) * n_days,
+                             sos_rate=parameter(0.08, 0.15),
+                             eos=parameter(0.55, 0.7) * n_days,
+                             eos_rate=parameter(0.08, 0.15))
+
+    phase = rng.integers(0, revisit, size=(n_fields, 1))
+    scene = (days.astype(int) - phase) % revisit == 0
+    clear = rng.random((n_fields, n_days)) >= cloud_probability
+    observed = curves + rng.normal(0.0, noise, size=curves.shape)
+    observed = np.where(scene & clear, observed, np.nan)
+    return dates, curves, observed
+
+
+def scene_table(dates, observed_row, field_id=0):
+    """
+    Converts one field's observations into the per-scene rows returned by ``HLS.fetch_scenes``.
+
+    Returns:
+        pd.DataFrame: 'date' (YYYYMMDD), 'id' and 'ndvi' columns, one row per observation.
+    """
+    valid = ~np.isnan(observed_row)
+    stamps = dates[valid].strftime('%Y%m%d')
+    return pd.DataFrame({
+        'date': stamps,
+        'id': [f'HLS_{stamp}T000000_{field_id}' for stamp in stamps],
+        'ndvi': observed_row[valid],
+    })
+
+
+def observation_matrix(dates, observed):
+    """
+    Keeps only the observation dates of every field, left-aligned.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Per-field observation dates (fields x max observations,
+        datetime64 with NaT padding) and their values (NaN padding).
+    """
+    valid = ~np.isnan(observed)
+    width = int(valid.sum(axis=1).max(initial=0))
+    order = np.argsort(~valid, axis=1, kind='stable')[:, :width]
+    kept = np.take_along_axis(valid, order, axis=1)
+    axis = np.asarray(dates, dtype='datetime64[ns]')
+    return (np.where(kept, axis[order], np.datetime64('NaT')),
+            np.where(kept, np.take_along_axis(observed, order, axis=1), np.nan))
+
+
+def synthetic_geopackage(path, n_polygons, bounds=(-56.0, -14.0, -54.0, -12.0), multipart_fraction=0.05, seed=0):
+    """
+    Writes a GeoPackage with ``n_polygons`` random field polygons.
+
+    Fields are irregular hexagons of roughly 20-80 ha; a fraction of the rows are
+    two-part multipolygons, like the ones ``ProcessadorGeoDataFrame`` explodes.
+
+    Args:
+        path (str): Output .gpkg file.
+        n_polygons (int): Number of rows.
+        bounds (tuple): (minx, miny, maxx, maxy) of the area in EPSG:4326.
+        multipart_fraction (float): Fraction of rows written as multipolygons.
+        seed (int): Random seed.
+
+    Returns:
+        str: ``path``.
+    """
+    import geopandas as gpd
+    from shapely import multipolygons, polygons
+
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = bounds
+    centers = np.column_stack([rng.uniform(minx, maxx, n_polygons), rng.uniform(miny, maxy, n_polygons)])
+    radius = rng.uniform(0.003, 0.006, size=(n_polygons, 1))
+
+    angles = np.linspace(0, 2 * np.pi, 7)[:-1] + rng.uniform(0, 0.3, size=(n_polygons, 6))
+    ring = np.stack([centers[:, :1] + radius * np.cos(angles), centers[:, 1:] + radius * np.sin(angles)], axis=-1)
+    ring = np.concatenate([ring, ring[:, :1]], axis=1)
+    shapes = polygons(ring)
+
+    multipart = np.flatnonzero(rng.random(n_polygons) < multipart_fraction)
+    shifted = polygons(ring[multipart] + 3 * radius[multipart, :, None])
+    shapes = shapes.astype(object)
+    shapes[multipart] = multipolygons(np.column_stack([shapes[multipart], shifted]))
+
+    gdf = gpd.GeoDataFrame({'field': np.arange(n_polygons)}, geometry=shapes, crs='epsg:4326')
+    gdf.to_file(path, driver='GPKG')
+    return path
+
+
+def synthetic_hls_scenes(directory, dates, observed, field_pixels=4, crs='EPSG:32722', origin=(600000.0, 7500000.0),
+                         pixel_noise=0.01, seed=0):
+    """
+    Writes one HLS L30 tile of synthetic scenes (B04, B05 and Fmask GeoTIFFs) for ``LocalHLS``.
+
+    Every field is a square block of ``field_pixels`` x ``field_pixels`` 30 m pixels,
+    separated from its neighbours by one background pixel. A scene is written for
+    every date with at least one observation; in it, the pixels of a field hold its
+    observed NDVI plus Gaussian noise, or have the Fmask cloud bit set where the
+    field has no observation.
+
+    Args:
+        directory (str): Output directory.
+        dates (pd.DatetimeIndex): Daily dates of ``observed``.
+        observed (np.ndarray): Observed NDVI (fields x days, NaN where there is no scene), as
+            returned by ``synthetic_ndvi``.
+        field_pixels (int): Side of every field in pixels.
+        crs (str): Projected CRS of the tile.
+        origin (tuple): Upper-left corner of the tile in ``crs``.
+        pixel_noise (float): Standard deviation of the per-pixel NDVI noise.
+        seed (int): Random seed.
+
+    Returns:
+        tuple[list, str]: (field ID, vertices) pairs in ``crs`` and ``crs``.
+    """
+    import rasterio
+    from rasterio.transform import from_origin
+
+    rng = np.random.default_rng(seed)
+    n_fields = observed.shape[0]
+    per_row = int(np.ceil(np.sqrt(n_fields)))
+    block = field_pixels + 1
+    size = per_row * block + 1
+    transform = from_origin(origin[0], origin[1], 30.0, 30.0)
+
+    # Field of every pixel (-1 for the background)
+    field_of = np.full((size, size), -1)
+    polygons = []
+    for field in range(n_fields):
+        row, column = 1 + (field // per_row) * block, 1 + (field % per_row) * block
+        field_of[row:row + field_pixels, column:column + field_pixels] = field
+        # Vertices a quarter pixel inside the block, so exactly the block's pixel centers fall inside
+        left, top = transform * (column + 0.25, row + 0.25)
+        right, bottom = transform * (column + field_pixels - 0.25, row + field_pixels - 0.25)
+        polygons.append((field, [[left, top], [right, top], [right, bottom], [left, bottom], [left, top]]))
+
+    os.makedirs(directory, exist_ok=True)
+    profile = {'driver': 'GTiff', 'width': size, 'height': size, 'count': 1, 'crs': crs, 'transform': transform,
+               'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'deflate'}
+    inside = field_of >= 0
+    for day in np.flatnonzero(~np.isnan(observed).all(axis=0)):
+        values = observed[field_of[inside], day]
+        ndvi = np.full((size, size), 0.2)
+        ndvi[inside] = np.clip(np.nan_to_num(values, nan=0.2) + rng.normal(0.0, pixel_noise, len(values)), -0.9, 0.9)
+        red = np.full((size, size), 800, dtype=np.int16)
+        nir = np.round(red * (1 + ndvi) / (1 - ndvi)).astype(np.int16)
+        fmask = np.zeros((size, size), dtype=np.uint8)
+        fmask[inside] = np.where(np.isnan(values), 1 << 1, 0)
+
+        scene = f"HLS.L30.T22JBT.{dates[day].strftime('%Y%j')}T133000.v2.0"
+        for band, data, nodata in (('B04', red, -9999), ('B05', nir, -9999), ('Fmask', fmask, 255)):
+            with rasterio.open(os.path.join(directory, f'{scene}.{band}.tif'), 'w', dtype=data.dtype,
+                               nodata=nodata, **profile) as dst:
+                dst.write(data, 1)
+    return polygons, crs
@@ -0,0 +1,73 @@
+"""
+NDVI phenology controllers.
+
+The package is split in layers so that a worker only imports what it uses:
+
+    compute core (NumPy only)   smoothing, phenology_batch, metrics_geometrics, instrumentation
+    tables                      seasons, incremental, sweep, series_store, results_store (pyarrow),
+                                and the DataFrame-based hls_scenes,
+                                metrics_vos_pos / metrics_bos_eso (pandas)
+    I/O                         time_series_hls, cache_hls, ee_scheduler (Earth Engine),
+                                local_hls (rasterio), geometry (geopandas), batch_runner
+    plotting                    plotter_base (plotly)
+
+Importing the package loads nothing; every name below is imported from its
+module on first access, e.g. ``from src.controllers import BatchPhenology``
+imports NumPy only, while ``from src.controllers import HLS`` loads Earth Engine.
+"""
+import importlib
+
+# Public name -> module that defines it
+EXPORTS = {
+    'SavitzkyGolaySmoother': 'smoothing',
+    'WhittakerSmoother': 'smoothing',
+    'fill_gaps': 'smoothing',
+    'get_smoother': 'smoothing',
+    'savgol_filter': 'smoothing',
+    'savgol_irregular': 'smoothing',
+    'EVENTS': 'phenology_batch',
+    'BatchPhenology': 'phenology_batch',
+    'PhenologyEvents': 'phenology_batch',
+    'relative_extrema': 'phenology_batch',
+    'relative_extrema_days': 'phenology_batch',
+    'METRICS': 'metrics_geometrics',
+    'BatchPhenologyMetrics': 'metrics_geometrics',
+    'PhenologyMetrics': 'metrics_geometrics',
+    'MultiSeasonPhenology': 'seasons',
+    'analyze_seasons': 'seasons',
+    'IncrementalPhenology': 'incremental',
+    'PhenologyState': 'incremental',
+    'ParameterSweep': 'sweep',
+    'score_sweep': 'sweep',
+    'NDVISeriesStore': 'series_store',
+    'PhenologyResultsWriter': 'results_store',
+    'read_results': 'results_store',
+    'VosPosMetrics': 'metrics_vos_pos',
+    'BosEosMetrics': 'metrics_bos_eso',
+    'to_daily': 'hls_scenes',
+    'HLS': 'time_series_hls',
+    'HLSMultiField': 'time_series_hls',
+    'LocalHLS': 'local_hls',
+    'find_scenes': 'local_hls',
+    'HLSCache': 'cache_hls',
+    'EERequestScheduler': 'ee_scheduler',
+    'fetch_hls_many': 'ee_scheduler',
+    'ProcessadorGeoDataFrame': 'geometry',
+    'BatchRunner': 'batch_runner',
+    'PhenologyPlotter': 'plotter_base',
+    'MultiFieldPlotter': 'plotter_base',
+}
+
+__all__ = sorted(EXPORTS)
+
+
+def __getattr__(name):
+    if name not in EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(EXPORTS))
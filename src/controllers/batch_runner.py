@@ -0,0 +1,304 @@
+"""
+Command-line runner that processes every polygon of a GeoPackage.
+
+Fetches run in a thread pool (I/O bound) and the smoothing and metrics run in a
+process pool (CPU bound). Both stages are bounded, results are written in bulk
+to a Parquet dataset partitioned by season and region and the polygon IDs of
+every written chunk are recorded, so an interrupted run resumes where it stopped.
+Series are resampled to daily rows unless ``--observation-dates`` is given:
+
+    ndvi-toolkit batch data/sample_world.gpkg results/ --start-date 2022-10-01 --end-date 2023-04-30
+
+(or ``python -m msu_timeseries_ndvi.controllers.batch_runner`` with the same arguments).
+"""
+import argparse
+import logging
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from . import instrumentation
+from .metrics_bos_eso import BosEosMetrics
+from .metrics_geometrics import PhenologyMetrics
+from .metrics_vos_pos import VosPosMetrics
+from .results_store import PhenologyResultsWriter, phenology_record
+from .smoothing import SavitzkyGolaySmoother
+
+logger = logging.getLogger(__name__)
+
+
+def compute_field(field_id, ndvi_df, window_size, poly_order, order_ndvi, threshold):
+    """
+    Smooths one field's series (daily or on its observation dates) and computes all of its phenology metrics.
+
+    Returns:
+        dict: The typed wide record of the field (see ``results_store.phenology_record``).
+    """
+    ndvi_df = SavitzkyGolaySmoother(window_size, poly_order).smooth_dataframe(ndvi_df)
+
+    phenology_df = VosPosMetrics(ndvi_df, order_ndvi).analyze_phenology()
+    phenology_df = BosEosMetrics(ndvi_df, phenology_df, threshold).execute_analysis()
+    phenology_df = PhenologyMetrics(phenology_df, ndvi_df).derivate_metrics()
+    return phenology_record(phenology_df)
+
+
+def compute_field_instrumented(field_id, ndvi_df, **compute_kwargs):
+    """
+    Runs ``compute_field`` in a worker process with instrumentation enabled.
+
+    Returns:
+        tuple[dict, list]: The result record and the spans recorded while computing it.
+        On failure the spans travel with the exception, in its ``instrumentation_records`` attribute.
+    """
+    instrumentation.enable()
+    instrumentation.INSTRUMENTATION.drain()
+    try:
+        with instrumentation.field(field_id):
+            record = compute_field(field_id, ndvi_df, **compute_kwargs)
+    except Exception as error:
+        error.instrumentation_records = instrumentation.INSTRUMENTATION.drain()
+        raise
+    return record, instrumentation.INSTRUMENTATION.drain()
+
+
+class BatchRunner:
+    """
+    Runs the whole pipeline over every polygon of a GeoPackage with checkpoint/resume.
+    """
+
+    def __init__(self, processador, output_dir, fetch_field, compute_kwargs,
+                 fetch_workers=8, compute_workers=None, max_pending=64, chunk_size=500, read_batch_size=1000,
+                 metrics_jsonl=None, metrics_prometheus=None, region=None, season_start_month=1):
+        """
+        Args:
+            processador (ProcessadorGeoDataFrame): Source of the polygons.
+            output_dir (str): Directory for checkpoint files; results go to its 'results' subdirectory,
+                a Parquet dataset partitioned by season and region (see ``results_store``).
+            fetch_field (callable): Returns the NDVI DataFrame of a polygon (daily or on its observation dates),
+                given its ID and vertices.
+            compute_kwargs (dict): Parameters forwarded to ``compute_field``.
+            fetch_workers (int): Number of fetch threads.
+            compute_workers (int, optional): Number of compute processes (defaults to the CPU count).
+            max_pending (int): Maximum number of fields in flight in each stage; fetched fields wait
+                for a free compute slot and count against the fetch stage meanwhile.
+            chunk_size (int): Number of fields buffered before each bulk write.
+            read_batch_size (int): Number of polygons read from the GeoPackage at a time.
+            metrics_jsonl (str, optional): JSON-lines file receiving the instrumentation spans at every chunk.
+            metrics_prometheus (str, optional): Prometheus text file with the stage totals, rewritten at every chunk.
+            region (str or callable, optional): Region partition key of every field, or a function of the field ID.
+            season_start_month (int): First month of the season year that keys the results by the POS date
+                (e.g. 7 for July-June seasons); see ``results_store.season_years``.
+        """
+        self.processador = processador
+        self.output_dir = output_dir
+        self.fetch_field = fetch_field
+        self.compute_kwargs = compute_kwargs
+        self.fetch_workers = fetch_workers
+        self.compute_workers = compute_workers
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.read_batch_size = read_batch_size
+        self.metrics_jsonl = metrics_jsonl
+        self.metrics_prometheus = metrics_prometheus
+        self.region = region if callable(region) else (lambda field_id: region)
+
+        self.results_dir = os.path.join(output_dir, 'results')
+        # Flushed explicitly, so that results are on disk before their fields are marked completed
+        self.writer = PhenologyResultsWriter(self.results_dir, buffer_size=float('inf'),
+                                             season_start_month=season_start_month)
+        self.completed_path = os.path.join(output_dir, 'completed.txt')
+        self.failed_path = os.path.join(output_dir, 'failed.txt')
+        self.buffer_ids = []
+
+    def read_checkpoint(self, retry_failed=False):
+        """Returns the polygon IDs already processed (and, unless retried, those that failed)."""
+        done = set()
+        paths = [self.completed_path] if retry_failed else [self.completed_path, self.failed_path]
+        for path in paths:
+            if os.path.exists(path):
+                with open(path) as file:
+                    done.update(line.split('\t')[0].strip() for line in file if line.strip())
+        return done
+
+    def record_failure(self, field_id, stage, error):
+        """Logs a failed field and records it so it is skipped on resume."""
+        logger.warning("Field %s failed during %s: %s", field_id, stage, error)
+        with open(self.failed_path, 'a') as file:
+            file.write(f"{field_id}\t{stage}\t{type(error).__name__}: {error}\n")
+        instrumentation.INSTRUMENTATION.record(f'field.{stage}', field_id=field_id, failed=True,
+                                               error=f"{type(error).__name__}: {error}")
+
+    def fetch(self, field_id, vertices):
+        """Fetches one field inside an instrumentation span."""
+        with instrumentation.field(field_id), instrumentation.span('fetch') as span:
+            ndvi_df = self.fetch_field(field_id, vertices)
+            span.add(rows_out=len(ndvi_df))
+        return ndvi_df
+
+    def write_metrics(self):
+        """Exports the instrumentation collected so far."""
+        if self.metrics_jsonl:
+            instrumentation.INSTRUMENTATION.write_jsonl(self.metrics_jsonl)
+        if self.metrics_prometheus:
+            instrumentation.INSTRUMENTATION.write_prometheus(self.metrics_prometheus)
+
+    def flush(self):
+        """Writes the buffered results as one chunk and marks their fields as completed."""
+        if not self.buffer_ids:
+            return
+
+        self.writer.flush()
+        with open(self.completed_path, 'a') as file:
+            file.writelines(f"{field_id}\n" for field_id in self.buffer_ids)
+            file.flush()
+            os.fsync(file.fileno())
+
+        logger.info("Wrote %d fields (%d rows so far)", len(self.buffer_ids), self.writer.rows_written)
+        self.buffer_ids = []
+        self.write_metrics()
+
+    def run(self, retry_failed=False):
+        """
+        Processes every pending polygon.
+
+        Args:
+            retry_failed (bool): If True, polygons that failed in a previous run are processed again.
+
+        Returns:
+            int: Number of polygons processed in this run.
+        """
+        done = self.read_checkpoint(retry_failed)
+        pending = ((field_id, vertices)
+                   for field_id, vertices in self.processador.iterar_poligonos(self.read_batch_size)
+                   if str(field_id) not in done)
+        processed = 0
+        instrumented = instrumentation.INSTRUMENTATION.enabled
+        compute = compute_field_instrumented if instrumented else compute_field
+
+        fetching = {}
+        fetched = deque()
+        computing = {}
+        with ThreadPoolExecutor(self.fetch_workers) as fetch_pool, \
+                ProcessPoolExecutor(self.compute_workers) as compute_pool:
+            exhausted = False
+            while True:
+                # Fetched fields wait here until the compute stage has room for them
+                while fetched and len(computing) < self.max_pending:
+                    field_id, ndvi_df = fetched.popleft()
+                    computing[compute_pool.submit(compute, field_id, ndvi_df, **self.compute_kwargs)] = field_id
+
+                # Only fetch more fields while the compute stage keeps up
+                while (not exhausted and len(fetching) + len(fetched) < self.max_pending
+                       and len(computing) < self.max_pending):
+                    polygon = next(pending, None)
+                    if polygon is None:
+                        exhausted = True
+                        break
+                    field_id, vertices = polygon
+                    fetching[fetch_pool.submit(self.fetch, field_id, vertices)] = field_id
+
+                if not fetching and not fetched and not computing:
+                    break
+
+                # While the compute stage is full, finished fetches are left to wait in their futures
+                waiting = list(computing) if len(computing) >= self.max_pending else list(fetching) + list(computing)
+                finished, _ = wait(waiting, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future in fetching:
+                        field_id = fetching.pop(future)
+                        try:
+                            ndvi_df = future.result()
+                        except Exception as error:
+                            self.record_failure(field_id, 'fetch', error)
+                            continue
+                        fetched.append((field_id, ndvi_df))
+                    else:
+                        field_id = computing.pop(future)
+                        try:
+                            record = future.result()
+                        except Exception as error:
+                            instrumentation.INSTRUMENTATION.merge(getattr(error, 'instrumentation_records', []))
+                            self.record_failure(field_id, 'metrics', error)
+                            continue
+                        if instrumented:
+                            record, records = record
+                            instrumentation.INSTRUMENTATION.merge(records)
+                        self.writer.add_record(field_id, record, region=self.region(field_id))
+                        self.buffer_ids.append(field_id)
+                        processed += 1
+                        if len(self.buffer_ids) >= self.chunk_size:
+                            self.flush()
+
+        self.flush()
+        return processed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute phenology metrics for every polygon of a GeoPackage.")
+    parser.add_argument('path', help="GeoPackage with the field polygons")
+    parser.add_argument('output_dir', help="Directory for result chunks and checkpoint files")
+    parser.add_argument('--start-date', required=True)
+    parser.add_argument('--end-date', required=True)
+    parser.add_argument('--window-size', type=int, default=30)
+    parser.add_argument('--poly-order', type=int, default=3)
+    parser.add_argument('--order-ndvi', type=int, default=30)
+    parser.add_argument('--threshold', type=float, default=0.3)
+    parser.add_argument('--fetch-workers', type=int, default=8)
+    parser.add_argument('--compute-workers', type=int, default=None)
+    parser.add_argument('--max-pending', type=int, default=64)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--read-batch-size', type=int, default=1000)
+    parser.add_argument('--lazy', action='store_true',
+                        help="Stream polygons from the GeoPackage instead of loading it up front")
+    parser.add_argument('--cache', default=None, help="Optional HLSCache database path")
+    parser.add_argument('--project', default=None, help="Earth Engine cloud project")
+    parser.add_argument('--region', default=None, help="Region partition key of the results")
+    parser.add_argument('--season-start-month', type=int, default=1,
+                        help="First month of the season year keying the results (e.g. 7 for July-June seasons)")
+    parser.add_argument('--observation-dates', action='store_true',
+                        help="Work on the observation dates of every series instead of resampling it to daily rows")
+    parser.add_argument('--retry-failed', action='store_true')
+    parser.add_argument('--metrics-jsonl', default=None,
+                        help="Enable instrumentation and append per-stage spans to this JSON-lines file")
+    parser.add_argument('--metrics-prometheus', default=None,
+                        help="Enable instrumentation and write stage totals to this Prometheus text file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    # The I/O layers are only needed by the parent process; compute workers import this
+    # module to unpickle ``compute_field`` and must not pay for Earth Engine and geopandas
+    import ee
+    from .cache_hls import HLSCache
+    from .geometry import ProcessadorGeoDataFrame
+    from .time_series_hls import HLS
+
+    ee.Initialize(project=args.project)
+    if args.metrics_jsonl or args.metrics_prometheus:
+        instrumentation.enable()
+    cache = HLSCache(args.cache) if args.cache else None
+    processador = ProcessadorGeoDataFrame(args.path, lazy=args.lazy)
+
+    def fetch_field(field_id, vertices):
+        geometry = ee.Geometry.Polygon([vertices])
+        hls = HLS(geometry, args.start_date, args.end_date, cache=cache)
+        return hls.convert_to_dataframe(daily=not args.observation_dates)
+
+    runner = BatchRunner(
+        processador, args.output_dir, fetch_field,
+        compute_kwargs=dict(window_size=args.window_size, poly_order=args.poly_order,
+                            order_ndvi=args.order_ndvi, threshold=args.threshold),
+        fetch_workers=args.fetch_workers, compute_workers=args.compute_workers,
+        max_pending=args.max_pending, chunk_size=args.chunk_size, read_batch_size=args.read_batch_size,
+        metrics_jsonl=args.metrics_jsonl, metrics_prometheus=args.metrics_prometheus, region=args.region,
+        season_start_month=args.season_start_month,
+    )
+    processed = runner.run(retry_failed=args.retry_failed)
+    logger.info("Processed %d fields", processed)
+    # Spans are only recorded (and merged from the workers) with --metrics-jsonl/--metrics-prometheus
+    if instrumentation.INSTRUMENTATION.enabled:
+        instrumentation.INSTRUMENTATION.log_summary(logger)
+
+
+if __name__ == '__main__':
+    main()
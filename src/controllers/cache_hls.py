@@ -0,0 +1,252 @@
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import date, timedelta
+
+import pandas as pd
+
+from . import instrumentation
+
+
+class HLSCache:
+    """
+    Persistent SQLite cache of per-scene NDVI values fetched by ``HLS``.
+
+    Series are keyed by geometry, collection ID, band and mask settings. For each
+    key the cache records which date ranges were already fetched, so a request
+    for a longer or later window only queries Earth Engine for the missing dates.
+
+    The cache can be shared by threads and processes: the database uses WAL
+    journaling, Earth Engine is queried outside of any transaction and the
+    results are written in one short transaction. Concurrent requests for the
+    same missing dates may both fetch them; the second write is idempotent.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+        max_bytes (int): Approximate size limit; least recently used series are evicted above it.
+        max_age_days (float): Series not accessed for this many days are evicted.
+        settle_days (int): Recent days that are never marked as fetched, since late scenes may still arrive.
+        busy_timeout (float): Seconds a connection waits for a lock held by another writer.
+        hits (int): Requests served entirely from the cache.
+        partial_hits (int): Requests that only fetched the missing dates.
+        misses (int): Requests with nothing cached.
+    """
+
+    def __init__(self, path, max_bytes=None, max_age_days=None, settle_days=7, busy_timeout=30.0):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            max_bytes (int, optional): Approximate size limit of the cache.
+            max_age_days (float, optional): Maximum time since the last access of a series.
+            settle_days (int): Number of most recent days that are always fetched again.
+            busy_timeout (float): Seconds a connection waits for a lock held by another writer.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.settle_days = settle_days
+        self.busy_timeout = busy_timeout
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.create_tables()
+
+    def connect(self):
+        """Opens a new connection to the cache database."""
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        return closing(conn)
+
+    def create_tables(self):
+        """Creates the cache tables if they do not exist and switches the database to WAL journaling."""
+        with self.connect() as conn:
+            # The journal mode is stored in the database file; readers then no longer block the writer
+            conn.execute("PRAGMA journal_mode = WAL")
+        with self.connect() as conn, conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS series (
+                                key TEXT PRIMARY KEY, created REAL, last_access REAL, bytes INTEGER)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS coverage (
+                                key TEXT, start TEXT, end TEXT)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS scenes (
+                                key TEXT, date TEXT, id TEXT, ndvi REAL, stats TEXT, PRIMARY KEY (key, id))""")
+            conn.execute("CREATE INDEX IF NOT EXISTS coverage_key ON coverage (key)")
+
+            # Caches created before extra statistics were supported have no 'stats' column
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(scenes)")]
+            if 'stats' not in columns:
+                conn.execute("ALTER TABLE scenes ADD COLUMN stats TEXT")
+
+    def make_key(self, hls):
+        """
+        Builds the cache key of an ``HLS`` request.
+
+        Args:
+            hls (HLS): The request.
+
+        Returns:
+            str: SHA-256 digest of the request settings, excluding its date range.
+        """
+        parts = json.dumps(hls.cache_key_parts(), sort_keys=True, default=str)
+        return hashlib.sha256(parts.encode('utf-8')).hexdigest()
+
+    def missing_ranges(self, conn, key, start_date, end_date):
+        """
+        Lists the sub-ranges of [start_date, end_date) that were not fetched yet.
+
+        Returns:
+            list: (start, end) pairs of "YYYY-MM-DD" strings, end exclusive.
+        """
+        coverage = conn.execute("SELECT start, end FROM coverage WHERE key = ? ORDER BY start",
+                                (key,)).fetchall()
+        missing = []
+        cursor = start_date
+        for covered_start, covered_end in coverage:
+            if covered_end <= cursor:
+                continue
+            if covered_start >= end_date:
+                break
+            if covered_start > cursor:
+                missing.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+        if cursor < end_date:
+            missing.append((cursor, end_date))
+        return missing
+
+    def add_coverage(self, conn, key, start_date, end_date):
+        """Records [start_date, end_date) as fetched, merging overlapping ranges."""
+        settled = (date.today() - timedelta(days=self.settle_days)).isoformat()
+        end_date = min(end_date, settled)
+        if end_date <= start_date:
+            return
+
+        ranges = conn.execute("SELECT start, end FROM coverage WHERE key = ?", (key,)).fetchall()
+        ranges = sorted(ranges + [(start_date, end_date)])
+        merged = [list(ranges[0])]
+        for range_start, range_end in ranges[1:]:
+            if range_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+
+        conn.execute("DELETE FROM coverage WHERE key = ?", (key,))
+        conn.executemany("INSERT INTO coverage (key, start, end) VALUES (?, ?, ?)",
+                         [(key, range_start, range_end) for range_start, range_end in merged])
+
+    def fetch_scenes(self, hls):
+        """
+        Returns the per-scene values of an ``HLS`` request, fetching only the missing dates.
+
+        Args:
+            hls (HLS): The request.
+
+        Returns:
+            pandas.DataFrame: One row per scene with 'date' (YYYYMMDD), 'id' and 'ndvi' columns.
+        """
+        key = self.make_key(hls)
+        start_date, end_date = str(hls.start_date), str(hls.end_date)
+        now = time.time()
+
+        with self.connect() as conn:
+            missing = self.missing_ranges(conn, key, start_date, end_date)
+        if not missing:
+            self.count('hits', 'cache.hit')
+        elif missing == [(start_date, end_date)]:
+            self.count('misses', 'cache.miss')
+        else:
+            self.count('partial_hits', 'cache.partial_hit')
+
+        # Earth Engine is queried before the write transaction, so other writers are not blocked meanwhile
+        fetched = []
+        for missing_start, missing_end in missing:
+            request = copy.copy(hls)
+            request.cache = None
+            request.start_date, request.end_date = missing_start, missing_end
+            fetched.append((missing_start, missing_end, request.fetch_scenes()))
+
+        with self.connect() as conn, conn:
+            # Taking the write lock up front avoids failing to upgrade a read transaction under WAL
+            conn.execute("BEGIN IMMEDIATE")
+            for missing_start, missing_end, scenes in fetched:
+                self.store_scenes(conn, key, scenes)
+                self.add_coverage(conn, key, missing_start, missing_end)
+
+            conn.execute("""INSERT INTO series (key, created, last_access, bytes) VALUES (?, ?, ?, 0)
+                            ON CONFLICT (key) DO UPDATE SET last_access = excluded.last_access""",
+                         (key, now, now))
+            if missing:
+                conn.execute("""UPDATE series SET bytes = (
+                                    SELECT COALESCE(SUM(LENGTH(id) + LENGTH(date) + COALESCE(LENGTH(stats), 0) + 8), 0)
+                                    FROM scenes WHERE key = ?) WHERE key = ?""", (key, key))
+
+            df = pd.read_sql_query("""SELECT date, id, ndvi, stats FROM scenes
+                                      WHERE key = ? AND date >= ? AND date < ? ORDER BY date""",
+                                   conn, params=(key, start_date.replace('-', ''), end_date.replace('-', '')))
+
+        if missing:
+            self.evict()
+
+        # Extra statistics (e.g. valid_fraction) are stored as JSON next to the NDVI value
+        stats = pd.DataFrame([json.loads(value) if value else {} for value in df.pop('stats')], index=df.index)
+        return pd.concat([df, stats], axis=1)
+
+    def store_scenes(self, conn, key, scenes):
+        """Inserts (or replaces) the fetched per-scene rows of a series."""
+        extra = [column for column in scenes.columns if column not in ('date', 'id', 'ndvi')]
+        conn.executemany("INSERT OR REPLACE INTO scenes (key, date, id, ndvi, stats) VALUES (?, ?, ?, ?, ?)",
+                         [(key, str(row['date']), str(row['id']),
+                           None if pd.isna(row['ndvi']) else float(row['ndvi']),
+                           json.dumps({column: None if pd.isna(row[column]) else float(row[column])
+                                       for column in extra}) if extra else None)
+                          for row in scenes.to_dict('records')])
+
+    def count(self, counter, stage):
+        """Increments a hit/miss counter (shared by the threads using the cache) and records the event."""
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        instrumentation.INSTRUMENTATION.record(stage)
+
+    def evict(self):
+        """
+        Removes series older than ``max_age_days`` and, above ``max_bytes``, the least recently used ones.
+        """
+        with self.connect() as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = []
+            if self.max_age_days is not None:
+                oldest = time.time() - self.max_age_days * 86400
+                expired = [key for key, in conn.execute("SELECT key FROM series WHERE last_access < ?", (oldest,))]
+
+            if self.max_bytes is not None:
+                total = 0
+                for key, size in conn.execute("SELECT key, bytes FROM series ORDER BY last_access DESC"):
+                    total += size
+                    if total > self.max_bytes and key not in expired:
+                        expired.append(key)
+
+            for table in ('scenes', 'coverage', 'series'):
+                conn.executemany(f"DELETE FROM {table} WHERE key = ?", [(key,) for key in expired])
+        return len(expired)
+
+    def stats(self):
+        """
+        Returns the cache counters and size.
+
+        Returns:
+            dict: Hit/miss counters, number of cached series and their approximate size in bytes.
+        """
+        with self.connect() as conn:
+            series, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM series").fetchone()
+        with self.lock:
+            counters = {'hits': self.hits, 'partial_hits': self.partial_hits, 'misses': self.misses}
+        return {
+            **counters,
+            'series': series,
+            'bytes': size,
+        }
@@ -0,0 +1,108 @@
+"""
+Console entry point of the toolkit (``ndvi-toolkit`` once the package is installed).
+
+    ndvi-toolkit phenology series/ results.parquet --window-size 30 --order-ndvi 30 --threshold 0.3
+    ndvi-toolkit batch data/sample_world.gpkg results/ --start-date 2022-10-01 --end-date 2023-04-30
+
+``phenology`` runs on an ``NDVISeriesStore`` and only imports the compute core;
+``batch`` forwards its arguments to ``batch_runner`` and imports the Earth Engine
+and geopandas layers when it starts.
+"""
+import argparse
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+def run_phenology(args):
+    """Computes the events and geometric metrics of every field of a series store."""
+    import numpy as np
+    import pandas as pd
+
+    from . import instrumentation
+    from .metrics_geometrics import BatchPhenologyMetrics
+    from .phenology_batch import BatchPhenology, PhenologyEvents
+    from .series_store import NDVISeriesStore
+    from .smoothing import get_smoother
+
+    logging.basicConfig(level=logging.INFO if args.verbose or args.timings else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    if args.timings:
+        instrumentation.enable()
+    params = {'lmbda': args.lmbda} if args.smoother == 'whittaker' else \
+        {'window_size': args.window_size, 'poly_order': args.poly_order}
+    smoother = get_smoother(args.smoother, **params)
+    store = NDVISeriesStore(args.store, mode='r')
+    ndvi = store.layer(args.layer)
+
+    frames = []
+    for start in range(0, len(store), args.chunk_size):
+        chunk = slice(start, start + args.chunk_size)
+        values = np.asarray(ndvi[chunk], dtype=float)
+        smoothed = smoother.smooth(values)
+        engine = BatchPhenology(store.dates, values, smoothed, order_ndvi=args.order_ndvi, threshold=args.threshold)
+        events = engine.execute_analysis()
+        records = PhenologyEvents.from_indexes(engine.dates, smoothed, events)
+        table = pd.concat([engine.to_dataframe(events),
+                           BatchPhenologyMetrics(records, engine.dates, smoothed).compute()], axis=1)
+        table.insert(0, 'field_id', store.field_ids[chunk])
+        frames.append(table)
+        logger.info("Processed %d of %d fields", min(chunk.stop, len(store)), len(store))
+
+    results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame({'field_id': []})
+    if args.output.endswith('.parquet'):
+        results.to_parquet(args.output, index=False)
+    else:
+        results.to_csv(args.output, index=False)
+    logger.info("Wrote %d fields to %s", len(results), args.output)
+    if args.timings:
+        instrumentation.INSTRUMENTATION.log_summary(logger)
+    return 0
+
+
+def run_batch(arguments):
+    """Runs ``batch_runner`` on a GeoPackage with the remaining arguments (it configures logging itself)."""
+    from .batch_runner import main as batch_main
+
+    batch_main(arguments)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ndvi-toolkit', description="NDVI phenology toolkit.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    phenology = subparsers.add_parser('phenology', help="Compute events and metrics for every field of a series store")
+    phenology.add_argument('store', help="NDVISeriesStore directory")
+    phenology.add_argument('output', help="Output table (.parquet or .csv)")
+    phenology.add_argument('--layer', default='ndvi', help="Store layer holding the raw NDVI")
+    phenology.add_argument('--smoother', default='savitzky_golay', choices=['savitzky_golay', 'whittaker'])
+    phenology.add_argument('--window-size', type=int, default=30)
+    phenology.add_argument('--poly-order', type=int, default=3)
+    phenology.add_argument('--lmbda', type=float, default=100.0, help="Whittaker smoothing parameter")
+    phenology.add_argument('--order-ndvi', type=int, default=30)
+    phenology.add_argument('--threshold', type=float, default=0.3)
+    phenology.add_argument('--chunk-size', type=int, default=4096, help="Number of fields processed together")
+    phenology.add_argument('--verbose', action='store_true', help="Log progress at INFO level")
+    phenology.add_argument('--timings', action='store_true',
+                           help="Enable instrumentation and log the time spent in every stage at the end")
+    phenology.set_defaults(handler=run_phenology)
+
+    subparsers.add_parser('batch', add_help=False, help="Process every polygon of a GeoPackage (see 'batch --help')")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    # Everything after 'batch' belongs to batch_runner, including --help
+    args, arguments = parser.parse_known_args(argv)
+    if args.command == 'batch':
+        return run_batch(arguments)
+    if arguments:
+        parser.error(f"unrecognized arguments: {' '.join(arguments)}")
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
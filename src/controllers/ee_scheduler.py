@@ -0,0 +1,214 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import instrumentation
+
+RETRYABLE_MESSAGES = ('429', 'too many requests', 'quota', 'rate limit', 'resource exhausted', 'try again')
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket: allows ``rate`` requests per second with bursts of up to ``capacity``.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class EERequestScheduler:
+    """
+    Runs many blocking Earth Engine requests (e.g. ``HLS.convert_to_dataframe``) concurrently.
+
+    Requests run in a thread pool under a concurrency limit and a token-bucket
+    rate limit. Quota and throttling errors are retried with exponential backoff
+    and full jitter, without holding a concurrency slot while waiting; any other
+    error fails the request immediately.
+
+    Attributes:
+        stats (list): One dict per finished request with its key, status, attempts,
+            queue wait before the first attempt and latency from the first attempt,
+            backoff included (seconds).
+        elapsed (float): Wall time of the last ``run`` call, in seconds.
+    """
+
+    def __init__(self, max_concurrency=10, rate=10.0, burst=None, max_retries=5,
+                 base_delay=1.0, max_delay=60.0, is_retryable=None):
+        """
+        Args:
+            max_concurrency (int): Maximum number of requests running at once.
+            rate (float): Maximum number of requests started per second.
+            burst (float, optional): Token-bucket capacity (defaults to ``rate``).
+            max_retries (int): Retries per request after the first attempt.
+            base_delay (float): Backoff delay of the first retry, in seconds.
+            max_delay (float): Upper bound of the backoff delay, in seconds.
+            is_retryable (callable, optional): Decides whether an exception is retried.
+        """
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_retryable = is_retryable or self.is_quota_error
+        self.stats = []
+        self.elapsed = None
+
+    @staticmethod
+    def is_quota_error(error):
+        """Returns True for throttling and quota errors (HTTP 429 and similar)."""
+        message = str(error).lower()
+        return any(text in message for text in RETRYABLE_MESSAGES)
+
+    def backoff(self, attempt):
+        """Returns the delay before retry number ``attempt`` (exponential with full jitter)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def submit(self, key, request, semaphore, bucket, executor):
+        """
+        Runs one request with the limits and the retry policy.
+
+        Args:
+            key: Identifier of the request, reported in ``stats``.
+            request (callable): Blocking call without arguments.
+
+        Returns:
+            The value returned by ``request``.
+        """
+        loop = asyncio.get_running_loop()
+        queued = time.perf_counter()
+        started = None
+        attempt = 0
+        while True:
+            async with semaphore:
+                if started is None:
+                    started = time.perf_counter()
+                await bucket.acquire()
+                try:
+                    result = await loop.run_in_executor(executor, request)
+                except Exception as error:
+                    if attempt >= self.max_retries or not self.is_retryable(error):
+                        self.record(key, 'failed', attempt + 1, queued, started, error)
+                        raise
+                    instrumentation.INSTRUMENTATION.record('ee_request.retry', field_id=key,
+                                                           error=f"{type(error).__name__}: {error}")
+                else:
+                    self.record(key, 'ok', attempt + 1, queued, started)
+                    return result
+            # The slot is released during the backoff, so other requests run meanwhile
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def record(self, key, status, attempts, queued, started, error=None):
+        """Stores the statistics of a finished request."""
+        finished = time.perf_counter()
+        self.stats.append({
+            'key': key,
+            'status': status,
+            'attempts': attempts,
+            'wait': started - queued,
+            'latency': finished - started,
+            'error': None if error is None else f"{type(error).__name__}: {error}",
+        })
+        instrumentation.INSTRUMENTATION.record('ee_request', field_id=key, wall_seconds=finished - started,
+                                               failed=status == 'failed', error=self.stats[-1]['error'])
+
+    async def run_async(self, requests):
+        """
+        Runs all requests concurrently.
+
+        Args:
+            requests (dict): Blocking callables without arguments, by key.
+
+        Returns:
+            tuple[dict, dict]: Results by key and exceptions by key.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        bucket = TokenBucket(self.rate, self.burst)
+        keys = list(requests)
+        with ThreadPoolExecutor(self.max_concurrency) as executor:
+            outcomes = await asyncio.gather(
+                *(self.submit(key, requests[key], semaphore, bucket, executor) for key in keys),
+                return_exceptions=True)
+
+        results, errors = {}, {}
+        for key, outcome in zip(keys, outcomes):
+            if isinstance(outcome, Exception):
+                errors[key] = outcome
+            else:
+                results[key] = outcome
+        return results, errors
+
+    def run(self, requests):
+        """
+        Runs all requests concurrently from synchronous code.
+
+        Args:
+            requests (dict): Blocking callables without arguments, by key.
+
+        Returns:
+            tuple[dict, dict]: Results by key and exceptions by key.
+        """
+        started = time.perf_counter()
+        outcome = asyncio.run(self.run_async(requests))
+        self.elapsed = time.perf_counter() - started
+        return outcome
+
+    def summary(self):
+        """
+        Summarizes latency and throughput of the finished requests.
+
+        Returns:
+            dict: Request counts, retries, latency percentiles (seconds) and requests per second.
+        """
+        latencies = sorted(stat['latency'] for stat in self.stats)
+        if not latencies:
+            return {'requests': 0}
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        elapsed = self.elapsed or sum(latencies)
+        return {
+            'requests': len(self.stats),
+            'failed': sum(stat['status'] == 'failed' for stat in self.stats),
+            'retries': sum(stat['attempts'] - 1 for stat in self.stats),
+            'latency_p50': percentile(0.50),
+            'latency_p95': percentile(0.95),
+            'latency_max': latencies[-1],
+            'throughput': len(self.stats) / elapsed if elapsed else None,
+        }
+
+
+def fetch_hls_many(hls_requests, **scheduler_params):
+    """
+    Fetches many ``HLS`` series concurrently.
+
+    Args:
+        hls_requests (dict): ``HLS`` instances by field ID.
+        **scheduler_params: Parameters of ``EERequestScheduler``.
+
+    Returns:
+        tuple[dict, dict, EERequestScheduler]: DataFrames by field ID, exceptions by field ID and the
+        scheduler, whose ``stats`` and ``summary()`` report latency and throughput.
+    """
+    scheduler = EERequestScheduler(**scheduler_params)
+    results, errors = scheduler.run({key: hls.convert_to_dataframe for key, hls in hls_requests.items()})
+    return results, errors, scheduler
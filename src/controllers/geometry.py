@@ -1,29 +1,170 @@
 import ee  # Asumindo que você está usando a biblioteca Earth Engine
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
 
 
 class ProcessadorGeoDataFrame:
-    def __init__(self, arquivo):
-        self.gdf = self.ler_arquivo(arquivo)
+    def __init__(self, arquivo, lazy=False, camada=None):
+        # No modo lazy nada é lido no construtor; os polígonos são lidos sob demanda, em lotes
+        self.arquivo = arquivo
+        self.camada = camada
+        self.lazy = lazy
+        # FIDs das feições e índice do primeiro polígono de cada feição, calculados na primeira consulta
+        self.fids = None
+        self.inicios = None
+        self.gdf = None if lazy else self.ler_arquivo(arquivo)
 
     def ler_arquivo(self, arquivo):
         # Carregar o arquivo em um GeoDataFrame e ajustar o CRS
-        gdf = gpd.read_file(arquivo)
-        gdf = gdf.explode(ignore_index=True)
+        gdf = gpd.read_file(arquivo, layer=self.camada)
+        n_feicoes = len(gdf)
+        gdf = self.preparar_lote(gdf, np.arange(n_feicoes), primeiro=0)
+        partes = np.bincount(gdf['indice_origem'], minlength=n_feicoes)
+        self.inicios = np.concatenate([[0], np.cumsum(partes)])
+        return gdf
+
+    def preparar_lote(self, gdf, linhas, primeiro=None):
+        # Guarda a linha de origem (a partir de 0) de cada feição antes de separar os multipolígonos
+        gdf['indice_origem'] = linhas
+        gdf = gdf.explode(index_parts=False)
+        gdf['parte'] = gdf.groupby(level=0).cumcount()
+        # Índice do polígono depois de separar os multipolígonos, o mesmo nos dois modos; com
+        # linhas consecutivas ele continua a partir do primeiro polígono do lote
+        if primeiro is None:
+            gdf['indice'] = self.indices_inicio()[gdf['indice_origem'].to_numpy()] + gdf['parte'].to_numpy()
+        else:
+            gdf['indice'] = range(primeiro, primeiro + len(gdf))
+        gdf = gdf.reset_index(drop=True)
         gdf = gdf.to_crs("epsg:4326")
         return gdf
 
-    def extrair_coordenadas(self, index_poligono : int):
-        # Extrair os vértices do polígono especificado
-        polygon = self.gdf.geometry.iloc[index_poligono]
+    def indices_inicio(self):
+        # Índice do primeiro polígono de cada feição (mais o total no fim); no modo lazy as
+        # geometrias são percorridas uma única vez, só para contar as partes
+        if self.inicios is None:
+            import fiona
+
+            fids, partes = [], []
+            with fiona.open(self.arquivo, layer=self.camada) as camada:
+                for fid, feicao in camada.items():
+                    geometria = feicao.geometry
+                    fids.append(fid)
+                    multipla = geometria is not None and geometria.type == 'MultiPolygon'
+                    partes.append(len(geometria.coordinates) if multipla else 1)
+            self.fids = np.array(fids, dtype=np.int64)
+            self.inicios = np.concatenate([[0], np.cumsum(partes, dtype=np.int64)])
+        return self.inicios
+
+    def fids_feicoes(self):
+        # FIDs da camada na ordem das linhas (no GeoPackage começam em 1 e podem ter lacunas)
+        if self.fids is None:
+            import fiona
+
+            with fiona.open(self.arquivo, layer=self.camada) as camada:
+                self.fids = np.fromiter(camada.keys(), dtype=np.int64)
+        return self.fids
+
+    def contar_feicoes(self):
+        # Número de feições da camada, lido dos metadados sem carregar as geometrias
+        import fiona
+
+        with fiona.open(self.arquivo, layer=self.camada) as camada:
+            return len(camada)
+
+    def contar_poligonos(self):
+        # Número de polígonos depois de separar os multipolígonos (contar_feicoes conta as
+        # feições de origem sem ler as geometrias)
+        return int(self.indices_inicio()[-1])
+
+    def ler_intervalo(self, inicio, fim):
+        # Lê apenas as linhas [inicio, fim) do arquivo
+        gdf = gpd.read_file(self.arquivo, layer=self.camada, rows=slice(inicio, fim))
+        return self.preparar_lote(gdf, np.arange(inicio, inicio + len(gdf)))
+
+    def ler_linhas(self, linhas):
+        # Lê apenas as linhas informadas (a partir de 0), buscando-as pelo FID
+        fids = self.fids_feicoes()
+        linhas = np.unique(np.asarray(linhas, dtype=np.int64))
+        if linhas.size and (linhas[0] < 0 or linhas[-1] >= len(fids)):
+            raise IndexError(f"Linhas fora do arquivo: {linhas[(linhas < 0) | (linhas >= len(fids))].tolist()}")
+        # As feições voltam em ordem crescente de FID
+        linhas = linhas[np.argsort(fids[linhas], kind='stable')]
+        lista = ', '.join(str(fid) for fid in fids[linhas])
+        gdf = gpd.read_file(self.arquivo, layer=self.camada, where=f"FID IN ({lista or 'NULL'})")
+        return self.preparar_lote(gdf, linhas)
+
+    def ler_ids(self, indices_poligonos):
+        # Lê apenas os polígonos informados, pelo mesmo índice de extrair_coordenadas e
+        # iterar_poligonos, na ordem pedida
+        inicios = self.indices_inicio()
+        indices = np.asarray(indices_poligonos, dtype=np.int64)
+        fora = indices[(indices < 0) | (indices >= inicios[-1])]
+        if fora.size:
+            raise IndexError(f"Polígonos fora do arquivo: {fora.tolist()}")
+        gdf = self.ler_linhas(np.searchsorted(inicios, indices, side='right') - 1)
+        posicoes = pd.Index(gdf['indice']).get_indexer(indices)
+        return gdf.iloc[posicoes].reset_index(drop=True)
+
+    def ler_bbox(self, bbox, crs="epsg:4326"):
+        # Lê apenas as feições que intersectam o retângulo, usando o índice espacial do GeoPackage
+        import fiona
+
+        with fiona.open(self.arquivo, layer=self.camada) as camada:
+            limites = gpd.GeoSeries([box(*bbox)], crs=crs).to_crs(camada.crs).total_bounds
+            fids = np.fromiter(camada.keys(bbox=tuple(limites)), dtype=np.int64)
+        return self.ler_linhas(np.flatnonzero(np.isin(self.fids_feicoes(), fids)))
+
+    def iterar_lotes(self, tamanho_lote=1000):
+        # Gera GeoDataFrames já explodidos e reprojetados, lote a lote
+        if not self.lazy:
+            for inicio in range(0, len(self.gdf), tamanho_lote):
+                yield self.gdf.iloc[inicio:inicio + tamanho_lote]
+            return
+
+        # O índice dos polígonos é acumulado lote a lote, sem uma leitura prévia do arquivo
+        primeiro = 0
+        for inicio in range(0, self.contar_feicoes(), tamanho_lote):
+            gdf = gpd.read_file(self.arquivo, layer=self.camada, rows=slice(inicio, inicio + tamanho_lote))
+            lote = self.preparar_lote(gdf, np.arange(inicio, inicio + len(gdf)), primeiro)
+            primeiro += len(lote)
+            yield lote
+
+    def iterar_poligonos(self, tamanho_lote=1000):
+        # Gera (índice, vértices) de cada polígono; nos dois modos o índice é a posição do
+        # polígono depois de separar os multipolígonos, o mesmo de extrair_coordenadas
+        for lote in self.iterar_lotes(tamanho_lote):
+            for indice, polygon in zip(lote['indice'], lote.geometry):
+                yield int(indice), self.formatar_vertices(polygon)
+
+    def formatar_vertices(self, polygon):
+        # Extrair e formatar os vértices do polígono
         vertices = list(polygon.exterior.coords)
-        
-        # Formatando os vértices
-        vertices_formatados = [[coord[0], coord[1]] for coord in vertices]
+        return [[coord[0], coord[1]] for coord in vertices]
+
+    def extrair_coordenadas(self, index_poligono : int):
+        # Extrair os vértices do polígono especificado (índice depois de separar os multipolígonos)
+        if self.lazy:
+            # Só a feição que contém o polígono é lida, pelo FID
+            gdf = self.ler_ids([index_poligono])
+            vertices_formatados = self.formatar_vertices(gdf.geometry.iloc[0])
+        else:
+            # Formatando os vértices
+            vertices_formatados = self.formatar_vertices(self.gdf.geometry.iloc[index_poligono])
 
         # Define a geometria para uso no Earth Engine, se necessário
         geometry = ee.Geometry.Polygon([vertices_formatados])
 
         return vertices_formatados, geometry
 
+    def extrair_feature_collection(self, indices_poligonos=None, id_property='field_id', tamanho_lote=1000):
+        # Monta uma FeatureCollection com os polígonos especificados (todos, por padrão)
+        selecionados = None if indices_poligonos is None else set(indices_poligonos)
+
+        features = []
+        for indice, vertices_formatados in self.iterar_poligonos(tamanho_lote):
+            if selecionados is None or indice in selecionados:
+                features.append(ee.Feature(ee.Geometry.Polygon([vertices_formatados]), {id_property: indice}))
 
+        return ee.FeatureCollection(features)
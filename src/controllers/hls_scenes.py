@@ -0,0 +1,153 @@
+"""
+Parts of the HLS extraction that do not depend on the backend: the Fmask
+cloud/shadow test and the conversion of per-scene values into daily series.
+Both the Earth Engine (``time_series_hls``) and the local raster (``local_hls``)
+backends use them, so their outputs follow the same contract.
+
+With ``daily=False`` the series keep one row per observation date (about 40 per
+season instead of about 400 daily rows); smoothing, extrema, derivatives and
+metrics all work on those dates. ``to_daily`` expands such a series to daily
+rows when they are wanted, e.g. for plotting:
+
+    ndvi_df = HLS(geometry, start, end).convert_to_dataframe(daily=False)
+    ndvi_df = SavitzkyGolaySmoother(31, 3).smooth_dataframe(ndvi_df)
+    ...
+    PhenologyPlotter(to_daily(ndvi_df, SavitzkyGolaySmoother(31, 3)), phenology_df).plot_data()
+"""
+import numpy as np
+import pandas as pd
+
+from . import instrumentation
+
+# Fmask bits tested by the cloud mask (HLS v2.0 user guide, table 9)
+CLOUDS_BIT = 1
+CLOUD_SHADOW_BIT = 3
+
+
+def fmask_clear(fmask, clouds_bit=CLOUDS_BIT, cloud_shadow_bit=CLOUD_SHADOW_BIT):
+    """
+    Tests Fmask values for the absence of clouds and cloud shadows.
+
+    Same test as ``HLS.extract_fmask_bitwise``, on a NumPy array.
+
+    Args:
+        fmask (np.ndarray): Fmask band (uint8).
+        clouds_bit (int): Bit flagging clouds.
+        cloud_shadow_bit (int): Bit flagging cloud shadows.
+
+    Returns:
+        np.ndarray: True where neither bit is set.
+    """
+    return (np.asarray(fmask) & ((1 << clouds_bit) | (1 << cloud_shadow_bit))) == 0
+
+
+def resample_scenes(df, daily=True):
+    """
+    Cleans the per-scene NDVI values of one field and resamples them to daily frequency.
+
+    Args:
+        df (pandas.DataFrame): Per-scene rows with 'date' (YYYYMMDD), 'id' and 'ndvi' columns, plus
+            optional extra statistic columns, which are kept (and interpolated with ``daily``).
+        daily (bool): If False, keeps one row per observation date instead of resampling.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with columns for date, ID, NDVI values, and satellite name.
+    """
+    with instrumentation.span('hls.resample', rows_in=len(df)) as span:
+        df = df.copy()
+        df['satellite'] = 'landsat'
+        # Only scenes without NDVI are dropped; extra statistics may be null on a kept scene
+        df.dropna(subset=['ndvi'], inplace=True)
+
+        # Handling date and sorting
+        df['date'] = pd.to_datetime(df['date'])
+        df.sort_values('date', inplace=True)
+        df = df.drop_duplicates(subset='date').reset_index(drop=True)
+
+        if daily:
+            df = interpolate_daily(df)
+        else:
+            df['timestamps'] = df['date']
+
+        span.add(rows_out=len(df))
+
+    return df
+
+
+def interpolate_daily(df):
+    """
+    Resamples an observation-date series to daily frequency, interpolating linearly.
+
+    Args:
+        df (pandas.DataFrame): Rows with a unique, sorted datetime 'date' column.
+
+    Returns:
+        pandas.DataFrame: One row per day, with a 'timestamps' copy of the date.
+    """
+    # Resampling dates to daily frequency; only numeric columns are interpolated, the others
+    # ('id', 'satellite') are left empty on the new days
+    df = df.set_index('date').resample('D').asfreq()
+    numeric = df.select_dtypes('number').columns
+    df[numeric] = df[numeric].interpolate(method='linear')
+
+    #Set datestamp and reset index
+    df.reset_index(inplace=True)
+
+    # Convertendo a coluna 'date' para o formato datetime
+    df['timestamps'] = pd.to_datetime(df['date'])
+    return df
+
+
+def to_daily(ndvi_df, smoother=None, column='ndvi', output='savitzky_golay'):
+    """
+    Expands one field's observation-date series to daily rows, e.g. for plotting.
+
+    Args:
+        ndvi_df (pandas.DataFrame): Output of ``resample_scenes(..., daily=False)``, possibly smoothed.
+        smoother (Smoother, optional): Smoother that recomputes the ``output`` column on the daily rows;
+            without it the column is dropped. The Savitzky-Golay values on the observation dates
+            are unchanged by the round trip.
+        column (str): Column holding the raw NDVI values.
+        output (str): Column holding the smoothed NDVI values.
+
+    Returns:
+        pandas.DataFrame: The daily series, as returned by ``resample_scenes(..., daily=True)``.
+    """
+    with instrumentation.span('hls.to_daily', rows_in=len(ndvi_df)) as span:
+        df = interpolate_daily(ndvi_df.drop(columns=[name for name in ('timestamps', output) if name in ndvi_df]))
+        if smoother is not None:
+            smoother.smooth_dataframe(df, column, output)
+        span.add(rows_out=len(df))
+    return df
+
+
+def daily_fields(scenes, id_property='field_id', wide=False, daily=True):
+    """
+    Converts per-field, per-scene rows into the daily series of every field.
+
+    Args:
+        scenes (pandas.DataFrame): Rows with the field id, 'date' (YYYYMMDD), 'id' and 'ndvi' columns.
+        id_property (str): Column identifying each field.
+        wide (bool): If True, returns one NDVI column per field indexed by date.
+        daily (bool): If False, keeps the observation dates of every field (the wide table then
+            has the union of those dates, with NaN where a field has no observation).
+
+    Returns:
+        pandas.DataFrame: Long table with the field id plus the columns of ``resample_scenes``,
+        or a wide date x field NDVI table.
+    """
+    frames = []
+    for field_id, field_df in scenes.groupby(id_property, sort=True):
+        with instrumentation.field(field_id):
+            df = resample_scenes(field_df.drop(columns=id_property), daily)
+        df.insert(0, id_property, field_id)
+        frames.append(df)
+
+    if not frames:
+        df = pd.DataFrame(columns=[id_property, 'date', 'id', 'ndvi', 'satellite', 'timestamps'])
+    else:
+        df = pd.concat(frames, ignore_index=True)
+
+    if wide:
+        return df.pivot(index='date', columns=id_property, values='ndvi')
+    return df
@@ -0,0 +1,406 @@
+"""
+Incremental phenology updates for near-real-time monitoring.
+
+A ``PhenologyState`` keeps what is needed to extend one field's analysis when
+new HLS scenes arrive: the tail of the daily raw and smoothed series, the
+candidate peaks and valleys, and the detected events. ``IncrementalPhenology``
+re-interpolates, re-smooths and re-searches extrema only in the window that the
+new scenes can affect, so an update costs O(new days + window size) instead of
+a full rerun over the whole archive:
+
+    engine = IncrementalPhenology(window_size=30, poly_order=3, order_ndvi=30, threshold=0.3)
+    state = PhenologyState('field-42')
+    engine.update(state, history_df)          # first call: full analysis
+    changes = engine.update(state, new_scenes_df)
+    # {'eos_der': {'old': None, 'new': (Timestamp('2024-03-02'), 0.61)}, ...}
+
+Events match ``BatchPhenology`` run on the whole daily series (interpolated as in
+``HLS.process_dataframe`` and smoothed with ``SavitzkyGolaySmoother``). Seasons
+that end before the retained tail are frozen with the values they had when they
+left it.
+"""
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from . import instrumentation
+from .phenology_batch import EVENTS, BatchPhenology
+from .smoothing import SavitzkyGolaySmoother
+
+
+def parse_day_numbers(dates):
+    """
+    Parses dates (YYYYMMDD strings, datetimes or datetime64) into integer days since 1970-01-01.
+
+    Unlike ``phenology_batch.day_numbers``, which takes a datetime64 axis and returns floats
+    with NaN for NaT, this accepts the scene date strings of ``HLS.fetch_scenes``.
+    """
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def day_dates(days):
+    """Converts integer days since 1970-01-01 to datetime64[ns] dates."""
+    return np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]')
+
+
+class PhenologyState:
+    """
+    Persistent state of one field between incremental updates.
+
+    Attributes:
+        field_id: ID of the field.
+        origin (int): Day (since 1970-01-01) of the first retained daily value; None before the first update.
+        ndvi (np.ndarray): Daily interpolated NDVI from ``origin`` to the last scene.
+        smoothed (np.ndarray): Savitzky-Golay smoothed ``ndvi`` (NaN while shorter than the window).
+        scene_days (np.ndarray): Days of the retained scenes; the first one is ``origin``.
+        scene_values (np.ndarray): NDVI of the retained scenes.
+        peaks (dict): Smoothed value of every candidate peak at or after ``live_from``, by day.
+        valleys (dict): Smoothed value of every candidate valley at or after ``live_from``, by day.
+        live_from (int): Extrema before this day have been dropped from ``peaks`` and ``valleys``.
+        archived (tuple): (day, value, events) of the highest dropped peak, or None.
+        events (dict): (day, smoothed value) of every event in ``EVENTS``, None where missing.
+        frozen_until (int): New scenes must be later than this day.
+    """
+
+    def __init__(self, field_id=None):
+        self.field_id = field_id
+        self.origin = None
+        self.ndvi = np.empty(0)
+        self.smoothed = np.empty(0)
+        self.scene_days = np.empty(0, dtype=np.int64)
+        self.scene_values = np.empty(0)
+        self.peaks = {}
+        self.valleys = {}
+        self.live_from = None
+        self.archived = None
+        self.events = dict.fromkeys(EVENTS)
+        self.frozen_until = None
+
+    def event_dates(self):
+        """
+        Returns the detected events as dates.
+
+        Returns:
+            dict: (pd.Timestamp, smoothed value) of every event in ``EVENTS``, None where missing.
+        """
+        return {name: None if event is None else (pd.Timestamp(int(event[0]), unit='D'), event[1])
+                for name, event in self.events.items()}
+
+    def to_dict(self):
+        """Returns the state as plain Python types, e.g. to store it as JSON between runs."""
+        def events(values):
+            return {name: None if event is None else [int(event[0]), float(event[1])]
+                    for name, event in values.items()}
+
+        return {
+            'field_id': self.field_id,
+            'origin': self.origin,
+            'ndvi': self.ndvi.tolist(),
+            'smoothed': [None if np.isnan(value) else value for value in self.smoothed.tolist()],
+            'scene_days': self.scene_days.tolist(),
+            'scene_values': self.scene_values.tolist(),
+            'peaks': [[int(day), float(value)] for day, value in self.peaks.items()],
+            'valleys': [[int(day), float(value)] for day, value in self.valleys.items()],
+            'live_from': self.live_from,
+            'archived': None if self.archived is None else
+            [int(self.archived[0]), float(self.archived[1]),
+             None if self.archived[2] is None else events(self.archived[2])],
+            'events': events(self.events),
+            'frozen_until': self.frozen_until,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds a state saved with ``to_dict``."""
+        def events(values):
+            return {name: None if event is None else (int(event[0]), float(event[1]))
+                    for name, event in values.items()}
+
+        state = cls(data['field_id'])
+        state.origin = data['origin']
+        state.ndvi = np.asarray(data['ndvi'], dtype=float)
+        state.smoothed = np.asarray([np.nan if value is None else value for value in data['smoothed']], dtype=float)
+        state.scene_days = np.asarray(data['scene_days'], dtype=np.int64)
+        state.scene_values = np.asarray(data['scene_values'], dtype=float)
+        state.peaks = {day: value for day, value in data['peaks']}
+        state.valleys = {day: value for day, value in data['valleys']}
+        state.live_from = data['live_from']
+        archived = data['archived']
+        state.archived = None if archived is None else \
+            (archived[0], archived[1], None if archived[2] is None else events(archived[2]))
+        state.events = events(data['events'])
+        state.frozen_until = data['frozen_until']
+        return state
+
+
+class IncrementalPhenology:
+    """
+    Updates the phenology of a field from the scenes acquired since its last update.
+
+    Attributes:
+        smoother (SavitzkyGolaySmoother): Smoother of the daily series.
+        order_ndvi (int): Order parameter for finding extrema.
+        threshold (float): NDVI threshold used for the absolute BOS/EOS.
+        margin (int): Days kept before the affected window so it can be recomputed exactly.
+    """
+
+    def __init__(self, window_size=30, poly_order=3, order_ndvi=30, threshold=0.3):
+        self.smoother = SavitzkyGolaySmoother(window_size, poly_order)
+        self.window_size = window_size
+        self.order_ndvi = order_ndvi
+        self.threshold = threshold
+        self.margin = 2 * window_size + 2 * order_ndvi
+
+    def new_scenes(self, state, scenes):
+        """
+        Cleans the new scenes like ``HLS.process_dataframe`` and drops the ones already in the state.
+
+        Args:
+            scenes (pd.DataFrame): Per-scene rows with 'date' and 'ndvi' columns.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Sorted days and NDVI of the new scenes.
+
+        Raises:
+            ValueError: If a scene is not later than ``state.frozen_until``.
+        """
+        scenes = scenes[['date', 'ndvi']].dropna()
+        days, values = parse_day_numbers(scenes['date']), scenes['ndvi'].to_numpy(dtype=float)
+        order = np.argsort(days, kind='stable')
+        days, first = np.unique(days[order], return_index=True)
+        values = values[order][first]
+        fresh = ~np.isin(days, state.scene_days)
+        days, values = days[fresh], values[fresh]
+
+        if len(days) and state.frozen_until is not None and days[0] <= state.frozen_until:
+            raise ValueError(f"Scene of {np.datetime64(int(days[0]), 'D')} is older than the retained tail of field "
+                             f"{state.field_id} (frozen until {np.datetime64(state.frozen_until, 'D')}); "
+                             "rerun the full analysis")
+        return days, values
+
+    def update(self, state, scenes):
+        """
+        Adds new scenes to ``state`` and updates its events in place.
+
+        Args:
+            state (PhenologyState): State of the field; an empty state runs the full analysis.
+            scenes (pd.DataFrame): New per-scene rows with 'date' and 'ndvi' columns.
+
+        Returns:
+            dict: For every event whose date or value changed, {'old': ..., 'new': ...} with
+            (pd.Timestamp, value) tuples, None where the event is missing.
+        """
+        with instrumentation.span('incremental', field_id=state.field_id, rows_in=len(scenes)) as span:
+            days, values = self.new_scenes(state, scenes)
+            if not len(days):
+                return {}
+            previous = state.event_dates()
+
+            changed = self.resample(state, days, values)
+            smoothed_from = self.smooth(state, changed)
+            self.update_extrema(state, smoothed_from)
+            self.update_events(state, smoothed_from)
+            self.prune(state)
+
+            current = state.event_dates()
+            changes = {name: {'old': previous[name], 'new': current[name]}
+                       for name in EVENTS if previous[name] != current[name]}
+            span.add(rows_out=len(changes))
+        return changes
+
+    def resample(self, state, days, values):
+        """
+        Merges the new scenes and re-interpolates the daily series from the scene before the first new one.
+
+        Returns:
+            int: Index of the first daily value that may have changed.
+        """
+        position = np.searchsorted(state.scene_days, days[0])
+        state.scene_days = np.concatenate([state.scene_days, days])
+        state.scene_values = np.concatenate([state.scene_values, values])
+        order = np.argsort(state.scene_days, kind='stable')
+        state.scene_days, state.scene_values = state.scene_days[order], state.scene_values[order]
+
+        if state.origin is None:
+            state.origin = int(state.scene_days[0])
+        anchor = int(state.scene_days[max(position - 1, 0)])
+        changed = anchor - state.origin
+        columns = np.arange(anchor, state.scene_days[-1] + 1)
+        state.ndvi = np.concatenate([state.ndvi[:changed],
+                                     np.interp(columns, state.scene_days, state.scene_values)])
+        return changed
+
+    def smooth(self, state, changed):
+        """
+        Re-smooths the part of the series whose filter window reaches the changed values.
+
+        Savitzky-Golay outputs depend on at most ``window_size`` neighbours on each side,
+        and the last ones on the polynomial fitted to the final window, so values more
+        than one window before ``changed`` are kept and one more window of context is
+        filtered to reproduce the full-length result exactly.
+
+        Returns:
+            int: Index of the first smoothed value that may have changed.
+        """
+        n_days, window = len(state.ndvi), self.window_size
+        if n_days < window:
+            state.smoothed = np.full(n_days, np.nan)
+            return 0
+
+        valid = len(state.smoothed) >= window
+        start = max(0, changed - window) if valid else 0
+        context = max(0, min(start - window, n_days - window))
+        part = self.smoother.smooth(state.ndvi[context:])[0]
+        state.smoothed = np.concatenate([state.smoothed[:start], part[start - context:]])
+        return start
+
+    def update_extrema(self, state, smoothed_from):
+        """Searches peaks and valleys again where the comparison window reaches changed smoothed values."""
+        if np.isnan(state.smoothed).all():
+            return
+        order = self.order_ndvi
+        first = max(0, smoothed_from - order)
+        context = max(0, first - order)
+        floor = state.origin + first
+        if state.live_from is not None:
+            floor = max(floor, state.live_from)
+        state.peaks = {day: value for day, value in state.peaks.items() if day < floor}
+        state.valleys = {day: value for day, value in state.valleys.items() if day < floor}
+
+        values = state.smoothed[context:]
+        engine = BatchPhenology(day_dates(state.origin + context + np.arange(len(values))), values, values,
+                                order_ndvi=order)
+        for mask, candidates in zip(engine.find_extrema(), (state.peaks, state.valleys)):
+            for column in np.flatnonzero(mask[0]):
+                day = state.origin + context + int(column)
+                if day >= floor:
+                    candidates[day] = float(values[column])
+
+    def bracket(self, state, pos):
+        """Returns the last valley before and the first valley after ``pos`` (None where missing)."""
+        valleys = sorted(state.valleys)
+        index = bisect_left(valleys, pos)
+        vos_start = valleys[index - 1] if index > 0 else None
+        vos_end = valleys[index] if index < len(valleys) else None
+        return vos_start, vos_end
+
+    def season_events(self, state, vos_start, pos, vos_end):
+        """
+        Computes the events of one valley-peak-valley season on the retained series.
+
+        Returns:
+            dict: (day, smoothed value) of every event in ``EVENTS``, None where missing.
+        """
+        start, end = vos_start - state.origin, vos_end - state.origin + 1
+        engine = BatchPhenology(day_dates(np.arange(vos_start, vos_end + 1)), state.ndvi[start:end],
+                                state.smoothed[start:end], threshold=self.threshold)
+        events = {'vos_start': np.array([0]), 'vos_end': np.array([vos_end - vos_start]),
+                  'pos': np.array([pos - vos_start])}
+        events.update(engine.find_bos_eos_der(events))
+        events.update(engine.find_bos_eos_abs(events))
+        return {name: None if events[name][0] < 0 else
+                (vos_start + int(events[name][0]), float(engine.smoothed[0, events[name][0]]))
+                for name in EVENTS}
+
+    def update_events(self, state, smoothed_from):
+        """
+        Selects the highest peak and its bracketing valleys, as ``BatchPhenology.find_vos_pos``.
+
+        BOS/EOS are recomputed only when the season changed or its window reaches the
+        re-smoothed part of the series.
+        """
+        live = max(state.peaks.items(), key=lambda item: (item[1], -item[0]), default=None)
+        if state.archived is not None and (live is None or state.archived[1] >= live[1]):
+            state.events = state.archived[2] or dict.fromkeys(EVENTS)
+            return
+        if live is None:
+            state.events = dict.fromkeys(EVENTS)
+            return
+
+        pos = live[0]
+        vos_start, vos_end = self.bracket(state, pos)
+        if vos_start is None or vos_end is None:
+            state.events = dict.fromkeys(EVENTS)
+            return
+
+        current = state.events
+        unchanged = current['pos'] is not None and \
+            (current['vos_start'][0], current['pos'][0], current['vos_end'][0]) == (vos_start, pos, vos_end)
+        if unchanged and vos_end < state.origin + smoothed_from:
+            return
+        state.events = self.season_events(state, vos_start, pos, vos_end)
+
+    def prune(self, state):
+        """
+        Drops the part of the series that new scenes can no longer affect.
+
+        Every dropped peak has a final season and every kept peak has its whole
+        season in the tail; the highest dropped peak is archived together with its
+        events.
+        """
+        last = int(state.scene_days[-1])
+        # Values and extrema before ``limit`` can no longer change; the tail starts at the
+        # last valley before it, which opens the season of every later peak
+        limit = last - self.margin
+        valleys = [day for day in state.valleys if day <= limit]
+        keep = max(valleys, default=limit)
+
+        if state.live_from is not None:
+            keep = max(keep, state.live_from)
+        if keep <= state.origin:
+            state.frozen_until = self.frozen_until(state)
+            return
+
+        for day in sorted(state.peaks):
+            if day >= keep:
+                break
+            value = state.peaks[day]
+            if state.archived is None or value > state.archived[1]:
+                vos_start, vos_end = self.bracket(state, day)
+                events = None
+                if vos_start is not None and vos_end is not None and vos_start >= state.origin:
+                    events = self.season_events(state, vos_start, day, vos_end)
+                state.archived = (day, value, events)
+
+        state.peaks = {day: value for day, value in state.peaks.items() if day >= keep}
+        state.valleys = {day: value for day, value in state.valleys.items() if day >= keep}
+        state.live_from = keep
+
+        # The tail starts at a scene, so the series can be re-interpolated from it
+        first = np.searchsorted(state.scene_days, keep, side='right') - 1
+        origin = int(state.scene_days[first])
+        state.ndvi = state.ndvi[origin - state.origin:]
+        state.smoothed = state.smoothed[origin - state.origin:]
+        state.scene_days, state.scene_values = state.scene_days[first:], state.scene_values[first:]
+        state.origin = origin
+        state.frozen_until = self.frozen_until(state)
+
+    def frozen_until(self, state):
+        """Returns the last day that new scenes may not precede without a full rerun."""
+        if state.live_from is None:
+            # Nothing was dropped yet, so any scene after the first one can be merged
+            return state.origin
+        index = np.searchsorted(state.scene_days, state.origin + self.margin)
+        return int(state.scene_days[min(index, len(state.scene_days) - 1)])
+
+    def update_fields(self, states, scenes, field_column='field_id'):
+        """
+        Updates many fields from one table of new scenes.
+
+        Args:
+            states (dict): ``PhenologyState`` by field ID; missing fields get a new state.
+            scenes (pd.DataFrame): New per-scene rows with the field ID, 'date' and 'ndvi' columns.
+            field_column (str): Column holding the field ID.
+
+        Returns:
+            pd.DataFrame: One row per changed event: 'field_id', 'event', 'old_date', 'old_value',
+            'new_date' and 'new_value'.
+        """
+        rows = []
+        for field_id, field_scenes in scenes.groupby(field_column, sort=False):
+            state = states.setdefault(field_id, PhenologyState(field_id))
+            for name, change in self.update(state, field_scenes).items():
+                old, new = change['old'] or (pd.NaT, np.nan), change['new'] or (pd.NaT, np.nan)
+                rows.append((field_id, name, *old, *new))
+        return pd.DataFrame(rows, columns=['field_id', 'event', 'old_date', 'old_value', 'new_date', 'new_value'])
@@ -0,0 +1,244 @@
+"""
+Per-stage timing and counters shared by all controllers.
+
+Stages report spans (wall and CPU time, rows in and out, Earth Engine bytes
+received, failures) to a process-wide ``Instrumentation`` registry. Recording is
+off by default; while disabled, ``span`` returns a shared no-op object, so the
+hooks in the controllers cost one attribute check per call:
+
+    from src.controllers import instrumentation
+
+    instrumentation.enable()
+    with instrumentation.field('field-42'):
+        ndvi_df = HLS(geometry, start, end).convert_to_dataframe()
+    instrumentation.INSTRUMENTATION.write_prometheus('metrics.prom')
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+
+# Field currently being processed; spans opened without an explicit field ID use it
+CURRENT_FIELD = contextvars.ContextVar('current_field', default=None)
+
+COUNTERS = ('calls', 'wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out', 'ee_bytes', 'failures')
+
+
+class NullSpan:
+    """Span returned while instrumentation is disabled; every operation is a no-op."""
+
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add(self, **counts):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """
+    Times one execution of a stage and collects its counters.
+
+    CPU time is measured with ``time.thread_time``, so concurrent spans in a
+    thread pool do not count each other's work.
+    """
+
+    enabled = True
+
+    def __init__(self, registry, stage, field_id=None, rows_in=0):
+        self.registry = registry
+        self.stage = stage
+        self.field_id = field_id if field_id is not None else CURRENT_FIELD.get()
+        self.counts = {'rows_in': rows_in, 'rows_out': 0, 'ee_bytes': 0}
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.cpu_started = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.record(self.stage, field_id=self.field_id,
+                             wall_seconds=time.perf_counter() - self.started,
+                             cpu_seconds=time.thread_time() - self.cpu_started,
+                             failed=exc_type is not None,
+                             error=None if exc_value is None else f"{exc_type.__name__}: {exc_value}",
+                             **self.counts)
+        return False
+
+    def add(self, **counts):
+        """Adds to the span counters ('rows_in', 'rows_out' or 'ee_bytes')."""
+        for name, value in counts.items():
+            self.counts[name] += value
+
+
+class Instrumentation:
+    """
+    Registry of stage spans with per-stage totals and per-field records.
+
+    Attributes:
+        enabled (bool): Whether spans are recorded.
+        totals (dict): Counters of every stage (see ``COUNTERS``), by stage name.
+        records (list): One dict per finished span, exported as JSON lines.
+        max_records (int): Per-span records kept in memory; totals are always updated.
+    """
+
+    def __init__(self, enabled=False, max_records=1_000_000):
+        self.enabled = enabled
+        self.max_records = max_records
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drops all recorded spans and totals."""
+        with self.lock:
+            self.totals = {}
+            self.records = []
+            self.dropped = 0
+
+    def span(self, stage, field_id=None, rows_in=0):
+        """
+        Opens a span of ``stage``; use it as a context manager.
+
+        Args:
+            stage (str): Stage name, e.g. 'hls.fetch' or 'bos_eos'.
+            field_id (optional): Field being processed (defaults to the one set with ``field``).
+            rows_in (int): Number of input rows.
+
+        Returns:
+            Span: The span, or a shared no-op span while disabled.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, stage, field_id, rows_in)
+
+    def record(self, stage, field_id=None, wall_seconds=0.0, cpu_seconds=0.0, rows_in=0, rows_out=0,
+               ee_bytes=0, failed=False, error=None, timestamp=None):
+        """
+        Adds one finished execution of a stage (used by spans and by stages timed elsewhere).
+
+        ``timestamp`` is the end time of the execution (now by default).
+        """
+        if not self.enabled:
+            return
+        values = {'calls': 1, 'wall_seconds': wall_seconds, 'cpu_seconds': cpu_seconds, 'rows_in': rows_in,
+                  'rows_out': rows_out, 'ee_bytes': ee_bytes, 'failures': int(failed)}
+        with self.lock:
+            totals = self.totals.setdefault(stage, dict.fromkeys(COUNTERS, 0))
+            for name, value in values.items():
+                totals[name] += value
+            if len(self.records) < self.max_records:
+                self.records.append({'stage': stage, 'field_id': field_id,
+                                     'time': time.time() if timestamp is None else timestamp,
+                                     **values, 'error': error})
+            else:
+                self.dropped += 1
+
+    def merge(self, records):
+        """Adds records collected in another process (see ``drain``), keeping their end times."""
+        for record in records:
+            self.record(record['stage'], field_id=record['field_id'], wall_seconds=record['wall_seconds'],
+                        cpu_seconds=record['cpu_seconds'], rows_in=record['rows_in'],
+                        rows_out=record['rows_out'], ee_bytes=record['ee_bytes'],
+                        failed=bool(record['failures']), error=record['error'], timestamp=record['time'])
+
+    def drain(self):
+        """Returns the recorded spans and resets the registry, e.g. to ship them from a worker process."""
+        with self.lock:
+            records = self.records
+            self.totals, self.records, self.dropped = {}, [], 0
+        return records
+
+    def summary(self):
+        """
+        Returns the totals of every stage.
+
+        Returns:
+            dict: Counters by stage name, with the mean wall time per call.
+        """
+        with self.lock:
+            return {stage: {**totals, 'wall_seconds_mean': totals['wall_seconds'] / totals['calls']}
+                    for stage, totals in sorted(self.totals.items())}
+
+    def log_summary(self, logger):
+        """Logs the calls, wall time and failures of every stage at INFO level."""
+        for stage, totals in self.summary().items():
+            logger.info("%-24s calls=%d wall=%.1fs failures=%d", stage, totals['calls'], totals['wall_seconds'],
+                        totals['failures'])
+
+    def write_jsonl(self, path):
+        """
+        Appends one JSON line per recorded span to ``path``.
+
+        Written records are dropped from memory, so a long run can call this
+        periodically; the stage totals are kept.
+        """
+        with self.lock:
+            records, self.records = self.records, []
+        with open(path, 'a') as file:
+            file.writelines(json.dumps(record, default=str) + '\n' for record in records)
+
+    def write_prometheus(self, path, prefix='ndvi'):
+        """
+        Writes the stage totals in the Prometheus text format (for the node_exporter textfile collector).
+
+        The file is replaced atomically, so a scrape never sees a partial file.
+        """
+        lines = []
+        totals = self.summary()
+        for name in COUNTERS:
+            metric = f'{prefix}_stage_{name}_total'
+            lines.append(f'# TYPE {metric} counter')
+            lines.extend(f'{metric}{{stage="{stage}"}} {values[name]}' for stage, values in totals.items())
+
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(temporary, path)
+
+
+INSTRUMENTATION = Instrumentation()
+
+
+def enable():
+    """Starts recording spans in the process-wide registry."""
+    INSTRUMENTATION.enabled = True
+
+
+def disable():
+    """Stops recording spans; recorded data is kept."""
+    INSTRUMENTATION.enabled = False
+
+
+def span(stage, field_id=None, rows_in=0):
+    """Opens a span in the process-wide registry (see ``Instrumentation.span``)."""
+    if not INSTRUMENTATION.enabled:
+        return NULL_SPAN
+    return Span(INSTRUMENTATION, stage, field_id, rows_in)
+
+
+class field:
+    """
+    Context manager that sets the field ID of the spans opened inside it.
+
+        with instrumentation.field(field_id):
+            ...
+    """
+
+    def __init__(self, field_id):
+        self.field_id = field_id
+
+    def __enter__(self):
+        self.token = CURRENT_FIELD.set(self.field_id)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        CURRENT_FIELD.reset(self.token)
+        return False
@@ -0,0 +1,325 @@
+"""
+Offline HLS backend reading scenes from local GeoTIFF/COG files.
+
+Scenes are found by their HLS v2.0 file names, one file per band:
+
+    HLS.L30.T22JBT.2023005T133205.v2.0.B04.tif   red
+    HLS.L30.T22JBT.2023005T133205.v2.0.B05.tif   NIR (B8A for S30)
+    HLS.L30.T22JBT.2023005T133205.v2.0.Fmask.tif
+
+All polygons are rasterized once per raster grid (CRS, transform and shape,
+i.e. once per MGRS tile). Each scene is then read once, as the window covering
+the polygons of its tile, masked like ``HLS.extract_fmask_bitwise`` and reduced
+to the statistics of every polygon in one vectorized pass. Scenes are processed
+by a thread pool (GDAL releases the GIL while reading and decompressing).
+
+    local = LocalHLS('tiles/', processador.iterar_poligonos(), '2022-10-01', '2023-05-01')
+    ndvi_df = local.convert_to_dataframe()  # same columns as HLSMultiField.convert_to_dataframe
+
+rasterio is imported on first use.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from . import instrumentation
+from .hls_scenes import daily_fields, fmask_clear
+
+# HLS v2.0 file names: HLS.<product>.T<tile>.<YYYYDDD>T<HHMMSS>.v<version>.<band>.tif
+HLS_FILENAME = re.compile(r'^(?P<scene>HLS\.(?P<product>[LS]30)\.T(?P<tile>\w{5})\.(?P<date>\d{7})T\d{6}\.v[\d.]+)'
+                          r'\.(?P<band>\w+)\.tiff?$', re.IGNORECASE)
+
+# Red and NIR band of each HLS product
+PRODUCT_BANDS = {'L30': ('B04', 'B05'), 'S30': ('B04', 'B8A')}
+
+# Fmask value of pixels outside the scene footprint
+FMASK_FILL = 255
+
+STATISTICS = ('median', 'mean', 'count')
+
+
+def find_scenes(directory, start_date=None, end_date=None, products=('L30',)):
+    """
+    Lists the complete HLS scenes (red, NIR and Fmask files) under a directory.
+
+    Args:
+        directory (str): Directory searched recursively.
+        start_date (str, optional): First date, "YYYY-MM-DD".
+        end_date (str, optional): End date, "YYYY-MM-DD" (exclusive, as in ``ee.Filter.date``).
+        products (tuple): HLS products to include ('L30' and/or 'S30').
+
+    Returns:
+        list[dict]: One dict per scene, sorted by date and ID: 'id', 'date' (YYYYMMDD), 'tile' and the
+        'red', 'nir' and 'fmask' file paths.
+    """
+    start = start_date.replace('-', '') if start_date else '00000000'
+    end = end_date.replace('-', '') if end_date else '99999999'
+    scenes = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            match = HLS_FILENAME.match(name)
+            if match is None or match['product'].upper() not in products:
+                continue
+            red, nir = PRODUCT_BANDS[match['product'].upper()]
+            role = {red: 'red', nir: 'nir', 'FMASK': 'fmask'}.get(match['band'].upper())
+            if role is None:
+                continue
+            date = datetime.strptime(match['date'], '%Y%j').strftime('%Y%m%d')
+            scene = scenes.setdefault(match['scene'], {'id': match['scene'], 'date': date, 'tile': match['tile']})
+            scene[role] = os.path.join(root, name)
+
+    complete = [scene for scene in scenes.values()
+                if {'red', 'nir', 'fmask'} <= scene.keys() and start <= scene['date'] < end]
+    return sorted(complete, key=lambda scene: (scene['date'], scene['id']))
+
+
+class PolygonGrid:
+    """
+    Polygons rasterized on one raster grid.
+
+    Attributes:
+        window (rasterio.windows.Window): Smallest window holding every polygon touching the grid.
+        pixels (np.ndarray): Flat indexes (within the window) of the polygon pixels, grouped by polygon.
+        fields (np.ndarray): Index of the polygon of every group.
+        starts (np.ndarray): Start of every group in ``pixels``.
+        segment (np.ndarray): Group number of every entry of ``pixels``.
+    """
+
+    def __init__(self, window, pixels, fields, starts, segment):
+        self.window = window
+        self.pixels = pixels
+        self.fields = fields
+        self.starts = starts
+        self.segment = segment
+
+    @property
+    def totals(self):
+        """Number of pixels of every polygon."""
+        return np.diff(np.append(self.starts, len(self.pixels)))
+
+
+class LocalHLS:
+    """
+    Extracts per-polygon NDVI statistics of local HLS scenes.
+
+    Pixels are assigned to a polygon when their center falls inside it (as with
+    ``reduceRegion`` at the native 30 m scale); where polygons overlap, a pixel
+    belongs to the polygon listed last. Field/scene pairs without any clear
+    pixel are dropped, like the null statistics of ``HLSMultiField``.
+
+    Attributes:
+        scenes (list): Scenes as returned by ``find_scenes``.
+        field_ids (list): ID of every polygon.
+        vertices (list): Exterior ring of every polygon, as (x, y) arrays in ``crs``.
+        id_property (str): Name of the field ID column.
+        reducers (tuple): 'median', 'mean', 'count' and/or 'valid_fraction'; the first statistic fills 'ndvi'.
+        crs (str): CRS of the vertices.
+        min_valid_fraction (float): Field/scene pairs with a lower clear-pixel fraction are dropped.
+        workers (int): Number of scenes read concurrently.
+    """
+
+    def __init__(self, scenes, polygons, start_date=None, end_date=None, id_property='field_id',
+                 reducers=('median',), crs='EPSG:4326', min_valid_fraction=None, products=('L30',), workers=None):
+        """
+        Args:
+            scenes (str or list): Directory holding the scene files, or scenes as returned by ``find_scenes``.
+            polygons (iterable): (field ID, vertices) pairs, as yielded by ``ProcessadorGeoDataFrame.iterar_poligonos``.
+            start_date (str, optional): Start date in "YYYY-MM-DD" format (used with a directory).
+            end_date (str, optional): End date in "YYYY-MM-DD" format, exclusive (used with a directory).
+            id_property (str): Name of the field ID column.
+            reducers (tuple): Statistics to compute, as in ``HLS``.
+            crs (str): CRS of the vertices.
+            min_valid_fraction (float, optional): Minimum fraction of clear pixels of a field/scene pair.
+            products (tuple): HLS products to read from a directory.
+            workers (int, optional): Number of scenes read concurrently (defaults to the CPU count).
+        """
+        self.scenes = find_scenes(scenes, start_date, end_date, products) if isinstance(scenes, str) else list(scenes)
+        polygons = list(polygons)
+        self.field_ids = [field_id for field_id, vertices in polygons]
+        self.vertices = [np.asarray(vertices, dtype=float)[:, :2] for field_id, vertices in polygons]
+        self.id_property = id_property
+        self.reducers = tuple(reducers)
+        self.crs = crs
+        self.min_valid_fraction = min_valid_fraction
+        self.workers = workers or os.cpu_count()
+
+        self.statistics = [reducer for reducer in self.reducers if reducer != 'valid_fraction']
+        if not self.statistics:
+            raise ValueError("reducers must include at least one of " + ", ".join(STATISTICS))
+        unknown = set(self.statistics) - set(STATISTICS)
+        if unknown:
+            raise ValueError(f"Unknown reducers: {sorted(unknown)}")
+        self.valid_fraction = 'valid_fraction' in self.reducers or min_valid_fraction is not None
+
+        self.grids = {}
+        self.lock = threading.Lock()
+
+    def statistic_columns(self):
+        """
+        Names the statistic columns like ``HLS.statistic_columns``.
+
+        Returns:
+            list: (statistic, column) pairs; the first statistic maps to 'ndvi'.
+        """
+        columns = [(name, 'ndvi' if len(self.statistics) == 1 else f'ndvi_{name}') for name in self.statistics]
+        columns[0] = (columns[0][0], 'ndvi')
+        if self.valid_fraction:
+            columns.append(('valid_fraction', 'valid_fraction'))
+        return columns
+
+    def grid(self, dataset):
+        """Returns the polygons rasterized on the grid of ``dataset``, rasterizing them on first use."""
+        key = (dataset.crs.to_string(), tuple(dataset.transform)[:6], dataset.width, dataset.height)
+        with self.lock:
+            if key not in self.grids:
+                with instrumentation.span('local_hls.rasterize', rows_in=len(self.vertices)) as span:
+                    self.grids[key] = self.rasterize(dataset)
+                    span.add(rows_out=0 if self.grids[key] is None else len(self.grids[key].fields))
+            return self.grids[key]
+
+    def rasterize(self, dataset):
+        """
+        Rasterizes every polygon touching the raster extent of ``dataset``.
+
+        Returns:
+            PolygonGrid: The rasterized polygons, or None if no polygon touches the grid.
+        """
+        from rasterio import features, warp, windows
+
+        if not self.vertices:
+            return None
+        sizes = np.array([len(vertices) for vertices in self.vertices])
+        points = np.concatenate(self.vertices)
+        xs, ys = warp.transform(self.crs, dataset.crs, points[:, 0], points[:, 1])
+        columns, rows = ~dataset.transform * (np.asarray(xs), np.asarray(ys))
+
+        # Pixel bounding box of every polygon, clipped to the raster
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        col_min = np.floor(np.minimum.reduceat(columns, offsets)).clip(0, dataset.width).astype(int)
+        col_max = np.ceil(np.maximum.reduceat(columns, offsets)).clip(0, dataset.width).astype(int)
+        row_min = np.floor(np.minimum.reduceat(rows, offsets)).clip(0, dataset.height).astype(int)
+        row_max = np.ceil(np.maximum.reduceat(rows, offsets)).clip(0, dataset.height).astype(int)
+        inside = np.flatnonzero((col_max > col_min) & (row_max > row_min))
+        if not len(inside):
+            return None
+
+        window = windows.Window(col_min[inside].min(), row_min[inside].min(),
+                                col_max[inside].max() - col_min[inside].min(),
+                                row_max[inside].max() - row_min[inside].min())
+        shapes = [({'type': 'Polygon', 'coordinates': [list(zip(xs[offsets[field]:offsets[field] + sizes[field]],
+                                                                 ys[offsets[field]:offsets[field] + sizes[field]]))]},
+                   field + 1) for field in inside.tolist()]
+        labels = features.rasterize(shapes, out_shape=(window.height, window.width),
+                                    transform=windows.transform(window, dataset.transform), fill=0, dtype='int32')
+
+        # Group the polygon pixels by polygon
+        labels = labels.ravel()
+        pixels = np.flatnonzero(labels)
+        pixels = pixels[np.argsort(labels[pixels], kind='stable')]
+        if not len(pixels):
+            return None
+        fields, starts, counts = np.unique(labels[pixels] - 1, return_index=True, return_counts=True)
+        segment = np.repeat(np.arange(len(fields)), counts)
+        return PolygonGrid(window, pixels, fields, starts, segment)
+
+    def reduce_scene(self, scene):
+        """
+        Reads one scene and reduces it over every polygon of its grid.
+
+        Returns:
+            dict: Arrays 'field' (polygon index) and one array per statistic column, one entry per
+            polygon with at least one clear pixel.
+        """
+        import rasterio
+
+        with instrumentation.span('local_hls.scene') as span, rasterio.open(scene['fmask']) as fmask_file, \
+                rasterio.open(scene['red']) as red_file, rasterio.open(scene['nir']) as nir_file:
+            grid = self.grid(fmask_file)
+            if grid is None:
+                return None
+            fmask = fmask_file.read(1, window=grid.window).ravel()[grid.pixels]
+            red = red_file.read(1, window=grid.window).ravel()[grid.pixels].astype(float)
+            nir = nir_file.read(1, window=grid.window).ravel()[grid.pixels].astype(float)
+
+            # Same cloud and shadow test as HLS.extract_fmask_bitwise, plus fill and nodata pixels
+            valid = fmask_clear(fmask) & (fmask != FMASK_FILL) & (nir + red != 0)
+            for band, dataset in ((red, red_file), (nir, nir_file)):
+                if dataset.nodata is not None:
+                    valid &= band != dataset.nodata
+            segment = grid.segment[valid]
+            ndvi = (nir[valid] - red[valid]) / (nir[valid] + red[valid])
+
+            counts = np.bincount(segment, minlength=len(grid.fields))
+            found = counts > 0
+            result = {'field': grid.fields[found]}
+            for name, column in self.statistic_columns():
+                if name == 'median':
+                    result[column] = self.segment_median(ndvi, segment, counts)[found]
+                elif name == 'mean':
+                    result[column] = np.bincount(segment, ndvi, minlength=len(grid.fields))[found] / counts[found]
+                elif name == 'count':
+                    result[column] = counts[found]
+                else:
+                    result[column] = counts[found] / grid.totals[found]
+            if self.min_valid_fraction is not None:
+                keep = counts[found] / grid.totals[found] >= self.min_valid_fraction
+                result = {name: values[keep] for name, values in result.items()}
+            span.add(rows_in=len(grid.pixels), rows_out=len(result['field']))
+        return result
+
+    @staticmethod
+    def segment_median(values, segment, counts):
+        """Median of ``values`` within every segment, NaN for empty segments."""
+        order = np.lexsort((values, segment))
+        ordered = values[order]
+        starts = np.cumsum(counts) - counts
+        lower = ordered[np.minimum(starts + (counts - 1) // 2, len(ordered) - 1)] if len(ordered) else 0.0
+        upper = ordered[np.minimum(starts + counts // 2, len(ordered) - 1)] if len(ordered) else 0.0
+        return np.where(counts > 0, (lower + upper) / 2, np.nan)
+
+    def fetch_scenes(self):
+        """
+        Reduces every scene over every polygon.
+
+        Returns:
+            pandas.DataFrame: Rows with the field id, 'date' (YYYYMMDD), 'id' and 'ndvi' columns, plus one
+            column per extra statistic, as ``HLSMultiField.features_to_dataframe``.
+        """
+        columns = [column for name, column in self.statistic_columns()]
+        results, dates, ids = [], [], []
+        with ThreadPoolExecutor(self.workers) as pool:
+            for scene, result in zip(self.scenes, pool.map(self.reduce_scene, self.scenes)):
+                if result is not None and len(result['field']):
+                    results.append(result)
+                    dates.append(np.full(len(result['field']), scene['date'], dtype=object))
+                    ids.append(np.full(len(result['field']), scene['id'], dtype=object))
+        if not results:
+            return pd.DataFrame(columns=[self.id_property, 'date', 'id'] + columns)
+
+        # One table for all scenes, built from the concatenated arrays
+        fields = np.concatenate([result['field'] for result in results])
+        return pd.DataFrame({
+            self.id_property: np.asarray(self.field_ids, dtype=object)[fields],
+            'date': np.concatenate(dates),
+            'id': np.concatenate(ids),
+            **{column: np.concatenate([result[column] for result in results]) for column in columns},
+        })
+
+    def convert_to_dataframe(self, wide=False, daily=True):
+        """
+        Converts the per-scene statistics to daily NDVI series for every field.
+
+        Args:
+            wide (bool): If True, returns one NDVI column per field indexed by date.
+            daily (bool): If False, keeps the observation dates of every field (see ``daily_fields``).
+
+        Returns:
+            pandas.DataFrame: Long table with the field id plus the columns of ``HLS.convert_to_dataframe``,
+            or a wide date x field NDVI table.
+        """
+        return daily_fields(self.fetch_scenes(), self.id_property, wide, daily)
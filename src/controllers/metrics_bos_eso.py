@@ -1,19 +1,26 @@
+import numpy as np
 import pandas as pd
 
+from . import instrumentation
+from .phenology_batch import BatchPhenology, take_dates, take_values
+
 class BosEosMetrics:
     """
     A class for analyzing NDVI (Normalized Difference Vegetation Index) data.
     """
 
-    def __init__(self, ndvi_df: pd.DataFrame, phenology_df: pd.DataFrame, threshold: float ):
+    def __init__(self, ndvi_df: pd.DataFrame, phenology_df: pd.DataFrame, threshold: float,
+                 smoothed_column: str = 'savitzky_golay'):
         """
         Initialize the NDVIAnalysis class with a pandas DataFrame.
 
         :param ndvi_df: DataFrame containing NDVI and other related data.
+        :param smoothed_column: Column of ndvi_df holding the smoothed NDVI series.
         """
         self.ndvi_df = ndvi_df
         self.phenology_df = phenology_df
         self.threshold = threshold
+        self.smoothed_column = smoothed_column
 
     def find_phenologic_dates(self):
         """
@@ -23,74 +30,64 @@ class BosEosMetrics:
         self.pos_date = self.phenology_df.loc[self.phenology_df['Phenologic'] == 'pos', 'Date'].values[0]
         self.vos_end_date = self.phenology_df.loc[self.phenology_df['Phenologic'] == 'vos_end', 'Date'].values[0]
 
-    def filter_interval(self):
+    def build_engine(self):
         """
-        Filter the DataFrame for the interval between 'vos_start' and 'vos_end'.
+        Build the batch engine over this field and locate the VOS/POS dates on its date axis.
         """
-        self.interval_df = self.ndvi_df.loc[(self.ndvi_df['date'] >= self.vos_start_date) & 
-                                            (self.ndvi_df['date'] <= self.vos_end_date)]
-
-    def calculate_first_derivative(self):
+        self.engine = BatchPhenology(self.ndvi_df['date'], self.ndvi_df['ndvi'],
+                                     self.ndvi_df[self.smoothed_column], threshold=self.threshold)
+        dates = self.engine.dates
+        self.events = {
+            'vos_start': np.searchsorted(dates, [np.datetime64(self.vos_start_date, 'ns')], side='left'),
+            'pos': np.searchsorted(dates, [np.datetime64(self.pos_date, 'ns')], side='left'),
+            'vos_end': np.searchsorted(dates, [np.datetime64(self.vos_end_date, 'ns')], side='right') - 1,
+        }
+
+    def append_events(self, names):
         """
-        Calculate the first derivative of the NDVI in the interval.
+        Append the given events of this field to the phenology DataFrame.
         """
-        self.interval_df['first_derivative'] = self.interval_df['savitzky_golay'].diff().fillna(0)
+        indexes = [self.events[name] for name in names]
+        if min(index[0] for index in indexes) < 0:
+            raise ValueError(f"Could not identify {', '.join(names)} in the phenological interval")
+
+        # Positions between two observations (absolute BOS/EOS on observation dates) are interpolated
+        rows = pd.DataFrame({
+            'Date': np.concatenate([take_dates(self.engine.dates, index) for index in indexes]),
+            'Value': np.concatenate([take_values(self.engine.smoothed, index) for index in indexes]),
+            'Phenologic': names
+        })
+
+        # Concatenate rows into a new DataFrame
+        self.phenology_df = pd.concat([self.phenology_df, rows], ignore_index=True)
 
     def identify_bos_eos_der(self):
         """
         Identify the Beginning of Season (BOS) and End of Season (EOS) in the phenological interval.
         """
-        self.BOS_date = self.interval_df['first_derivative'].idxmax()  # First peak after 'vos_start'
-        self.EOS_date = self.interval_df.loc[self.interval_df['date'] >= self.pos_date]['first_derivative'].idxmin()  # First drop after 'pos'
-
-        bos_der_start_row = pd.DataFrame({
-            'Date': [self.ndvi_df.loc[self.BOS_date, 'date']],
-            'Value': [self.ndvi_df.loc[self.BOS_date, 'savitzky_golay']],
-            'Phenologic': ['bos_der']
-        })
-
-        eos_der_start_row = pd.DataFrame({
-            'Date': [self.ndvi_df.loc[self.EOS_date, 'date']],
-            'Value': [self.ndvi_df.loc[self.EOS_date, 'savitzky_golay']],
-            'Phenologic': ['eos_der']
-        })
-
-        # Concatenate rows into a new DataFrame
-        self.phenology_df = pd.concat([self.phenology_df, bos_der_start_row, eos_der_start_row], ignore_index=True)
+        # Steepest rise after 'vos_start' and steepest drop after 'pos'
+        self.events.update(self.engine.find_bos_eos_der(self.events))
+        self.append_events(['bos_der', 'eos_der'])
 
         return self.phenology_df
 
-
     def identify_bos_eos_abs(self):
         """
         Identify the Beginning of Season (BOS) and End of Season (EOS) in the phenological interval.
         """
         # Find the two closest values to the threshold
-        self.closest_indexes = (self.interval_df['ndvi'] - self.threshold).abs().nsmallest(2).index
-
-        bos_der_start_row = pd.DataFrame({
-            'Date': [self.ndvi_df.loc[self.closest_indexes[1], 'date']],
-            'Value': [self.ndvi_df.loc[self.closest_indexes[1], 'savitzky_golay']],
-            'Phenologic': ['bos_abs']
-        })
-
-        eos_der_start_row = pd.DataFrame({
-            'Date': [self.ndvi_df.loc[self.closest_indexes[0], 'date']],
-            'Value': [self.ndvi_df.loc[self.closest_indexes[0], 'savitzky_golay']],
-            'Phenologic': ['eos_abs']
-        })
-
-        # Concatenate rows into a new DataFrame
-        self.phenology_df = pd.concat([self.phenology_df, bos_der_start_row, eos_der_start_row], ignore_index=True)
+        self.events.update(self.engine.find_bos_eos_abs(self.events))
+        self.append_events(['bos_abs', 'eos_abs'])
 
     def execute_analysis(self):
         """
         Execute the complete NDVI analysis workflow.
         """
-        self.find_phenologic_dates()
-        self.filter_interval()
-        self.calculate_first_derivative()
-        self.identify_bos_eos_der()
-        self.identify_bos_eos_abs()
+        with instrumentation.span('bos_eos', rows_in=len(self.ndvi_df)) as span:
+            self.find_phenologic_dates()
+            self.build_engine()
+            self.identify_bos_eos_der()
+            self.identify_bos_eos_abs()
+            span.add(rows_out=len(self.phenology_df))
 
         return self.phenology_df
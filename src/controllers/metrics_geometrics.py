@@ -1,79 +1,295 @@
-import pandas as pd
+import numpy as np
+
+from . import instrumentation
+from .phenology_batch import PhenologyEvents, as_float_matrix, day_numbers, is_daily
+
+# (column, kind, start event, end event, label in the long-format phenology table)
+METRICS = (
+    ('days_vos_start_vos_end', 'days', 'vos_start', 'vos_end', 'Days between vos_end and vos_start'),#1
+    ('days_eos_abs_bos_abs', 'days', 'eos_abs', 'bos_abs', 'Days between bos_abs and eos_abs'),#2
+    ('ndvi_bos_abs_pos', 'ndvi', 'bos_abs', 'pos', 'NDVI difference between bos_abs and pos'),#3
+    ('days_pos_bos_abs', 'days', 'pos', 'bos_abs', 'Days difference between bos_abs and pos'),#4
+    ('days_vos_start_bos_abs', 'days', 'vos_start', 'bos_abs', 'Days difference between vos_start and bos_abs'),#5
+    ('ndvi_vos_start_bos_abs', 'ndvi', 'vos_start', 'bos_abs', 'NDVI difference between vos_start and bos_abs'),#6
+    ('days_eos_abs_vos_end', 'days', 'eos_abs', 'vos_end', 'Days difference between vos_end and eos_abs'),#7
+    ('ndvi_eos_abs_pos', 'ndvi', 'eos_abs', 'pos', 'NDVI difference between eos_abs and pos'),#8
+    ('days_eos_abs_pos', 'days', 'eos_abs', 'pos', 'Days difference between eos_abs and pos'),#9
+    ('ndvi_vos_end_eos_abs', 'ndvi', 'vos_end', 'eos_abs', 'NDVI difference between eos_abs and vos_end'),#10
+    ('count_above_p85', 'percentile', 'eos_abs', 'bos_abs', 'Count 85% percentiles days between bos_abs and eos_abs'),#11
+)
+
+
+def nanquantile_rows(values, quantile):
+    """
+    Row-wise ``np.nanquantile`` with linear interpolation, without a Python loop over rows.
+
+    Args:
+        values (np.ndarray): Matrix (rows x columns); every row needs at least one non-NaN value.
+        quantile (float): Quantile in [0, 1].
+
+    Returns:
+        np.ndarray: One quantile per row, identical to ``np.nanquantile(values, quantile, axis=1)``.
+    """
+    # NaN values sort last, so the valid values of each row come first
+    ordered = np.sort(values, axis=1)
+    rows = np.arange(ordered.shape[0])
+    count = np.count_nonzero(~np.isnan(ordered), axis=1)
+    position = (count - 1) * quantile
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, count - 1)
+    fraction = position - lower
+
+    # Same interpolation as NumPy's, so counts of values above the quantile match exactly
+    low, high = ordered[rows, lower], ordered[rows, upper]
+    difference = high - low
+    return np.where(fraction >= 0.5, high - difference * (1 - fraction), low + difference * fraction)
+
+
+def weighted_quantile_rows(values, weights, quantile):
+    """
+    Row-wise quantile of samples that each stand for ``weights`` repeated values.
+
+    With integer weights this is the linear-interpolation quantile of the rows with every
+    sample repeated that many times, so unit weights give ``nanquantile_rows``. A sample
+    of weight w spans w consecutive positions of the ordered row; positions between two
+    samples are interpolated linearly.
+
+    Args:
+        values (np.ndarray): Matrix (rows x columns); every row needs at least one non-NaN value.
+        weights (np.ndarray): Weight of every sample, at least 1 where the value is not NaN.
+        quantile (float): Quantile in [0, 1].
+
+    Returns:
+        np.ndarray: One quantile per row.
+    """
+    order = np.argsort(values, axis=1)
+    ordered = np.take_along_axis(values, order, axis=1)
+    weights = np.take_along_axis(np.where(np.isnan(values), 0.0, weights), order, axis=1)
+    rows = np.arange(ordered.shape[0])
+    count = np.count_nonzero(~np.isnan(ordered), axis=1)
+
+    # Sample k spans the positions [ends[k] - weights[k], ends[k] - 1] of the repeated row
+    ends = np.cumsum(weights, axis=1)
+    position = (ends[:, -1] - 1) * quantile
+    sample = np.minimum((ends - 1 < position[:, None]).sum(axis=1), count - 1)
+    start = ends[rows, sample] - weights[rows, sample]
+    previous = ordered[rows, np.maximum(sample - 1, 0)]
+    fraction = position - (start - 1)
+    return np.where(position >= start, ordered[rows, sample],
+                    previous + fraction * (ordered[rows, sample] - previous))
+
+
+def weighted_days_above(values, weights, quantile):
+    """
+    Row-wise number of days above the weighted quantile of samples that stand for several days.
+
+    The days of a sample are taken as distinct values, as on the daily series linear between
+    samples, so the quantile falls between two of them: the days of the sample holding the
+    quantile position that lie after it count as above. Counting whole samples above the
+    quantile would drop those days and undercount by about half a sample on average.
+
+    Args:
+        values (np.ndarray): Matrix (rows x columns); every row needs at least one non-NaN value.
+        weights (np.ndarray): Days of every sample, at least 1 where the value is not NaN.
+        quantile (float): Quantile in [0, 1].
+
+    Returns:
+        np.ndarray: Days above the quantile per row (float, integer for integer weights).
+    """
+    percentile_value = weighted_quantile_rows(values, weights, quantile)
+    weights = np.where(np.isnan(values), 0.0, weights)
+    above = np.where(values > percentile_value[:, None], weights, 0.0).sum(axis=1)
+
+    # Days of the sample holding the quantile position that come after it
+    order = np.argsort(values, axis=1)
+    ordered = np.take_along_axis(weights, order, axis=1)
+    ends = np.cumsum(ordered, axis=1)
+    position = (ends[:, -1] - 1) * quantile
+    rows = np.arange(values.shape[0])
+    sample = np.minimum((ends - 1 < position[:, None]).sum(axis=1), values.shape[1] - 1)
+    holding = np.take_along_axis(values, order, axis=1)[rows, sample] == percentile_value
+    return above + np.where(holding, np.maximum(ends[rows, sample] - 1 - np.floor(position), 0.0), 0.0)
+
+
+def represented_days(days, window):
+    """
+    Number of days each observation stands for inside a window of an irregular series.
+
+    Every observation covers the days up to halfway to its neighbours in the window, so
+    the weights of a window add up to its length in days (and are all 1 on a daily axis).
+
+    Args:
+        days (np.ndarray): Day numbers (rows x columns), sorted along the rows.
+        window (np.ndarray): Boolean mask of the observations inside the window.
+
+    Returns:
+        np.ndarray: Days per observation, 0 outside the window.
+    """
+    n_columns = days.shape[1]
+    columns = np.arange(n_columns)
+    rows = np.arange(days.shape[0])[:, None]
+
+    # Column of the previous and of the next observation of the window, -1 / n_columns when there is none
+    previous = np.full(days.shape, -1)
+    previous[:, 1:] = np.maximum.accumulate(np.where(window, columns, -1), axis=1)[:, :-1]
+    following = np.full(days.shape, n_columns)
+    following[:, :-1] = np.minimum.accumulate(np.where(window, columns, n_columns)[:, ::-1], axis=1)[:, ::-1][:, 1:]
+
+    before = np.where(previous >= 0, (days - days[rows, np.maximum(previous, 0)]) / 2, 0.5)
+    after = np.where(following < n_columns, (days[rows, np.minimum(following, n_columns - 1)] - days) / 2, 0.5)
+    return np.where(window, before + after, 0.0)
+
+
+def integer_column(values, missing):
+    """
+    Builds a nullable Int64 column (pandas is only imported here, when a table is built).
+
+    Args:
+        values (np.ndarray): int64 values.
+        missing (np.ndarray): Boolean mask of the missing entries.
+
+    Returns:
+        pd.arrays.IntegerArray: The column.
+    """
+    import pandas as pd
+
+    return pd.arrays.IntegerArray(values, missing)
+
+
+class BatchPhenologyMetrics:
+    """
+    Computes the geometric phenology metrics of many fields in vectorized passes.
+
+    On an irregular date axis (observation dates) the percentile metric still counts
+    days: every observation is weighted by the days it stands for (``represented_days``).
+
+    Attributes:
+        events (PhenologyEvents): Event dates and values, one row per field.
+        dates (np.ndarray): Shared date axis of the smoothed series, or one axis per field (fields x days).
+        smoothed (np.ndarray): Smoothed NDVI matrix (fields x days).
+        percentile (float): Percentile used by the count metric.
+    """
+
+    def __init__(self, events, dates, smoothed, percentile=85):
+        self.events = events
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.smoothed = as_float_matrix(smoothed)
+        self.percentile = percentile
+
+    def days_between(self, start_event, end_event):
+        """Calculate the number of days between two phenological events for every field."""
+        days = (self.events.date(end_event) - self.events.date(start_event)).astype('timedelta64[D]')
+        missing = np.isnat(days)
+        return integer_column(np.where(missing, 0, days.astype('int64')), missing)
+
+    def vertical_difference(self, start_event, end_event):
+        """Calculate the vertical difference (in NDVI value) between two events for every field."""
+        return self.events.value(end_event) - self.events.value(start_event)
+
+    def percentil_difference(self, start_event='eos_abs', end_event='bos_abs'):
+        """Count the days above the NDVI percentile between two events for every field."""
+        start_date, end_date = self.events.date(start_event), self.events.date(end_event)
+        missing = np.isnat(start_date) | np.isnat(end_date)
+
+        # Days of each field between the two event dates (NaT never falls inside a window)
+        dates = self.dates if self.dates.ndim == 2 else self.dates[None, :]
+        window = (dates >= start_date[:, None]) & (dates <= end_date[:, None]) & ~missing[:, None]
+
+        values = np.where(window, self.smoothed, np.nan)
+        counts = np.zeros(len(values), dtype='int64')
+        filled = (window & ~np.isnan(values)).any(axis=1)
+        if not filled.any():
+            return integer_column(counts, missing)
+        if is_daily(self.dates):
+            percentile_value = nanquantile_rows(values[filled], self.percentile / 100)
+            counts[filled] = (values[filled] > percentile_value[:, None]).sum(axis=1)
+            return integer_column(counts, missing)
+
+        days = np.broadcast_to(day_numbers(self.dates), values.shape)[filled]
+        weights = represented_days(days, ~np.isnan(values[filled]))
+        above = weighted_days_above(values[filled], weights, self.percentile / 100)
+        counts[filled] = np.rint(above).astype('int64')
+        return integer_column(counts, missing)
+
+    def compute(self):
+        """
+        Computes all geometric metrics.
+
+        Returns:
+            pd.DataFrame: One row per field and one typed column per metric in ``METRICS``.
+        """
+        import pandas as pd
+
+        with instrumentation.span('batch_phenology_metrics', rows_in=len(self.events)) as span:
+            table = {}
+            for column, kind, start_event, end_event, label in METRICS:
+                if kind == 'days':
+                    table[column] = self.days_between(start_event, end_event)
+                elif kind == 'ndvi':
+                    table[column] = self.vertical_difference(start_event, end_event)
+                else:
+                    table[column] = self.percentil_difference(start_event, end_event)
+            span.add(rows_out=len(self.events))
+        return pd.DataFrame(table)
+
 
 class PhenologyMetrics:
-    def __init__(self, phenology_df, ndvi_df ):
+    def __init__(self, phenology_df, ndvi_df, smoothed_column='savitzky_golay'):
         self.phenology_df = phenology_df
         self.ndvi_df = ndvi_df
+        self.smoothed_column = smoothed_column
+        self.events = PhenologyEvents.from_phenology_df(phenology_df)
+
+    def event(self, name):
+        """Return the date and value of a phenological event."""
+        date, value = self.events.date(name)[0], self.events.value(name)[0]
+        if np.isnat(date):
+            raise KeyError(f"Phenologic event '{name}' not found")
+        return date, value
 
     def days_between(self, start_event, end_event):
         """Calculate the number of days between two phenological events."""
-        start_date = self.phenology_df.loc[self.phenology_df['Phenologic'] == start_event, 'Date'].values[0]
-        end_date = self.phenology_df.loc[self.phenology_df['Phenologic'] == end_event, 'Date'].values[0]
+        start_date, end_date = self.event(start_event)[0], self.event(end_event)[0]
         return (end_date - start_date ).astype('timedelta64[D]').astype(int)
 
     def vertical_difference(self, start_event, end_event):
         """Calculate the vertical difference (in NDVI value) between two events."""
-        start_value = self.phenology_df.loc[self.phenology_df['Phenologic'] == start_event, 'Value'].values[0]
-        end_value = self.phenology_df.loc[self.phenology_df['Phenologic'] == end_event, 'Value'].values[0]
-        return end_value - start_value
+        return self.event(end_event)[1] - self.event(start_event)[1]
 
     def horizontal_difference(self, start_event, end_event):
         """Calculate the horizontal difference (in days) between two events."""
         return self.days_between(start_event, end_event)
-    
+
     def percentil_difference(self):
-        start_date = self.phenology_df.loc[self.phenology_df['Phenologic'] == 'bos_abs', 'Date'].values[0]
-        end_date = self.phenology_df.loc[self.phenology_df['Phenologic'] == 'eos_abs', 'Date'].values[0]
+        start_date, end_date = self.event('bos_abs')[0], self.event('eos_abs')[0]
 
         # Filtrar as linhas entre as datas especificadas
         mask = (self.ndvi_df['date'] >=  end_date) & (self.ndvi_df['date'] <= start_date)
         filtered_data = self.ndvi_df.loc[mask]
 
         # Calcular o valor do percentil na coluna NDVI
-        percentile_value = filtered_data['savitzky_golay'].quantile(85 / 100)
+        percentile_value = filtered_data[self.smoothed_column].quantile(85 / 100)
 
         # Contar quantos valores de NDVI estão acima do valor do percentil
-        return (filtered_data['savitzky_golay'] > percentile_value).sum()
-    
-    def derivate_metrics(self):
-        # Assuming phenology_metrics is an instance of a class with these methods
-        df_metrics = pd.DataFrame([
-            {'Value': self.days_between('vos_start', 'vos_end'),
-            'Phenologic': 'Days between vos_end and vos_start'},#1
-
-            {'Value': self.days_between(   'eos_abs', 'bos_abs'),
-            'Phenologic': 'Days between bos_abs and eos_abs'},#2
-
-            {'Value': self.vertical_difference('bos_abs', 'pos'),
-            'Phenologic': 'NDVI difference between bos_abs and pos'},#3
+        return (filtered_data[self.smoothed_column] > percentile_value).sum()
 
-            {'Value': self.horizontal_difference( 'pos', 'bos_abs'),
-            'Phenologic': 'Days difference between bos_abs and pos'},#4
-
-            {'Value': self.horizontal_difference('vos_start', 'bos_abs'),
-            'Phenologic': 'Days difference between vos_start and bos_abs'},#5
-
-            {'Value': self.vertical_difference('vos_start', 'bos_abs'),
-            'Phenologic': 'NDVI difference between vos_start and bos_abs'},#6
-
-            {'Value': self.horizontal_difference('eos_abs', 'vos_end'),
-            'Phenologic': 'Days difference between vos_end and eos_abs'},#7
-
-            {'Value': self.vertical_difference(  'eos_abs', 'pos'),
-            'Phenologic': 'NDVI difference between eos_abs and pos'},#8
-
-            {'Value': self.horizontal_difference( 'eos_abs', 'pos'),
-            'Phenologic': 'Days difference between eos_abs and pos'},#9
+    def derivate_metrics(self):
+        import pandas as pd
 
-            {'Value': self.vertical_difference('vos_end', 'eos_abs'),
-            'Phenologic': 'NDVI difference between eos_abs and vos_end'},#10
+        with instrumentation.span('phenology_metrics', rows_in=len(self.ndvi_df)) as span:
+            # All eleven metrics are computed in one vectorized pass over this field
+            for name in ('vos_start', 'vos_end', 'pos', 'bos_abs', 'eos_abs'):
+                self.event(name)
+            metrics = BatchPhenologyMetrics(self.events, self.ndvi_df['date'],
+                                            self.ndvi_df[self.smoothed_column]).compute()
 
-            {'Value': self.percentil_difference(),
-            'Phenologic': 'Count 85% percentiles days between bos_abs and eos_abs'}
-        ])
+            df_metrics = pd.DataFrame([
+                {'Value': metrics[column].to_numpy()[0], 'Phenologic': label}
+                for column, kind, start_event, end_event, label in METRICS
+            ])
 
-        # Concatenate rows into a new DataFrame
-        self.phenology_df = pd.concat([self.phenology_df, df_metrics], ignore_index=True)
+            # Concatenate rows into a new DataFrame
+            self.phenology_df = pd.concat([self.phenology_df, df_metrics], ignore_index=True)
+            span.add(rows_out=len(df_metrics))
 
         return self.phenology_df
-
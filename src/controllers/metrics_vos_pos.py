@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
-from scipy import signal
+
+from . import instrumentation
+from .phenology_batch import BatchPhenology
 
 class VosPosMetrics:
     """
@@ -9,18 +11,21 @@ class VosPosMetrics:
     Attributes:
         ndvi_df (pd.DataFrame): DataFrame containing NDVI data.
         order_ndvi (int): Order parameter for finding extrema in NDVI data.
+        smoothed_column (str): Column holding the smoothed NDVI series.
     """
 
-    def __init__(self, ndvi_df, order_ndvi):
+    def __init__(self, ndvi_df, order_ndvi, smoothed_column='savitzky_golay'):
         """
         Inicializa o NDVIAnalyzer com o DataFrame e a ordem do NDVI.
 
         Args:
             ndvi_df (pd.DataFrame): DataFrame contendo os dados NDVI.
             order_ndvi (int): Ordem para encontrar extremos nos dados NDVI.
+            smoothed_column (str): Coluna com a série NDVI suavizada.
         """
         self.ndvi_df = ndvi_df
         self.order_ndvi = order_ndvi
+        self.smoothed_column = smoothed_column
 
     def find_peaks(self):
         """
@@ -29,8 +34,7 @@ class VosPosMetrics:
         Returns:
             np.ndarray: Índices dos picos encontrados nos dados NDVI.
         """
-        return signal.argrelextrema(self.ndvi_df['savitzky_golay'].to_numpy(), 
-                                    np.greater, order=self.order_ndvi)[0]
+        return np.flatnonzero(self.build_engine().find_extrema()[0][0])
 
     def find_valleys(self):
         """
@@ -39,8 +43,17 @@ class VosPosMetrics:
         Returns:
             np.ndarray: Índices dos vales encontrados nos dados NDVI.
         """
-        return signal.argrelextrema(self.ndvi_df['savitzky_golay'].to_numpy(), 
-                                    np.less, order=self.order_ndvi)[0]
+        return np.flatnonzero(self.build_engine().find_extrema()[1][0])
+
+    def build_engine(self):
+        """
+        Cria o motor em lote sobre esta série (diária ou nas datas de observação).
+
+        Returns:
+            BatchPhenology: Motor com as datas, o NDVI bruto e o suavizado deste campo.
+        """
+        return BatchPhenology(self.ndvi_df['date'], self.ndvi_df['ndvi'],
+                              self.ndvi_df[self.smoothed_column], order_ndvi=self.order_ndvi)
 
     def analyze_phenology(self):
         """
@@ -49,54 +62,19 @@ class VosPosMetrics:
         Returns:
             pd.DataFrame: A new DataFrame with phenological markings.
         """
-        peak_indexes = self.find_peaks()
-        max_peak_index = np.argmax(self.ndvi_df['savitzky_golay'].iloc[peak_indexes])
-        
-        valley_indexes = self.find_valleys()
-        before_valley_index = max(valley_indexes[valley_indexes < peak_indexes[max_peak_index]])
-        after_valley_index = min(valley_indexes[valley_indexes > peak_indexes[max_peak_index]])
-
-        # Create rows for the new DataFrame
-        vos_start_row = pd.DataFrame({
-            'Date': [self.ndvi_df.loc[before_valley_index, 'date']],
-            'Value': [self.ndvi_df.loc[before_valley_index, 'savitzky_golay']],
-            'Phenologic': ['vos_start']
-        })
-
-        vos_end_row = pd.DataFrame({
-            'Date': [self.ndvi_df.loc[after_valley_index, 'date']],
-            'Value': [self.ndvi_df.loc[after_valley_index, 'savitzky_golay']],
-            'Phenologic': ['vos_end']
-        })
+        with instrumentation.span('vos_pos', rows_in=len(self.ndvi_df)) as span:
+            events = self.build_engine().find_vos_pos()
 
-        pos_row = pd.DataFrame({
-            'Date': [self.ndvi_df.loc[peak_indexes[max_peak_index], 'date']],
-            'Value': [self.ndvi_df.loc[peak_indexes[max_peak_index], 'savitzky_golay']],
-            'Phenologic': ['pos']
-        })
+            names = ['vos_start', 'vos_end', 'pos']
+            indexes = [int(events[name][0]) for name in names]
+            if min(indexes) < 0:
+                raise ValueError("No peak bracketed by two valleys was found in the NDVI series")
 
-        # Concatenate rows into a new DataFrame
-        phenology_df = pd.concat([vos_start_row, vos_end_row, pos_row], ignore_index=True)
+            phenology_df = pd.DataFrame({
+                'Date': self.ndvi_df['date'].iloc[indexes].to_numpy(),
+                'Value': self.ndvi_df[self.smoothed_column].iloc[indexes].to_numpy(),
+                'Phenologic': names
+            })
+            span.add(rows_out=len(phenology_df))
 
         return phenology_df
-
-        """
-        Analisa a fenologia, identificando os estágios fenológicos e marcando-os no DataFrame.
-
-        Returns:
-            pd.DataFrame: DataFrame com as marcações fenológicas adicionadas.
-        
-        peak_indexes = self.find_peaks()
-        max_peak_index = np.argmax(self.ndvi_df['savitzky_golay'].iloc[peak_indexes])
-        
-        valley_indexes = self.find_valleys()
-        before_valley_index = max(valley_indexes[valley_indexes < peak_indexes[max_peak_index]])
-        after_valley_index = min(valley_indexes[valley_indexes > peak_indexes[max_peak_index]])
-
-        self.ndvi_df["phenologic"] = np.nan
-        self.ndvi_df.loc[before_valley_index, "phenologic"] = 'vos_start'
-        self.ndvi_df.loc[after_valley_index, "phenologic"] = 'vos_end'
-        self.ndvi_df.loc[peak_indexes[max_peak_index], "phenologic"] = 'pos'
-
-        return self.ndvi_df
-        """
@@ -0,0 +1,593 @@
+import numpy as np
+
+from . import instrumentation
+
+EVENTS = ('vos_start', 'vos_end', 'pos', 'bos_der', 'eos_der', 'bos_abs', 'eos_abs')
+
+
+def as_float_matrix(values):
+    """
+    Returns ``values`` as a 2-D floating-point array, without copying float32/float64 inputs.
+
+    Args:
+        values (array-like): One series (days,) or a matrix (fields, days).
+
+    Returns:
+        np.ndarray: Array of shape (fields, days).
+    """
+    values = np.atleast_2d(np.asarray(values))
+    if values.dtype.kind != 'f':
+        values = values.astype(float)
+    return values
+
+
+def take_dates(dates, index):
+    """
+    Looks up the date of one column index per field.
+
+    Args:
+        dates (np.ndarray): Shared date axis (days,) or one date axis per field (fields, days).
+        index (np.ndarray): Column index of every field (fields,), or fractional column positions
+            (see ``BatchPhenology.find_bos_eos_abs``), whose dates are interpolated to the nearest day.
+
+    Returns:
+        np.ndarray: One date per field.
+    """
+    if index.dtype.kind == 'f':
+        days = np.rint(take_values(day_numbers(dates), index))
+        return np.where(np.isnan(days), np.datetime64('NaT'),
+                        np.nan_to_num(days).astype('datetime64[D]')).astype('datetime64[ns]')
+    if dates.ndim == 2:
+        return dates[np.arange(dates.shape[0]), index]
+    return dates[index]
+
+
+def take_values(values, index):
+    """
+    Looks up the value of one column index per field, interpolating linearly at fractional positions.
+
+    Args:
+        values (np.ndarray): Shared series (days,) or matrix (fields, days).
+        index (np.ndarray): Column index or fractional column position of every field (fields,).
+
+    Returns:
+        np.ndarray: One value per field.
+    """
+    values = np.atleast_2d(values)
+    rows = np.arange(len(index)) if values.shape[0] > 1 else np.zeros(len(index), dtype=int)
+    if index.dtype.kind != 'f':
+        return values[rows, index]
+    lower = np.clip(np.floor(index).astype(np.int64), 0, values.shape[1] - 1)
+    upper = np.minimum(lower + 1, values.shape[1] - 1)
+    fraction = index - lower
+    # A whole position is not blended with the next column, which may be NaN padding
+    return np.where(fraction > 0, values[rows, lower] + fraction * (values[rows, upper] - values[rows, lower]),
+                    values[rows, lower])
+
+
+def day_numbers(dates):
+    """
+    Converts a date axis into day numbers.
+
+    Args:
+        dates (array-like): Shared date axis (days,) or one date axis per field (fields, days).
+
+    Returns:
+        np.ndarray: Days since 1970-01-01 as floats, NaN for NaT.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[D]')
+    return np.where(np.isnat(dates), np.nan, dates.astype(np.int64))
+
+
+def is_daily(dates):
+    """
+    Tells whether a date axis has one column per day (NaT padding is ignored).
+
+    Args:
+        dates (array-like): Shared date axis (days,) or one date axis per field (fields, days).
+
+    Returns:
+        bool: False for the observation dates of an irregular series.
+    """
+    steps = np.diff(day_numbers(dates), axis=-1)
+    return bool(np.all((steps == 1) | np.isnan(steps)))
+
+
+# Reduction that gives the neighbour every sample must beat, per comparator
+NEIGHBOUR_REDUCTIONS = {np.greater: np.maximum, np.greater_equal: np.maximum,
+                        np.less: np.minimum, np.less_equal: np.minimum}
+
+
+def relative_extrema(values, comparator, order=1):
+    """
+    Marks the samples that beat every neighbour within ``order`` samples, in NumPy only.
+
+    Matches ``scipy.signal.argrelextrema(values, comparator, axis=1, order=order)``:
+    neighbours beyond the ends are clipped to the edge sample, so the first and last
+    samples are never extrema, and comparisons with NaN are false. Each sample is
+    compared with the extreme of its ``order`` neighbours on each side, which takes
+    O(log(order)) vectorized passes (NaN propagates through the reduction).
+
+    Args:
+        values (np.ndarray): Matrix (fields x days).
+        comparator (callable): ``np.greater`` for maxima or ``np.less`` for minima.
+        order (int): Number of neighbours compared on each side.
+
+    Returns:
+        np.ndarray: Boolean mask (fields x days).
+    """
+    if int(order) != order or order < 1:
+        raise ValueError('Order must be an int >= 1')
+    if comparator not in NEIGHBOUR_REDUCTIONS:
+        raise ValueError(f"Unsupported comparator {comparator!r}, expected one of {list(NEIGHBOUR_REDUCTIONS)}")
+    reduce = NEIGHBOUR_REDUCTIONS[comparator]
+    n_days = values.shape[1]
+    padded = np.concatenate([np.repeat(values[:, :1], order, axis=1), values,
+                             np.repeat(values[:, -1:], order, axis=1)], axis=1)
+
+    # Extreme of every run of ``length`` samples, doubling the length each pass
+    runs, length = padded, 1
+    while 2 * length <= order:
+        runs = reduce(runs[:, :-length], runs[:, length:])
+        length *= 2
+    # Two overlapping runs cover ``order`` samples: windows[:, j] is the extreme of padded[:, j:j + order]
+    windows = reduce(runs[:, :runs.shape[1] - (order - length)], runs[:, order - length:])
+
+    before, after = windows[:, :n_days], windows[:, order + 1:order + 1 + n_days]
+    return comparator(values, before) & comparator(values, after)
+
+
+def relative_extrema_days(values, days, comparator, order=1):
+    """
+    Marks the samples that beat every neighbour within ``order`` days, on irregular date axes.
+
+    Day-based counterpart of ``relative_extrema``, which it matches on a daily axis:
+    the series is taken as linear between samples, as the daily interpolation would
+    make it, so a sample must beat every sample within ``order`` days and the
+    interpolated values ``order`` days before and after it. A sample next to a gap
+    longer than ``order`` days is thus compared with the sample across the gap. The
+    first and last dated samples of a row are never extrema and comparisons with NaN
+    are false; samples without a day (NaN, e.g. padding) are not neighbours.
+
+    Args:
+        values (np.ndarray): Matrix (fields x samples).
+        days (np.ndarray): Day numbers sorted along the rows, shared (samples,) or per field (fields x samples).
+        comparator (callable): ``np.greater`` for maxima or ``np.less`` for minima.
+        order (int): Number of days compared on each side.
+
+    Returns:
+        np.ndarray: Boolean mask (fields x samples).
+    """
+    if int(order) != order or order < 1:
+        raise ValueError('Order must be an int >= 1')
+    if comparator not in NEIGHBOUR_REDUCTIONS:
+        raise ValueError(f"Unsupported comparator {comparator!r}, expected one of {list(NEIGHBOUR_REDUCTIONS)}")
+    days = np.broadcast_to(days, values.shape)
+    n_samples = values.shape[1]
+    columns = np.arange(n_samples)
+
+    dated = ~np.isnan(days)
+    first = np.argmax(dated, axis=1)
+    last = n_samples - 1 - np.argmax(dated[:, ::-1], axis=1)
+    extrema = dated & (columns > first[:, None]) & (columns < last[:, None])
+    if n_samples < 3:
+        return extrema
+
+    # Nearest neighbours, over the whole matrix: the value ``order`` days away lies between
+    # a sample and its neighbour, so beating the neighbour is enough
+    current = slice(1, n_samples - 1)
+    reaching = {}
+    for side, neighbour in ((1, slice(2, n_samples)), (-1, slice(0, n_samples - 2))):
+        extrema[:, current] &= comparator(values[:, current], values[:, neighbour])
+        reaching[side] = np.abs(days[:, neighbour] - days[:, current]) <= order
+
+    # The few samples left are walked outwards one column per pass, as flat arrays, while
+    # some of them has not yet reached a neighbour more than ``order`` days away
+    rows, samples = np.nonzero(extrema)
+    kept = np.ones(len(rows), dtype=bool)
+    sample_days, sample_values = days[rows, samples], values[rows, samples]
+    for side in (1, -1):
+        walking = np.flatnonzero(reaching[side][rows, samples - 1])
+        for offset in range(2, n_samples):
+            walking = walking[kept[walking]]
+            neighbour = samples[walking] + side * offset
+            inside = (neighbour >= 0) & (neighbour < n_samples)
+            walking, neighbour = walking[inside], neighbour[inside]
+            if not walking.size:
+                break
+            row, inner = rows[walking], neighbour - side
+            distance = np.abs(days[row, neighbour] - sample_days[walking])
+            # NaN days compare as False, so padding ends the walk like the end of the series
+            close = distance <= order
+            beyond = distance > order
+            passed = comparator(sample_values[walking], values[row, neighbour])
+
+            # Past the reach, the value ``order`` days away lies between the last sample within reach and this one
+            inner_days, inner_values = days[row, inner], values[row, inner]
+            fraction = (order - np.abs(inner_days - sample_days[walking])) / np.abs(days[row, neighbour] - inner_days)
+            boundary = np.where(fraction > 0, inner_values + fraction * (values[row, neighbour] - inner_values),
+                                inner_values)
+            passed_boundary = comparator(sample_values[walking], boundary)
+
+            kept[walking] &= np.where(close, passed, ~beyond | passed_boundary)
+            walking = walking[close]
+    extrema[rows, samples] = kept
+    return extrema
+
+
+class BatchPhenology:
+    """
+    Vectorized phenology engine operating on many fields at once.
+
+    Every row of the input matrices is one field and every column is one date of
+    the date axis: one column per day, or the observation dates of irregular
+    series. On an irregular axis ``order_ndvi`` is a number of days and the
+    derivative is the slope per day between observations, so both mean the same
+    as on a daily axis. Events are returned as integer column indexes, with -1
+    marking fields where the event could not be found; on an irregular axis
+    'bos_abs' and 'eos_abs' are fractional column positions instead, as the
+    threshold is crossed between observations.
+
+    Attributes:
+        dates (np.ndarray): Shared date axis (datetime64), sorted and unique, or one
+            such axis per field (fields x days).
+        days (np.ndarray): The date axis as day numbers (see ``day_numbers``).
+        daily (bool): Whether the date axis has one column per day.
+        ndvi (np.ndarray): Raw NDVI matrix (fields x days).
+        smoothed (np.ndarray): Smoothed NDVI matrix (fields x days).
+        order_ndvi (int): Order parameter for finding extrema in NDVI data.
+        threshold (float): NDVI threshold used for the absolute BOS/EOS.
+    """
+
+    def __init__(self, dates, ndvi, smoothed, order_ndvi=None, threshold=None):
+        """
+        Initializes the engine with the shared date axis and the NDVI matrices.
+
+        Args:
+            dates (array-like): Shared date axis, one entry per column.
+            ndvi (array-like): Raw NDVI values, shape (fields, days) or (days,); float32 inputs are not copied.
+            smoothed (array-like): Smoothed NDVI values, same shape as ``ndvi``.
+            order_ndvi (int, optional): Order for finding extrema; required by ``find_vos_pos``.
+            threshold (float, optional): NDVI threshold; required by ``find_bos_eos_abs``.
+        """
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.days = day_numbers(self.dates)
+        self.daily = is_daily(self.dates)
+        self.ndvi = as_float_matrix(ndvi)
+        self.smoothed = as_float_matrix(smoothed)
+        self.order_ndvi = order_ndvi
+        self.threshold = threshold
+
+        if self.ndvi.shape != self.smoothed.shape:
+            raise ValueError("ndvi and smoothed must have the same shape")
+        if self.smoothed.shape[1] != self.dates.shape[-1]:
+            raise ValueError("The date axis must have one entry per column")
+
+    def find_extrema(self):
+        """
+        Finds the relative maxima and minima of every smoothed series.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Boolean masks (fields x days) of peaks and valleys.
+        """
+        if self.daily:
+            return (relative_extrema(self.smoothed, np.greater, self.order_ndvi),
+                    relative_extrema(self.smoothed, np.less, self.order_ndvi))
+        return (relative_extrema_days(self.smoothed, self.days, np.greater, self.order_ndvi),
+                relative_extrema_days(self.smoothed, self.days, np.less, self.order_ndvi))
+
+    def find_vos_pos(self):
+        """
+        Identifies the highest peak (POS) and the valleys bracketing it (VOS).
+
+        Returns:
+            dict: Column indexes for 'vos_start', 'vos_end' and 'pos'.
+        """
+        peaks, valleys = self.find_extrema()
+        n_days = self.smoothed.shape[1]
+        columns = np.arange(n_days)
+
+        has_peak = peaks.any(axis=1)
+        pos = np.argmax(np.where(peaks, self.smoothed, -np.inf), axis=1)
+        pos = np.where(has_peak, pos, -1)
+
+        before = valleys & (columns < pos[:, None])
+        after = valleys & (columns > pos[:, None])
+        vos_start = np.where(before, columns, -1).max(axis=1)
+        vos_end = np.where(after, columns, n_days).min(axis=1)
+        vos_end = np.where(vos_end == n_days, -1, vos_end)
+
+        invalid = (pos < 0) | (vos_start < 0) | (vos_end < 0)
+        return {
+            'vos_start': np.where(invalid, -1, vos_start),
+            'vos_end': np.where(invalid, -1, vos_end),
+            'pos': np.where(invalid, -1, pos),
+        }
+
+    def derivative(self):
+        """
+        Returns the slope per day of every smoothed series, 0 on the first day and next to gaps.
+
+        On a daily axis this is the first difference of the series.
+
+        Returns:
+            np.ndarray: Matrix (fields x days).
+        """
+        derivative = np.zeros(self.smoothed.shape)
+        derivative[:, 1:] = np.diff(self.smoothed, axis=1) / np.diff(self.days, axis=-1)
+        return np.nan_to_num(derivative, nan=0.0, copy=False)
+
+    def find_bos_eos_der(self, events, derivative=None):
+        """
+        Identifies BOS and EOS from the first derivative of the smoothed series.
+
+        BOS is the steepest rise between 'vos_start' and 'vos_end'; EOS is the
+        steepest drop between 'pos' and 'vos_end'.
+
+        Args:
+            events (dict): Column indexes for 'vos_start', 'pos' and 'vos_end'.
+            derivative (np.ndarray, optional): Result of ``derivative``, to share it between calls.
+
+        Returns:
+            dict: Column indexes for 'bos_der' and 'eos_der'.
+        """
+        vos_start, pos, vos_end = events['vos_start'], events['pos'], events['vos_end']
+        columns = np.arange(self.smoothed.shape[1])
+
+        if derivative is None:
+            derivative = self.derivative()
+        # The derivative is taken inside the interval, so its first value is zero
+        derivative = np.where(columns == vos_start[:, None], 0.0, derivative)
+
+        interval = (columns >= vos_start[:, None]) & (columns <= vos_end[:, None])
+        bos_der = np.argmax(np.where(interval, derivative, -np.inf), axis=1)
+
+        after_pos = interval & (columns >= pos[:, None])
+        eos_der = np.argmin(np.where(after_pos, derivative, np.inf), axis=1)
+
+        invalid = (vos_start < 0) | (pos < 0) | (vos_end < 0)
+        return {
+            'bos_der': np.where(invalid, -1, bos_der),
+            'eos_der': np.where(invalid, -1, eos_der),
+        }
+
+    def find_bos_eos_abs(self, events, thresholds=None):
+        """
+        Identifies BOS and EOS as the two raw NDVI values closest to the threshold.
+
+        The closest value marks 'eos_abs' and the second closest marks 'bos_abs',
+        both searched between 'vos_start' and 'vos_end'. On a daily axis the candidates
+        are the columns. On observation dates they are the days of the series taken as
+        linear between observations (see ``threshold_days``), the values the daily
+        resampling would give, so the picks match the daily ones; the events are then
+        fractional column positions, resolved by ``take_dates`` and ``take_values``.
+
+        Args:
+            events (dict): Column indexes for 'vos_start' and 'vos_end'.
+            thresholds (array-like, optional): Several thresholds to evaluate at once instead of
+                ``self.threshold``; the interval is then built once and shared by all of them.
+
+        Returns:
+            dict: Column indexes (or positions) for 'bos_abs' and 'eos_abs', shape (fields,), or
+            (thresholds, fields) when ``thresholds`` is given.
+        """
+        vos_start, vos_end = events['vos_start'], events['vos_end']
+        grid = np.atleast_1d(np.asarray(self.threshold if thresholds is None else thresholds, dtype=float))
+        rows = np.arange(self.ndvi.shape[0])
+        layers = np.arange(len(grid))[:, None]
+        if self.daily:
+            columns = np.arange(self.ndvi.shape[1])
+            interval = (columns >= vos_start[:, None]) & (columns <= vos_end[:, None])
+            values = np.where(interval, self.ndvi, np.nan)
+            distance = np.abs(values - grid[:, None, None])
+        else:
+            distance, candidates = self.threshold_days(vos_start, vos_end, grid)
+        distance = np.where(np.isnan(distance), np.inf, distance)
+
+        eos_abs = np.argmin(distance, axis=2)
+        found_eos = np.isfinite(distance[layers, rows, eos_abs])
+        distance[layers, rows, eos_abs] = np.inf
+        bos_abs = np.argmin(distance, axis=2)
+        found_bos = np.isfinite(distance[layers, rows, bos_abs])
+        if not self.daily:
+            # The last candidate is the observation at 'vos_end'
+            last = distance.shape[2] - 1
+            bos_abs = self.day_position(candidates[layers, rows, bos_abs],
+                                        np.where(bos_abs < last, bos_abs // 2, vos_end))
+            eos_abs = self.day_position(candidates[layers, rows, eos_abs],
+                                        np.where(eos_abs < last, eos_abs // 2, vos_end))
+
+        invalid = (vos_start < 0) | (vos_end < 0) | ~found_eos | ~found_bos
+        events = {
+            'bos_abs': np.where(invalid, -1, bos_abs),
+            'eos_abs': np.where(invalid, -1, eos_abs),
+        }
+        if thresholds is None:
+            return {name: index[0] for name, index in events.items()}
+        return events
+
+    def threshold_days(self, vos_start, vos_end, grid):
+        """
+        Distance to every threshold of the days between 'vos_start' and 'vos_end' of an irregular series.
+
+        The raw series is linear between two observations, so the days of a gap closest
+        to a threshold lie next to the crossing of that line: each gap contributes the
+        two days around its crossing (or its end nearest to it), which always include
+        the two closest days of the gap, and the last observation of the interval comes
+        last. Candidates stay in day order, so ties go to the earliest day as on a daily axis.
+
+        Args:
+            vos_start (np.ndarray): Column index of 'vos_start' per field, -1 where missing.
+            vos_end (np.ndarray): Column index of 'vos_end' per field, -1 where missing.
+            grid (np.ndarray): Thresholds (thresholds,).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Distances (NaN for no candidate) and day numbers of the
+            candidates, both (thresholds, fields, candidates); candidate k lies in gap k // 2,
+            except the last one.
+        """
+        n_fields, n_samples = self.ndvi.shape
+        rows = np.arange(n_fields)
+        days = np.broadcast_to(self.days, self.ndvi.shape)
+        gaps = np.arange(n_samples - 1)
+
+        # Gap j holds the days [start, end - 1] between observations j and j + 1; gaps
+        # outside the interval get a NaN slope, which makes all their candidates NaN
+        start, end = days[:, :-1], days[:, 1:] - 1
+        left = self.ndvi[:, :-1]
+        inside = (gaps >= vos_start[:, None]) & (gaps < vos_end[:, None])
+        slope = np.where(inside, (self.ndvi[:, 1:] - left) / (end + 1 - start), np.nan)
+
+        threshold = grid[:, None, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = start + (threshold - left) / slope
+        # On a flat gap every day is as close as the first one
+        crossing = np.where(np.isinf(crossing), start, crossing)
+        nearest = np.clip(np.floor(crossing), start, end)
+        other = np.where(nearest < end, nearest + 1, nearest - 1)
+        other = np.where(other >= start, other, np.nan)
+
+        shape = (len(grid), n_fields, 2 * n_samples - 1)
+        distance = np.empty(shape)
+        candidates = np.empty(shape)
+        candidates[:, :, 0:-1:2] = np.fmin(nearest, other)
+        candidates[:, :, 1:-1:2] = np.fmax(nearest, other)
+        candidates[:, :, -1] = np.where(vos_end >= 0, days[rows, vos_end], np.nan)
+        distance[:, :, 0:-1:2] = np.abs(left + (candidates[:, :, 0:-1:2] - start) * slope - threshold)
+        distance[:, :, 1:-1:2] = np.abs(left + (candidates[:, :, 1:-1:2] - start) * slope - threshold)
+        distance[:, :, -1] = np.abs(np.where(vos_end >= 0, self.ndvi[rows, vos_end], np.nan) - grid[:, None])
+        return distance, candidates
+
+    def day_position(self, day, gap):
+        """
+        Converts day numbers that lie in the given gaps between observations into fractional column positions.
+
+        Args:
+            day (np.ndarray): Day numbers, shape (thresholds, fields).
+            gap (np.ndarray): Column of the observation before each day, same shape.
+
+        Returns:
+            np.ndarray: ``gap`` plus the fraction of the gap elapsed on ``day``.
+        """
+        days = np.broadcast_to(self.days, self.ndvi.shape)
+        rows = np.arange(days.shape[0])
+        start = days[rows, np.minimum(gap, days.shape[1] - 1)]
+        end = days[rows, np.minimum(gap + 1, days.shape[1] - 1)]
+        return gap + np.where(end > start, (day - start) / (end - start), 0.0)
+
+    def execute_analysis(self):
+        """
+        Executes the complete phenology workflow for every field.
+
+        Returns:
+            dict: Column indexes (fields,) for every event in ``EVENTS``.
+        """
+        with instrumentation.span('batch_phenology', rows_in=self.smoothed.size) as span:
+            events = self.find_vos_pos()
+            events.update(self.find_bos_eos_der(events))
+            events.update(self.find_bos_eos_abs(events))
+            span.add(rows_out=self.smoothed.shape[0])
+        return events
+
+    def to_dataframe(self, events):
+        """
+        Converts event indexes into a wide table with one row per field.
+
+        Args:
+            events (dict): Column indexes per event, as returned by ``execute_analysis``.
+
+        Returns:
+            pd.DataFrame: Columns '<event>_date' and '<event>_value' for each event.
+        """
+        import pandas as pd
+
+        rows = np.arange(self.smoothed.shape[0])
+        table = {}
+        for name in EVENTS:
+            if name not in events:
+                continue
+            index = events[name]
+            valid = index >= 0
+            table[f'{name}_date'] = np.where(valid, take_dates(self.dates, index), np.datetime64('NaT'))
+            table[f'{name}_value'] = np.where(valid, take_values(self.smoothed, index), np.nan)
+        return pd.DataFrame(table)
+
+
+class PhenologyEvents:
+    """
+    Compact, fixed-schema table of phenology events for one or many fields.
+
+    Events are stored in a structured array of shape (fields, len(EVENTS)) with a
+    'date' and a 'value' entry each, so the date and value of any event are a
+    single column lookup. Missing events hold NaT and NaN.
+
+    Attributes:
+        records (np.ndarray): Structured array with ``EVENT_DTYPE`` entries.
+    """
+
+    EVENT_DTYPE = np.dtype([('date', 'datetime64[ns]'), ('value', 'f8')])
+    EVENT_INDEX = {name: position for position, name in enumerate(EVENTS)}
+
+    def __init__(self, records):
+        """
+        Args:
+            records (np.ndarray): Structured array of shape (fields, len(EVENTS)).
+        """
+        self.records = records
+
+    @classmethod
+    def empty(cls, n_fields):
+        """Creates a table of ``n_fields`` fields with every event missing."""
+        records = np.empty((n_fields, len(EVENTS)), dtype=cls.EVENT_DTYPE)
+        records['date'] = np.datetime64('NaT')
+        records['value'] = np.nan
+        return cls(records)
+
+    @classmethod
+    def from_indexes(cls, dates, smoothed, events):
+        """
+        Builds the table from the event column indexes of ``BatchPhenology``.
+
+        Args:
+            dates (np.ndarray): Shared date axis, or one date axis per field.
+            smoothed (np.ndarray): Smoothed NDVI matrix (fields x days).
+            events (dict): Column indexes per event, -1 where missing.
+        """
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        smoothed = as_float_matrix(smoothed)
+        table = cls.empty(smoothed.shape[0])
+        rows = np.arange(smoothed.shape[0])
+        for name, index in events.items():
+            valid = index >= 0
+            position = cls.EVENT_INDEX[name]
+            table.records['date'][:, position] = np.where(valid, take_dates(dates, index), np.datetime64('NaT'))
+            table.records['value'][:, position] = np.where(valid, take_values(smoothed, index), np.nan)
+        return table
+
+    @classmethod
+    def from_phenology_df(cls, phenology_df):
+        """
+        Builds a one-field table from the long-format phenology DataFrame.
+
+        Args:
+            phenology_df (pd.DataFrame): Rows with 'Date', 'Value' and 'Phenologic' columns.
+        """
+        import pandas as pd
+
+        table = cls.empty(1)
+        events = phenology_df[phenology_df['Phenologic'].isin(EVENTS)].drop_duplicates('Phenologic')
+        for date, value, name in zip(events['Date'], events['Value'], events['Phenologic']):
+            table.records['date'][0, cls.EVENT_INDEX[name]] = np.datetime64(pd.Timestamp(date), 'ns')
+            table.records['value'][0, cls.EVENT_INDEX[name]] = value
+        return table
+
+    def __len__(self):
+        return self.records.shape[0]
+
+    def date(self, name):
+        """Returns the date of an event for every field."""
+        return self.records['date'][:, self.EVENT_INDEX[name]]
+
+    def value(self, name):
+        """Returns the smoothed NDVI value of an event for every field."""
+        return self.records['value'][:, self.EVENT_INDEX[name]]
@@ -1,28 +1,101 @@
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from . import instrumentation
+from .phenology_batch import EVENTS
+
+BASE_COLOR = '#642834'
+OTHER_COLORS = ['#B19470', '#76453B', '#304D30', '#114232', '#F7F6BB', '#FF9800', '#90D26D']
+BACKGROUND_COLOR = '#f5f5f5'
+
+
+def row_colors(n_rows):
+    """Alternating table row colors."""
+    return np.where(np.arange(n_rows) % 2 == 0, 'lightgrey', 'white')
+
+
+def lttb(x, y, n_points):
+    """
+    Downsamples a series with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; every bucket in between contributes the
+    point forming the largest triangle with the previously selected point and
+    the mean of the next bucket, which preserves peaks and valleys.
+
+    Args:
+        x (array-like): Increasing x values (numbers or datetimes).
+        y (array-like): Values; NaN points are dropped first.
+        n_points (int): Number of points to keep (at least 3).
+
+    Returns:
+        np.ndarray: Indexes of the selected points, in increasing order.
+    """
+    x = np.asarray(x)
+    x_values = x.astype('datetime64[ns]').astype(np.int64).astype(float) if x.dtype.kind == 'M' \
+        else x.astype(float)
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(y) & ~np.isnan(x_values))
+    if len(valid) <= max(n_points, 3):
+        return valid
+
+    x_values, y = x_values[valid], y[valid]
+    n = len(valid)
+    edges = np.linspace(1, n - 1, n_points - 1).astype(int)
+    sizes = np.diff(edges)
+
+    # Mean point of every bucket; the bucket after the last one is the final point
+    inner_x, inner_y = x_values[1:n - 1], y[1:n - 1]
+    mean_x = np.append(np.add.reduceat(inner_x, edges[:-1] - 1) / sizes, x_values[-1])
+    mean_y = np.append(np.add.reduceat(inner_y, edges[:-1] - 1) / sizes, y[-1])
+
+    # With (px, py) the previously selected point, the triangle area of candidate j is
+    # |px * a[j] + py * b[j] + c[j]|; only the scan over buckets is sequential
+    following = np.repeat(np.arange(1, n_points - 1), sizes)
+    next_x, next_y = mean_x[following], mean_y[following]
+    a = (inner_y - next_y).tolist()
+    b = (next_x - inner_x).tolist()
+    c = (inner_x * next_y - next_x * inner_y).tolist()
+    inner_x, inner_y, starts = inner_x.tolist(), inner_y.tolist(), (edges - 1).tolist()
+
+    selected = [0]
+    px, py = x_values[0], y[0]
+    for bucket in range(n_points - 2):
+        best, best_area = starts[bucket], -1.0
+        for j in range(starts[bucket], starts[bucket + 1]):
+            area = abs(px * a[j] + py * b[j] + c[j])
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best + 1)
+        px, py = inner_x[best], inner_y[best]
+    selected.append(n - 1)
+    return valid[selected]
+
+
 class PhenologyPlotter:
     def __init__(self, ndvi_df, phenology_df):
         self.ndvi_df = ndvi_df
         self.phenology_df = phenology_df
 
     def convert_dates(self):
-        """Convert 'timestamps' and 'Date' in dataframes to datetime objects."""
-        self.ndvi_df['timestamps'] = pd.to_datetime(self.ndvi_df['timestamps'])
-        self.phenology_df['Date_dt'] = pd.to_datetime(self.phenology_df['Date'])
+        """Convert 'timestamps' and 'Date' to datetime objects, without modifying the input DataFrames."""
+        self.timestamps = pd.to_datetime(self.ndvi_df['timestamps'])
+        self.phenology = self.phenology_df.assign(Date_dt=pd.to_datetime(self.phenology_df['Date']))
 
     def calculate_plot_range(self):
         """Calculate and adjust start and end dates for the plot based on phenology data."""
-        vos_start_date = self.phenology_df[self.phenology_df['Phenologic'] == 'vos_start']['Date_dt'].min() - pd.Timedelta(days=3)
-        vos_end_date = self.phenology_df[self.phenology_df['Phenologic'] == 'vos_end']['Date_dt'].max() + pd.Timedelta(days=3)
+        vos_start_date = self.phenology[self.phenology['Phenologic'] == 'vos_start']['Date_dt'].min() - pd.Timedelta(days=3)
+        vos_end_date = self.phenology[self.phenology['Phenologic'] == 'vos_end']['Date_dt'].max() + pd.Timedelta(days=3)
         return vos_start_date, vos_end_date
 
     def prepare_table(self):
         """Prepare a DataFrame for table visualization."""
-        table_df = self.phenology_df[['Date_dt', 'Value', 'Phenologic']].copy()
+        table_df = self.phenology[['Date_dt', 'Value', 'Phenologic']].copy()
         table_df['Date_dt'] = table_df['Date_dt'].dt.strftime('%Y-%m-%d').replace(np.nan, '–')
         table_df['Value'] = table_df['Value'].apply(lambda x: f"{x:,.3f}" if isinstance(x, float) else f"{x:,}" if isinstance(x, int) else '-')
         table_df = table_df.rename(columns={'Date_dt': 'Date', 'Value': 'Values', 'Phenologic': 'Phenologic Metrics'})
@@ -30,49 +103,247 @@ class PhenologyPlotter:
 
     def plot_data(self):
         """Create and display a Plotly graph with NDVI and phenology data."""
-        self.convert_dates()
-        vos_start_date, vos_end_date = self.calculate_plot_range()
-        table_df = self.prepare_table()
-
-        fig = make_subplots(
-            rows=2, cols=1,
-            shared_xaxes=True,
-            vertical_spacing=0.1,
-            specs=[[{"type": "scatter"}], [{"type": "table"}]]
-        )
+        with instrumentation.span('plotter', rows_in=len(self.ndvi_df)):
+            self.convert_dates()
+            vos_start_date, vos_end_date = self.calculate_plot_range()
+            table_df = self.prepare_table()
+
+            fig = make_subplots(
+                rows=2, cols=1,
+                shared_xaxes=True,
+                vertical_spacing=0.1,
+                specs=[[{"type": "scatter"}], [{"type": "table"}]]
+            )
+
+            # Colors and other styling
+            base_color = BASE_COLOR
+            other_colors = OTHER_COLORS
+            background_color = BACKGROUND_COLOR
+
+            # Adding traces
+            fig.add_trace(go.Scatter(x=self.timestamps, y=self.ndvi_df['ndvi'], mode='lines', name='NDVI', line=dict(color=other_colors[3])), row=1, col=1)
+            fig.add_trace(go.Scatter(x=self.timestamps, y=self.ndvi_df['savitzky_golay'], mode='lines', name='Savitzky-Golay', line=dict(color=base_color, dash='dash')), row=1, col=1)
+
+            for i, metric in enumerate(EVENTS):
+                color = other_colors[i % len(other_colors)]
+                metric_df = self.phenology[self.phenology['Phenologic'] == metric]
+                fig.add_trace(go.Scatter(x=metric_df['Date_dt'], y=metric_df['Value'], mode='markers', name=metric, marker=dict(color=color, size=9)), row=1, col=1)
+
+            fig.add_trace(go.Table(
+                header=dict(values=['<b>Date</b>', '<b>Values</b>', '<b>Phenologic Metrics</b>'], fill_color=base_color, align='center', font=dict(color='white', size=12)),
+                cells=dict(values=[table_df[col] for col in table_df.columns], fill_color=[row_colors(len(table_df))], align='center', font=dict(color='darkslategray', size=11))
+            ), row=2, col=1)
+
+            # Days with an HLS scene (the others were interpolated)
+            scenes = self.ndvi_df['id'].notna().to_numpy()
+
+            fig.add_trace(go.Scatter(x=self.ndvi_df['date'].to_numpy()[scenes], y=self.ndvi_df['ndvi'].to_numpy()[scenes], mode='markers', name='HLS Images', marker=dict(color='#642834', size=5)), row=1, col=1)
+
+            fig.update_layout(
+                height=800,
+                width=1000,
+                title_text="GCERLab Phenologics Metrics and Expenses",
+                xaxis_title="Date",
+                yaxis_title="NDVI",
+                xaxis_range=[vos_start_date, vos_end_date],
+                plot_bgcolor=background_color,
+                paper_bgcolor=background_color,
+            )
+
+        return fig
 
-        # Colors and other styling
-        base_color = '#642834'
-        other_colors = ['#B19470', '#76453B', '#304D30', '#114232', '#F7F6BB', '#FF9800', '#90D26D']
-        background_color = '#f5f5f5'
 
-        # Adding traces
-        fig.add_trace(go.Scatter(x=self.ndvi_df['timestamps'], y=self.ndvi_df['ndvi'], mode='lines', name='NDVI', line=dict(color=other_colors[3])), row=1, col=1)
-        fig.add_trace(go.Scatter(x=self.ndvi_df['timestamps'], y=self.ndvi_df['savitzky_golay'], mode='lines', name='Savitzky-Golay', line=dict(color=base_color, dash='dash')), row=1, col=1)
+def export_fields(items, output_dir, file_format, plot_params):
+    """
+    Writes the figures of a chunk of fields; runs in the worker processes of ``MultiFieldPlotter.export``.
 
-        for i, metric in enumerate(['vos_start', 'vos_end', 'pos', 'bos_der', 'eos_der', 'bos_abs', 'eos_abs']):
-            color = other_colors[i % len(other_colors)]
-            metric_df = self.phenology_df[self.phenology_df['Phenologic'] == metric]
-            fig.add_trace(go.Scatter(x=metric_df['Date_dt'], y=metric_df['Value'], mode='markers', name=metric, marker=dict(color=color, size=9)), row=1, col=1)
+    Args:
+        items (list): (field_id, field DataFrame, events row or None) tuples.
+        output_dir (str): Output directory.
+        file_format (str): 'png', 'svg', 'jpeg', 'webp' or 'html'.
+        plot_params (dict): Parameters of ``MultiFieldPlotter``.
 
-        fig.add_trace(go.Table(
-            header=dict(values=['<b>Date</b>', '<b>Values</b>', '<b>Phenologic Metrics</b>'], fill_color=base_color, align='center', font=dict(color='white', size=12)),
-            cells=dict(values=[table_df[col] for col in table_df.columns], fill_color=[['lightgrey', 'white']*len(self.phenology_df)], align='center', font=dict(color='darkslategray', size=11))
-        ), row=2, col=1)
+    Returns:
+        list: Paths of the written files.
+    """
+    paths = []
+    for field_id, field_df, events in items:
+        plotter = MultiFieldPlotter(field_df, None if events is None else events.to_frame().T, **plot_params)
+        # Static images are rasterized anyway; SVG traces render more reliably than WebGL in kaleido
+        fig = plotter.plot_field(field_id, webgl=file_format == 'html')
+        path = os.path.join(output_dir, f'{field_id}.{file_format}')
+        if file_format == 'html':
+            fig.write_html(path, include_plotlyjs='cdn')
+        else:
+            fig.write_image(path, format=file_format)
+        paths.append(path)
+    return paths
 
-        df = self.ndvi_df.dropna(subset=["id"])
 
-        fig.add_trace(go.Scatter(x=list(df['date']), y=list(df['ndvi']), mode='markers', name='HLS Images', marker=dict(color='#642834', size=5)), row=1, col=1)
+class MultiFieldPlotter:
+    """
+    Plots the NDVI series and phenology events of many fields.
 
+    Series are drawn with WebGL traces and downsampled with LTTB above
+    ``max_points`` points per field; events come from a batch result table
+    (``BatchPhenology.to_dataframe``), one row per field. ``export`` writes one
+    static file per field in parallel, without a browser.
+
+    Attributes:
+        ndvi_df (pd.DataFrame): Long table with one row per field and day ('field_id', 'date', 'ndvi', ...).
+        events (pd.DataFrame): '<event>_date' / '<event>_value' columns, indexed by field ID.
+        field_column (str): Column identifying the field.
+        max_points (int): Point budget of each drawn series.
+        smoothed_column (str): Column with the smoothed series (drawn if present).
+    """
+
+    def __init__(self, ndvi_df, events=None, field_column='field_id', max_points=1000,
+                 smoothed_column='savitzky_golay'):
+        self.ndvi_df = ndvi_df
+        self.field_column = field_column
+        self.max_points = max_points
+        self.smoothed_column = smoothed_column
+        if events is not None and field_column in events.columns:
+            events = events.set_index(field_column)
+        self.events = events
+        self.groups = ndvi_df.groupby(field_column, sort=False).indices
+
+    def field_ids(self):
+        """Returns the IDs of all fields, in order of appearance."""
+        return list(self.groups)
+
+    def field_frame(self, field_id):
+        """Returns the rows of one field."""
+        return self.ndvi_df.iloc[self.groups[field_id]]
+
+    def downsample(self, dates, values):
+        """Returns the LTTB-selected dates and values of one series."""
+        selected = lttb(dates, values, self.max_points)
+        return dates[selected], values[selected]
+
+    def series_traces(self, field_id, webgl=True, color=OTHER_COLORS[3], show_scenes=True, legendgroup=None):
+        """
+        Builds the NDVI, smoothed and scene traces of one field.
+
+        Returns:
+            list: Plotly traces.
+        """
+        scatter = go.Scattergl if webgl else go.Scatter
+        field_df = self.field_frame(field_id)
+        dates = np.asarray(field_df['date'], dtype='datetime64[ns]')
+        name = str(field_id) if legendgroup else None
+
+        traces = []
+        x, y = self.downsample(dates, field_df['ndvi'].to_numpy(dtype=float))
+        traces.append(scatter(x=x, y=y, mode='lines', name=name or 'NDVI', legendgroup=legendgroup,
+                              line=dict(color=color, width=1)))
+        if self.smoothed_column in field_df:
+            x, y = self.downsample(dates, field_df[self.smoothed_column].to_numpy(dtype=float))
+            traces.append(scatter(x=x, y=y, mode='lines', name=name or 'Savitzky-Golay', legendgroup=legendgroup,
+                                  showlegend=legendgroup is None, line=dict(color=BASE_COLOR, dash='dash', width=1)))
+        if show_scenes and 'id' in field_df:
+            scenes = field_df['id'].notna().to_numpy()
+            traces.append(scatter(x=dates[scenes], y=field_df['ndvi'].to_numpy()[scenes], mode='markers',
+                                  name='HLS Images', legendgroup=legendgroup, showlegend=legendgroup is None,
+                                  marker=dict(color=BASE_COLOR, size=5)))
+        return traces
+
+    def event_traces(self, field_ids, webgl=True):
+        """
+        Builds one marker trace per phenology event, covering all ``field_ids``.
+
+        Returns:
+            list: Plotly traces (empty without an events table).
+        """
+        if self.events is None:
+            return []
+        scatter = go.Scattergl if webgl else go.Scatter
+        events = self.events.reindex(field_ids)
+        hover = events.index.astype(str)
+
+        traces = []
+        for i, name in enumerate(EVENTS):
+            if f'{name}_date' not in events:
+                continue
+            traces.append(scatter(x=events[f'{name}_date'], y=events[f'{name}_value'], mode='markers', name=name,
+                                  text=hover, hovertemplate='field %{text}<br>%{x|%Y-%m-%d}: %{y:.3f}',
+                                  marker=dict(color=OTHER_COLORS[i % len(OTHER_COLORS)], size=9)))
+        return traces
+
+    def layout(self, fig, title):
+        """Applies the common layout."""
         fig.update_layout(
-            height=800,
+            height=600,
             width=1000,
-            title_text="GCERLab Phenologics Metrics and Expenses",
+            title_text=title,
             xaxis_title="Date",
             yaxis_title="NDVI",
-            xaxis_range=[vos_start_date, vos_end_date],
-            plot_bgcolor=background_color,
-            paper_bgcolor=background_color,
+            plot_bgcolor=BACKGROUND_COLOR,
+            paper_bgcolor=BACKGROUND_COLOR,
         )
-
         return fig
+
+    def plot_field(self, field_id, webgl=True):
+        """
+        Creates the figure of one field: series, HLS scenes and phenology markers.
+
+        Returns:
+            go.Figure: The figure.
+        """
+        with instrumentation.span('plotter.field', field_id=field_id):
+            fig = go.Figure(self.series_traces(field_id, webgl) + self.event_traces([field_id], webgl))
+            return self.layout(fig, f"Field {field_id}")
+
+    def plot(self, field_ids=None, webgl=True):
+        """
+        Creates one figure overlaying many fields; each field is a legend group.
+
+        Args:
+            field_ids (list, optional): Fields to draw (defaults to all).
+
+        Returns:
+            go.Figure: The figure.
+        """
+        field_ids = self.field_ids() if field_ids is None else list(field_ids)
+        with instrumentation.span('plotter.fields', rows_in=len(field_ids)):
+            traces = []
+            for i, field_id in enumerate(field_ids):
+                traces.extend(self.series_traces(field_id, webgl, color=OTHER_COLORS[i % len(OTHER_COLORS)],
+                                                 show_scenes=False, legendgroup=str(field_id)))
+            fig = go.Figure(traces + self.event_traces(field_ids, webgl))
+            return self.layout(fig, f"{len(field_ids)} fields")
+
+    def export(self, output_dir, field_ids=None, file_format='png', workers=None, chunk_size=50):
+        """
+        Writes one static file per field, in parallel and without a browser.
+
+        PNG/SVG export needs the ``kaleido`` package; each worker process starts
+        its renderer once and reuses it for all of its fields.
+
+        Args:
+            output_dir (str): Output directory (created if needed).
+            field_ids (list, optional): Fields to export (defaults to all).
+            file_format (str): 'png', 'svg', 'jpeg', 'webp' or 'html'.
+            workers (int, optional): Number of worker processes (defaults to the CPU count).
+            chunk_size (int): Number of fields per task.
+
+        Returns:
+            list: Paths of the written files.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        field_ids = self.field_ids() if field_ids is None else list(field_ids)
+        plot_params = dict(field_column=self.field_column, max_points=self.max_points,
+                           smoothed_column=self.smoothed_column)
+
+        def chunks():
+            for start in range(0, len(field_ids), chunk_size):
+                yield [(field_id, self.field_frame(field_id),
+                        None if self.events is None or field_id not in self.events.index else self.events.loc[field_id])
+                       for field_id in field_ids[start:start + chunk_size]]
+
+        paths = []
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(export_fields, items, output_dir, file_format, plot_params) for items in chunks()]
+            for future in futures:
+                paths.extend(future.result())
+        return paths
@@ -0,0 +1,325 @@
+"""
+Partitioned Parquet store of phenology results with a typed wide schema.
+
+Every field (or field and season) is one row: its ID, the partition keys, the
+date and smoothed NDVI of every event in ``EVENTS`` and one typed column per
+geometric metric in ``METRICS``. ``PhenologyResultsWriter`` buffers rows in
+columnar lists and writes them in bulk to a Hive-partitioned Parquet dataset:
+
+    results/season=2023/region=PR/part-<id>-0.parquet
+
+so readers filtering on season, region or any column only open the files and
+row groups that can match:
+
+    with PhenologyResultsWriter('results/') as writer:
+        writer.add_phenology_df(field_id, phenology_df, region='PR')
+        writer.add_table(wide_df, region='PR')   # BatchPhenology / MultiSeasonPhenology output
+
+    df = read_results('results/', columns=['field_id', 'pos_date', 'pos_value'],
+                      filters=[('season', '=', 2023), ('pos_value', '>', 0.7)])
+
+pyarrow is imported on first use.
+"""
+import os
+import uuid
+
+import numpy as np
+
+from . import instrumentation
+from .metrics_geometrics import METRICS
+from .phenology_batch import EVENTS, PhenologyEvents
+
+PARTITIONS = ('season', 'region')
+
+# Metric kind -> Arrow type name of its column
+METRIC_TYPES = {'days': 'int16', 'ndvi': 'float32', 'percentile': 'int16'}
+
+# Long-format label -> wide column of every metric
+METRIC_LABELS = {label: column for column, kind, start_event, end_event, label in METRICS}
+
+
+def result_schema():
+    """
+    Returns the Arrow schema of the results table.
+
+    Columns: 'field_id' (string), 'season' (int16, season year of the POS date, see ``season_of``), 'region'
+    (string), '<event>_date' (date32) and '<event>_value' (float32) for every event,
+    and one column per metric (int16 day counts, float32 NDVI differences).
+    """
+    import pyarrow as pa
+
+    fields = [pa.field('field_id', pa.string(), nullable=False),
+              pa.field('season', pa.int16()),
+              pa.field('region', pa.string())]
+    for name in EVENTS:
+        fields.append(pa.field(f'{name}_date', pa.date32()))
+        fields.append(pa.field(f'{name}_value', pa.float32()))
+    for column, kind, start_event, end_event, label in METRICS:
+        fields.append(pa.field(column, getattr(pa, METRIC_TYPES[kind])()))
+    return pa.schema(fields)
+
+
+def season_years(pos_dates, season_start_month=1):
+    """
+    Returns the season of every POS date: the calendar year in which its season year starts.
+
+    Season years run from ``season_start_month`` to the month before it, so with the
+    default 1 the season is the calendar year of the POS. With 7 (July to June, e.g. a
+    Southern-hemisphere summer crop) POS dates from July 2022 to June 2023 all belong
+    to season 2022.
+
+    Args:
+        pos_dates (array-like): POS dates (datetime64); the result is undefined for NaT.
+        season_start_month (int): First month (1-12) of the season year.
+
+    Returns:
+        np.ndarray: Season of every date (int64).
+    """
+    if not 1 <= season_start_month <= 12:
+        raise ValueError("season_start_month must be between 1 and 12")
+    months = np.asarray(pos_dates, dtype='datetime64[M]').astype(np.int64) - (season_start_month - 1)
+    return months // 12 + 1970
+
+
+def season_of(pos_date, season_start_month=1):
+    """Returns the season of a row from its POS date (None when there is no POS); see ``season_years``."""
+    pos_date = np.datetime64(pos_date, 'D')
+    return None if np.isnat(pos_date) else int(season_years(pos_date, season_start_month))
+
+
+def phenology_record(phenology_df):
+    """
+    Converts the long-format phenology DataFrame of one field into a wide record.
+
+    Args:
+        phenology_df (pd.DataFrame): Output of ``PhenologyMetrics.derivate_metrics`` (or of the
+            event analyses only), with 'Date', 'Value' and 'Phenologic' columns.
+
+    Returns:
+        dict: '<event>_date' (datetime.date), '<event>_value' and one entry per metric,
+        None where an event or metric is missing.
+    """
+    import pandas as pd
+
+    events = PhenologyEvents.from_phenology_df(phenology_df)
+    record = {}
+    for name in EVENTS:
+        date, value = events.date(name)[0], events.value(name)[0]
+        record[f'{name}_date'] = None if np.isnat(date) else date.astype('datetime64[D]').item()
+        record[f'{name}_value'] = None if np.isnan(value) else float(value)
+
+    metrics = phenology_df[phenology_df['Phenologic'].isin(METRIC_LABELS)]
+    values = dict(zip(metrics['Phenologic'], metrics['Value']))
+    for column, kind, start_event, end_event, label in METRICS:
+        value = values.get(label)
+        record[column] = None if value is None or pd.isna(value) else value
+    return record
+
+
+class PhenologyResultsWriter:
+    """
+    Buffers typed wide result rows and writes them in bulk to a partitioned Parquet dataset.
+
+    Rows added one at a time are kept in per-column lists; tables added in bulk are kept
+    as Arrow tables. Both are written together when ``buffer_size`` rows are pending, on
+    ``flush()`` and on ``close()``. Every flush writes new files, so a dataset can be
+    appended to by several runs.
+
+    Attributes:
+        path (str): Root directory of the dataset.
+        buffer_size (int): Number of pending rows that triggers a flush.
+        row_group_size (int): Maximum rows per Parquet row group.
+        compression (str): Parquet compression codec.
+        season_start_month (int): First month of the season year of the default season keys (see ``season_years``).
+        rows_written (int): Rows written so far by this writer.
+    """
+
+    def __init__(self, path, buffer_size=100_000, row_group_size=128 * 1024, compression='zstd',
+                 season_start_month=1):
+        if not 1 <= season_start_month <= 12:
+            raise ValueError("season_start_month must be between 1 and 12")
+        self.path = path
+        self.buffer_size = buffer_size
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.season_start_month = season_start_month
+        self.schema = result_schema()
+        self.columns = {name: [] for name in self.schema.names}
+        self.tables = []
+        self.pending = 0
+        self.rows_written = 0
+        os.makedirs(path, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_record(self, field_id, record, region=None, season=None):
+        """
+        Buffers one row.
+
+        Args:
+            field_id: ID of the field (stored as a string).
+            record (dict): Event and metric entries, as returned by ``phenology_record``;
+                missing entries are stored as null.
+            region (str, optional): Region partition key.
+            season (int, optional): Season partition key (defaults to the season year of the POS date).
+        """
+        if season is None:
+            pos_date = record.get('pos_date')
+            season = None if pos_date is None else season_of(pos_date, self.season_start_month)
+        row = {**record, 'field_id': str(field_id), 'season': season, 'region': region}
+        for name, values in self.columns.items():
+            values.append(row.get(name))
+        self.pending += 1
+        if self.pending >= self.buffer_size:
+            self.flush()
+
+    def add_phenology_df(self, field_id, phenology_df, region=None, season=None):
+        """Buffers the long-format phenology DataFrame of one field as one row."""
+        self.add_record(field_id, phenology_record(phenology_df), region=region, season=season)
+
+    def add_table(self, table, region=None, season=None):
+        """
+        Buffers a wide table with one row per field (or field and season).
+
+        Args:
+            table (pd.DataFrame): 'field_id', '<event>_date' / '<event>_value' and metric columns, as
+                built from ``BatchPhenology.to_dataframe`` and ``BatchPhenologyMetrics.compute`` or
+                returned by ``MultiSeasonPhenology.to_dataframe``. Other columns are ignored.
+            region (str or array-like, optional): Region of every row, unless the table has a 'region' column.
+            season (int or array-like, optional): Season of every row (defaults to the season year of each
+                POS date).
+                A 'season' column of the table is ignored, since it numbers the seasons within a field.
+        """
+        import pyarrow as pa
+
+        n_rows = len(table)
+        if season is None:
+            pos_dates = table['pos_date'].to_numpy(dtype='datetime64[D]')
+            valid = ~np.isnat(pos_dates)
+            season = pa.array(np.where(valid, season_years(pos_dates, self.season_start_month), 0), mask=~valid)
+        else:
+            season = pa.array(np.broadcast_to(np.asarray(season, dtype=np.int64), n_rows))
+        if 'region' in table:
+            region = pa.array(table['region'], from_pandas=True)
+        else:
+            region = pa.array(np.broadcast_to(np.asarray(region, dtype=object), n_rows).tolist(), pa.string())
+
+        arrays = [pa.array(table['field_id'].astype(str)), season, region]
+        for field in self.schema:
+            if field.name in PARTITIONS or field.name == 'field_id':
+                continue
+            if field.name not in table:
+                arrays.append(pa.nulls(n_rows, field.type))
+            elif pa.types.is_date32(field.type):
+                arrays.append(pa.array(table[field.name].to_numpy(dtype='datetime64[D]'), from_pandas=True))
+            else:
+                arrays.append(pa.array(table[field.name].to_numpy(dtype=float, na_value=np.nan), from_pandas=True))
+        arrays = [array.cast(field.type, safe=False) for array, field in zip(arrays, self.schema)]
+        self.tables.append(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.pending += n_rows
+        if self.pending >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Writes every pending row as new files of the dataset."""
+        if not self.pending:
+            return
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        with instrumentation.span('results_flush', rows_in=self.pending) as span:
+            tables = list(self.tables)
+            if self.columns['field_id']:
+                tables.append(pa.Table.from_pydict(self.columns, schema=self.schema))
+            table = pa.concat_tables(tables)
+
+            ds.write_dataset(
+                table, self.path, format='parquet',
+                partitioning=ds.partitioning(pa.schema([self.schema.field(name) for name in PARTITIONS]),
+                                             flavor='hive'),
+                basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+                existing_data_behavior='overwrite_or_ignore',
+                file_options=ds.ParquetFileFormat().make_write_options(compression=self.compression),
+                max_rows_per_group=self.row_group_size, min_rows_per_group=min(self.row_group_size, len(table)),
+            )
+            self.rows_written += len(table)
+            span.add(rows_out=len(table))
+
+        self.columns = {name: [] for name in self.schema.names}
+        self.tables = []
+        self.pending = 0
+
+    def close(self):
+        """Writes the pending rows."""
+        self.flush()
+
+
+def results_dataset(path):
+    """Opens the results directory as a ``pyarrow.dataset.Dataset`` with its partition keys."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    schema = result_schema()
+    partitioning = ds.partitioning(pa.schema([schema.field(name) for name in PARTITIONS]), flavor='hive')
+    return ds.dataset(path, schema=schema, format='parquet', partitioning=partitioning)
+
+
+def read_results(path, columns=None, filters=None, to_pandas=True):
+    """
+    Reads results with column projection and predicate pushdown.
+
+    Filters on 'season' and 'region' prune whole partition directories; filters on other
+    columns skip row groups whose Parquet statistics cannot match.
+
+    Args:
+        path (str): Root directory of the dataset.
+        columns (list, optional): Columns to read (all by default).
+        filters (list or pyarrow.compute.Expression, optional): Conjunction of (column, op, value)
+            tuples, with op one of '=', '==', '!=', '<', '<=', '>', '>=', 'in', 'not in', or an
+            Arrow expression such as ``(pc.field('season') == 2023) & (pc.field('pos_value') > 0.7)``.
+        to_pandas (bool): Return a DataFrame (nullable Int16 day counts, datetime64 dates)
+            instead of an Arrow table.
+
+    Returns:
+        pd.DataFrame or pyarrow.Table: The matching rows.
+    """
+    with instrumentation.span('results_read') as span:
+        table = results_dataset(path).to_table(columns=columns, filter=filter_expression(filters))
+        span.add(rows_out=table.num_rows)
+    if not to_pandas:
+        return table
+    import pandas as pd
+    import pyarrow as pa
+
+    # Day counts stay nullable integers and event dates become datetime64 columns
+    return table.to_pandas(date_as_object=False, types_mapper={pa.int16(): pd.Int16Dtype()}.get)
+
+
+def filter_expression(filters):
+    """Converts (column, op, value) tuples into an Arrow expression (expressions pass through)."""
+    if filters is None or not isinstance(filters, (list, tuple)):
+        return filters
+    import pyarrow.compute as pc
+
+    operators = {
+        '=': lambda field, value: field == value,
+        '==': lambda field, value: field == value,
+        '!=': lambda field, value: field != value,
+        '<': lambda field, value: field < value,
+        '<=': lambda field, value: field <= value,
+        '>': lambda field, value: field > value,
+        '>=': lambda field, value: field >= value,
+        'in': lambda field, value: field.isin(list(value)),
+        'not in': lambda field, value: ~field.isin(list(value)),
+    }
+    expression = None
+    for column, op, value in filters:
+        if op not in operators:
+            raise ValueError(f"Unsupported filter operator '{op}', expected one of {sorted(operators)}")
+        term = operators[op](pc.field(column), value)
+        expression = term if expression is None else expression & term
+    return expression
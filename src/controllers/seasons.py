@@ -0,0 +1,268 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+import pandas as pd
+
+from . import instrumentation
+from .metrics_geometrics import BatchPhenologyMetrics
+from .phenology_batch import EVENTS, BatchPhenology, PhenologyEvents, as_float_matrix
+
+
+class MultiSeasonPhenology:
+    """
+    Finds every growing season of long NDVI series and computes its events and metrics.
+
+    A season is a valley-peak-valley triplet of the smoothed series whose peak
+    rises at least ``min_amplitude`` above both valleys and whose valleys are
+    ``min_duration`` to ``max_duration`` days apart. Valleys that do not bound
+    such a season (noise inside a season, or a shallow dip between two peaks)
+    are merged into it. Each season starts at its lowest valley, and ends at the
+    lowest valley reached before the series rises ``min_amplitude`` again.
+
+    BOS/EOS and the geometric metrics are then computed per season on a window
+    from its first to its last valley, so a multi-year archive is processed in
+    one pass and yields one row per field and season.
+
+    Attributes:
+        dates (np.ndarray): Shared date axis (datetime64), or one axis per field (fields x days)
+            for series kept on their observation dates.
+        ndvi (np.ndarray): Raw NDVI matrix (fields x days).
+        smoothed (np.ndarray): Smoothed NDVI matrix (fields x days).
+        order_ndvi (int): Order parameter for finding extrema.
+        threshold (float): NDVI threshold used for the absolute BOS/EOS.
+        min_amplitude (float): Minimum rise of the peak above each valley.
+        min_duration (float): Minimum number of days between the valleys.
+        max_duration (float): Maximum number of days between the valleys.
+        chunk_size (int): Number of seasons processed per vectorized block.
+    """
+
+    def __init__(self, dates, ndvi, smoothed, order_ndvi, threshold, min_amplitude=0.1, min_duration=30,
+                 max_duration=365, chunk_size=4096):
+        self.engine = BatchPhenology(dates, ndvi, smoothed, order_ndvi=order_ndvi, threshold=threshold)
+        self.dates = self.engine.dates
+        self.ndvi = self.engine.ndvi
+        self.smoothed = self.engine.smoothed
+        self.order_ndvi = order_ndvi
+        self.threshold = threshold
+        self.min_amplitude = min_amplitude
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.chunk_size = chunk_size
+
+    def find_seasons(self):
+        """
+        Finds the valley-peak-valley triplets of every field.
+
+        Returns:
+            dict: Arrays with one entry per season: 'field' (row of the field), 'season'
+            (number within the field), 'vos_start', 'pos' and 'vos_end' (column indexes)
+            and 'amplitude' (peak minus the higher valley).
+        """
+        peaks, valleys = self.engine.find_extrema()
+        days = self.engine.days
+        shared_days = days.tolist() if days.ndim == 1 else None
+        peak_rows, peak_columns = np.nonzero(peaks)
+        valley_rows, valley_columns = np.nonzero(valleys)
+        peak_bounds = np.searchsorted(peak_rows, np.arange(self.smoothed.shape[0] + 1))
+        valley_bounds = np.searchsorted(valley_rows, np.arange(self.smoothed.shape[0] + 1))
+
+        seasons = {name: [] for name in ('field', 'season', 'vos_start', 'pos', 'vos_end', 'amplitude')}
+        for row in range(self.smoothed.shape[0]):
+            peak_list = peak_columns[peak_bounds[row]:peak_bounds[row + 1]].tolist()
+            valley_list = valley_columns[valley_bounds[row]:valley_bounds[row + 1]].tolist()
+            if not peak_list or len(valley_list) < 2:
+                continue
+            values = self.smoothed[row]
+            peak_values = values[peak_list].tolist()
+            valley_values = values[valley_list].tolist()
+
+            row_days = shared_days if shared_days is not None else days[row].tolist()
+            for number, (start, peak, end, amplitude) in enumerate(
+                    self.scan_field(row_days, peak_list, peak_values, valley_list, valley_values)):
+                seasons['field'].append(row)
+                seasons['season'].append(number)
+                seasons['vos_start'].append(start)
+                seasons['pos'].append(peak)
+                seasons['vos_end'].append(end)
+                seasons['amplitude'].append(amplitude)
+
+        return {name: np.asarray(values, dtype=float if name == 'amplitude' else np.int64)
+                for name, values in seasons.items()}
+
+    def scan_field(self, days, peaks, peak_values, valleys, valley_values):
+        """
+        Walks the valleys of one field once, yielding the seasons that meet the constraints.
+
+        A season ends at the first valley that meets them, moved on to the lowest valley
+        that follows before a peak rises ``min_amplitude`` above it (or ``max_duration``
+        is exceeded), so a small bump on the falling limb does not cut the season short.
+
+        Args:
+            days (list): Day number of every column of the field.
+            peaks (list): Peak columns, sorted.
+            peak_values (list): Smoothed value of every peak.
+            valleys (list): Valley columns, sorted.
+            valley_values (list): Smoothed value of every valley.
+
+        Yields:
+            tuple: (vos_start, pos, vos_end, amplitude) with column indexes.
+        """
+        i = 0
+        while i < len(valleys) - 1:
+            found = False
+            for j in range(i + 1, len(valleys)):
+                if days[valleys[j]] - days[valleys[i]] > self.max_duration:
+                    break
+                first, last = bisect_right(peaks, valleys[i]), bisect_left(peaks, valleys[j])
+                if first == last:
+                    continue
+                top = max(range(first, last), key=peak_values.__getitem__)
+
+                # The season starts at the lowest valley before its peak
+                before = bisect_left(valleys, peaks[top], i, j)
+                start = min(range(i, before), key=valley_values.__getitem__)
+                amplitude = peak_values[top] - max(valley_values[start], valley_values[j])
+                duration = days[valleys[j]] - days[valleys[start]]
+                if amplitude >= self.min_amplitude and self.min_duration <= duration <= self.max_duration:
+                    end = self.lowest_end(days, peaks, peak_values, valleys, valley_values, start, j)
+                    amplitude = peak_values[top] - max(valley_values[start], valley_values[end])
+                    yield valleys[start], peaks[top], valleys[end], amplitude
+                    i, found = end, True
+                    break
+            if not found:
+                i += 1
+
+    def lowest_end(self, days, peaks, peak_values, valleys, valley_values, start, end):
+        """
+        Moves the end of a season to the lowest valley of its falling limb.
+
+        Returns:
+            int: Position in ``valleys`` of the end valley.
+        """
+        lowest = end
+        for k in range(end + 1, len(valleys)):
+            if days[valleys[k]] - days[valleys[start]] > self.max_duration:
+                break
+            first, last = bisect_right(peaks, valleys[k - 1]), bisect_left(peaks, valleys[k])
+            if first < last and max(peak_values[first:last]) >= valley_values[lowest] + self.min_amplitude:
+                break
+            if valley_values[k] < valley_values[lowest]:
+                lowest = k
+        return lowest
+
+    def window(self, seasons, chunk):
+        """
+        Gathers the window from vos_start to vos_end of a block of seasons.
+
+        Returns:
+            tuple: Per-season date axes, raw and smoothed NDVI (seasons x width, NaN after vos_end)
+            and the vos_start column of every season.
+        """
+        start, end = seasons['vos_start'][chunk], seasons['vos_end'][chunk]
+        width = int((end - start).max()) + 1
+        columns = start[:, None] + np.arange(width)
+        padding = columns > end[:, None]
+        columns = np.minimum(columns, self.smoothed.shape[1] - 1)
+        rows = seasons['field'][chunk][:, None]
+
+        ndvi = np.where(padding, np.nan, self.ndvi[rows, columns])
+        smoothed = np.where(padding, np.nan, self.smoothed[rows, columns])
+        # Padding repeats the last date of the axis, which is never inside a season window
+        dates = self.dates[rows, columns] if self.dates.ndim == 2 else self.dates[columns]
+        dates = np.where(padding, np.datetime64('NaT'), dates)
+        return dates, ndvi, smoothed, start
+
+    def analyze_chunk(self, seasons, chunk):
+        """
+        Computes the events and metrics of a block of seasons.
+
+        Returns:
+            tuple[dict, PhenologyEvents, pd.DataFrame]: Absolute event column indexes,
+            the event table and the metrics table of the block.
+        """
+        dates, ndvi, smoothed, offset = self.window(seasons, chunk)
+        engine = BatchPhenology(dates, ndvi, smoothed, threshold=self.threshold)
+        events = {
+            'vos_start': np.zeros(len(offset), dtype=np.int64),
+            'vos_end': seasons['vos_end'][chunk] - offset,
+            'pos': seasons['pos'][chunk] - offset,
+        }
+        events.update(engine.find_bos_eos_der(events))
+        events.update(engine.find_bos_eos_abs(events))
+
+        table = PhenologyEvents.from_indexes(dates, smoothed, events)
+        metrics = BatchPhenologyMetrics(table, dates, smoothed).compute()
+        absolute = {name: np.where(index >= 0, index + offset, -1) for name, index in events.items()}
+        return absolute, table, metrics
+
+    def execute_analysis(self):
+        """
+        Finds every season and computes its events and metrics.
+
+        Returns:
+            tuple[dict, PhenologyEvents, pd.DataFrame]: The seasons of ``find_seasons`` with the
+            column index of every event in ``EVENTS``, the event table and the metrics table,
+            one row per season.
+        """
+        with instrumentation.span('seasons', rows_in=self.smoothed.size) as span:
+            seasons = self.find_seasons()
+            n_seasons = len(seasons['field'])
+            events = {name: np.full(n_seasons, -1, dtype=np.int64) for name in EVENTS}
+            table = PhenologyEvents.empty(n_seasons)
+            metrics = []
+
+            for begin in range(0, n_seasons, self.chunk_size):
+                chunk = slice(begin, min(begin + self.chunk_size, n_seasons))
+                chunk_events, chunk_table, chunk_metrics = self.analyze_chunk(seasons, chunk)
+                for name, index in chunk_events.items():
+                    events[name][chunk] = index
+                table.records[chunk] = chunk_table.records
+                metrics.append(chunk_metrics)
+
+            metrics = pd.concat(metrics, ignore_index=True) if metrics else \
+                BatchPhenologyMetrics(table, self.dates[:0] if self.dates.ndim == 2 else self.dates,
+                                      np.empty((0, self.smoothed.shape[1]))).compute()
+            seasons.update(events)
+            span.add(rows_out=n_seasons)
+        return seasons, table, metrics
+
+    def to_dataframe(self, field_ids=None):
+        """
+        Runs the analysis and returns one row per field and season.
+
+        Args:
+            field_ids (array-like, optional): ID of every row of the input matrices (defaults to the row number).
+
+        Returns:
+            pd.DataFrame: 'field_id', 'season', 'amplitude', '<event>_date' / '<event>_value'
+            for every event and one column per geometric metric.
+        """
+        seasons, table, metrics = self.execute_analysis()
+        field_ids = np.arange(self.smoothed.shape[0]) if field_ids is None else np.asarray(field_ids)
+
+        frame = {'field_id': field_ids[seasons['field']], 'season': seasons['season'],
+                 'amplitude': seasons['amplitude']}
+        for name in EVENTS:
+            frame[f'{name}_date'] = table.date(name)
+            frame[f'{name}_value'] = table.value(name)
+        return pd.concat([pd.DataFrame(frame), metrics], axis=1)
+
+
+def analyze_seasons(ndvi_df, order_ndvi, threshold, smoothed_column='savitzky_golay', **constraints):
+    """
+    Finds every season of one field's DataFrame (as used by ``VosPosMetrics``).
+
+    Args:
+        ndvi_df (pd.DataFrame): Daily series with 'date', 'ndvi' and the smoothed column.
+        order_ndvi (int): Order parameter for finding extrema.
+        threshold (float): NDVI threshold used for the absolute BOS/EOS.
+        smoothed_column (str): Column holding the smoothed NDVI series.
+        **constraints: ``min_amplitude``, ``min_duration`` and ``max_duration`` of ``MultiSeasonPhenology``.
+
+    Returns:
+        pd.DataFrame: One row per season, as in ``MultiSeasonPhenology.to_dataframe``.
+    """
+    engine = MultiSeasonPhenology(ndvi_df['date'], as_float_matrix(ndvi_df['ndvi'].to_numpy()),
+                                  as_float_matrix(ndvi_df[smoothed_column].to_numpy()),
+                                  order_ndvi, threshold, **constraints)
+    return engine.to_dataframe().drop(columns='field_id')
@@ -0,0 +1,210 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class NDVISeriesStore:
+    """
+    Memory-mapped, float32 columnar store of daily NDVI series.
+
+    All fields share one date axis; each layer ('ndvi', 'savitzky_golay', ...) is
+    a (fields x days) float32 matrix kept in its own file and memory-mapped from
+    disk, so the store can be much larger than RAM. Fields are appended one at a
+    time or in blocks, and rows are returned as views without copying.
+
+    Layout of the store directory:
+        dates.npy       shared date axis (datetime64[D])
+        fields.txt      one field ID per line, in row order
+        <layer>.f32     raw float32 matrix of each layer
+        meta.json       number of fields, row capacity and layer names
+
+    An append writes the rows, then the field IDs, then the metadata, so only the
+    first ``n_fields`` IDs of ``fields.txt`` are committed; the IDs of an append
+    interrupted before its metadata was written are dropped when the store is
+    opened for appending.
+
+    Attributes:
+        path (str): Directory of the store.
+        dates (np.ndarray): Shared date axis.
+        field_ids (list): Field IDs in row order.
+    """
+
+    def __init__(self, path, mode='r+'):
+        """
+        Opens an existing store.
+
+        Args:
+            path (str): Directory of the store.
+            mode (str): 'r' for read-only access or 'r+' to append.
+        """
+        self.path = path
+        self.mode = mode
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        self.n_fields = meta['n_fields']
+        self.capacity = meta['capacity']
+        self.layer_names = meta['layers']
+        self.dates = np.load(os.path.join(path, 'dates.npy'))
+
+        with open(os.path.join(path, 'fields.txt')) as file:
+            field_ids = [line.rstrip('\n') for line in file]
+        self.field_ids = field_ids[:self.n_fields]
+        if len(field_ids) > self.n_fields and mode != 'r':
+            # IDs written by an append that crashed before its metadata; the next append
+            # would otherwise give their row numbers to other fields
+            self.write_field_ids(path, self.field_ids)
+        self.rows = {field_id: row for row, field_id in enumerate(self.field_ids)}
+        self.layers = {name: self.open_layer(name) for name in self.layer_names}
+
+    @classmethod
+    def create(cls, path, dates, layers=('ndvi',), capacity=1024):
+        """
+        Creates an empty store.
+
+        Args:
+            path (str): Directory of the store (created if needed).
+            dates (array-like): Shared daily date axis.
+            layers (tuple): Names of the layers to allocate.
+            capacity (int): Initial number of rows allocated on disk.
+
+        Returns:
+            NDVISeriesStore: The store, open for appending.
+        """
+        os.makedirs(path, exist_ok=True)
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        np.save(os.path.join(path, 'dates.npy'), dates)
+        open(os.path.join(path, 'fields.txt'), 'w').close()
+        for name in layers:
+            with open(os.path.join(path, f'{name}.f32'), 'wb') as file:
+                file.truncate(capacity * dates.shape[0] * 4)
+        cls.write_meta(path, 0, capacity, list(layers))
+        return cls(path, mode='r+')
+
+    @staticmethod
+    def write_meta(path, n_fields, capacity, layers):
+        """Writes the store metadata atomically."""
+        temporary = os.path.join(path, 'meta.json.tmp')
+        with open(temporary, 'w') as file:
+            json.dump({'n_fields': n_fields, 'capacity': capacity, 'layers': layers}, file)
+        os.replace(temporary, os.path.join(path, 'meta.json'))
+
+    @staticmethod
+    def write_field_ids(path, field_ids):
+        """Rewrites the field IDs file atomically."""
+        temporary = os.path.join(path, 'fields.txt.tmp')
+        with open(temporary, 'w') as file:
+            file.writelines(f"{field_id}\n" for field_id in field_ids)
+        os.replace(temporary, os.path.join(path, 'fields.txt'))
+
+    def open_layer(self, name):
+        """Memory-maps the full allocated matrix of a layer."""
+        return np.memmap(os.path.join(self.path, f'{name}.f32'), dtype=np.float32, mode=self.mode,
+                         shape=(self.capacity, self.dates.shape[0]))
+
+    def __len__(self):
+        return self.n_fields
+
+    def layer(self, name='ndvi'):
+        """
+        Returns the (fields x days) matrix of a layer as a view of the memory map.
+
+        Args:
+            name (str): Layer name.
+
+        Returns:
+            np.memmap: float32 matrix with one row per stored field.
+        """
+        return self.layers[name][:self.n_fields]
+
+    def row(self, field_id, name='ndvi'):
+        """Returns the series of one field as a view of the memory map."""
+        return self.layers[name][self.rows[field_id]]
+
+    def add_layer(self, name):
+        """
+        Allocates a new layer, filled with NaN (e.g. to hold smoothed series).
+
+        Returns:
+            np.memmap: The (fields x days) matrix of the new layer.
+        """
+        if name not in self.layers:
+            with open(os.path.join(self.path, f'{name}.f32'), 'wb') as file:
+                file.truncate(self.capacity * self.dates.shape[0] * 4)
+            self.layer_names.append(name)
+            self.layers[name] = self.open_layer(name)
+            self.layers[name][:self.n_fields] = np.nan
+            self.flush()
+        return self.layer(name)
+
+    def reserve(self, n_fields):
+        """Grows the files, doubling their capacity, so that ``n_fields`` rows fit."""
+        if n_fields <= self.capacity:
+            return
+        capacity = max(n_fields, 2 * self.capacity)
+        for name in self.layer_names:
+            self.layers[name].flush()
+            del self.layers[name]
+            with open(os.path.join(self.path, f'{name}.f32'), 'r+b') as file:
+                file.truncate(capacity * self.dates.shape[0] * 4)
+        self.capacity = capacity
+        self.layers = {name: self.open_layer(name) for name in self.layer_names}
+
+    def append(self, field_ids, values, name='ndvi'):
+        """
+        Appends a block of fields; other layers of the new rows are set to NaN.
+
+        Args:
+            field_ids (list): IDs of the new fields.
+            values (array-like): Series on the shared date axis, shape (fields, days).
+            name (str): Layer receiving ``values``.
+
+        Returns:
+            slice: Rows of the new fields.
+        """
+        values = np.atleast_2d(values)
+        field_ids = [str(field_id) for field_id in field_ids]
+        if name not in self.layers:
+            raise ValueError(f"Unknown layer '{name}', expected one of {self.layer_names}")
+        duplicated = [field_id for field_id in field_ids if field_id in self.rows]
+        if duplicated:
+            raise ValueError(f"Fields already stored: {duplicated[:5]}")
+
+        rows = slice(self.n_fields, self.n_fields + len(field_ids))
+        self.reserve(rows.stop)
+        for layer_name in self.layer_names:
+            self.layers[layer_name][rows] = values if layer_name == name else np.nan
+
+        with open(os.path.join(self.path, 'fields.txt'), 'a') as file:
+            file.writelines(f"{field_id}\n" for field_id in field_ids)
+        self.field_ids.extend(field_ids)
+        self.rows.update({field_id: row for row, field_id in enumerate(field_ids, rows.start)})
+        self.n_fields = rows.stop
+        self.flush()
+        return rows
+
+    def append_dataframe(self, field_id, ndvi_df, column='ndvi'):
+        """
+        Appends one field from a DataFrame like the one of ``HLS.convert_to_dataframe``.
+
+        Dates outside the shared axis are dropped and missing dates are stored as NaN.
+        """
+        series = ndvi_df.set_index(pd.to_datetime(ndvi_df['date']).dt.normalize())[column]
+        values = series.reindex(pd.DatetimeIndex(self.dates)).to_numpy(dtype=np.float32)
+        return self.append([field_id], values[None, :], name=column)
+
+    def to_dataframe(self, field_id, layers=None):
+        """
+        Returns one field as a DataFrame with a 'date' column and one column per layer.
+        """
+        frame = {'date': pd.DatetimeIndex(self.dates)}
+        for name in layers or self.layer_names:
+            frame[name] = self.row(field_id, name)
+        return pd.DataFrame(frame)
+
+    def flush(self):
+        """Flushes the memory maps and writes the metadata."""
+        for matrix in self.layers.values():
+            matrix.flush()
+        self.write_meta(self.path, self.n_fields, self.capacity, self.layer_names)
@@ -0,0 +1,450 @@
+from functools import lru_cache
+from math import comb
+
+import numpy as np
+
+from . import instrumentation
+from .phenology_batch import day_numbers, is_daily
+
+
+def fill_gaps(values):
+    """
+    Linearly interpolates NaN gaps of every row, holding the first/last valid value at the edges.
+
+    Args:
+        values (np.ndarray): Matrix (fields x days).
+
+    Returns:
+        np.ndarray: Gap-filled copy; rows without any valid value stay NaN.
+    """
+    values = np.array(values, dtype=float)
+    valid = ~np.isnan(values)
+    n_days = values.shape[1]
+    columns = np.arange(n_days)
+
+    # Column of the previous and of the next valid value of every cell
+    previous = np.maximum.accumulate(np.where(valid, columns, -1), axis=1)
+    following = np.minimum.accumulate(np.where(valid, columns, n_days)[:, ::-1], axis=1)[:, ::-1]
+    previous_clipped = np.where(previous < 0, following, previous).clip(0, n_days - 1)
+    following_clipped = np.where(following >= n_days, previous, following).clip(0, n_days - 1)
+
+    rows = np.arange(values.shape[0])[:, None]
+    left, right = values[rows, previous_clipped], values[rows, following_clipped]
+    span = following_clipped - previous_clipped
+    fraction = np.divide(columns - previous_clipped, span, out=np.zeros(values.shape), where=span > 0)
+    return np.where(valid, values, left + fraction * (right - left))
+
+
+@lru_cache(maxsize=64)
+def savgol_weights(window_size, poly_order):
+    """
+    Computes the Savitzky-Golay weights of one window size and polynomial order.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Weights of the centered window (window_size,),
+        and the matrices (window_size // 2, window_size) that evaluate the polynomial fitted to the
+        first and to the last window at the edge positions.
+    """
+    if poly_order >= window_size:
+        raise ValueError("poly_order must be less than window_size.")
+    half = window_size // 2
+    # Even windows are centered between their two middle samples, as in scipy.signal.savgol_coeffs
+    center = half - 0.5 if window_size % 2 == 0 else half
+    powers = np.arange(poly_order + 1)
+    offsets = np.arange(window_size) - center
+    target = np.zeros(poly_order + 1)
+    target[0] = 1.0
+    weights = np.linalg.lstsq(offsets ** powers[:, None], target, rcond=None)[0]
+
+    # Least-squares fit of a window followed by evaluation at the edge samples; the
+    # positions are centered and scaled to keep the Vandermonde matrix well conditioned
+    positions = offsets / max(center, 1.0)
+    fit = np.linalg.pinv(positions[:, None] ** powers)
+    first = (positions[:half, None] ** powers) @ fit
+    last = (positions[window_size - half:, None] ** powers) @ fit
+    for array in (weights, first, last):
+        array.flags.writeable = False
+    return weights, first, last
+
+
+def savgol_filter(values, window_size, poly_order):
+    """
+    Savitzky-Golay filter along the rows of a matrix, in NumPy only.
+
+    Matches ``scipy.signal.savgol_filter(values, window_size, poly_order, axis=1)``
+    (mode 'interp'): interior samples are the weighted sum of their window and the
+    ``window_size // 2`` samples at each edge come from the polynomial fitted to the
+    first or last window.
+
+    Args:
+        values (np.ndarray): Gap-free matrix (fields x days).
+        window_size (int): Length of the filter window.
+        poly_order (int): Order of the fitted polynomial.
+
+    Returns:
+        np.ndarray: Filtered float64 matrix (fields x days).
+    """
+    values = np.asarray(values, dtype=float)
+    n_days = values.shape[1]
+    if window_size > n_days:
+        raise ValueError("If mode is 'interp', window_length must be less than or equal to the size of x.")
+    weights, first, last = savgol_weights(window_size, poly_order)
+    half = window_size // 2
+
+    # Weighted sum over a strided view of every full window, without copying the windows
+    windows = np.einsum('fwk,k->fw', np.lib.stride_tricks.sliding_window_view(values, window_size, axis=1),
+                        weights)
+
+    smoothed = np.empty(values.shape)
+    start = (window_size - 1) // 2
+    smoothed[:, half:n_days - half] = windows[:, half - start:half - start + n_days - 2 * half]
+    smoothed[:, :half] = values[:, :window_size] @ first.T
+    smoothed[:, n_days - half:] = values[:, n_days - window_size:] @ last.T
+    return smoothed
+
+
+def savgol_irregular(values, days, window_size, poly_order):
+    """
+    Savitzky-Golay filter of irregularly sampled series, evaluated on their own days.
+
+    Returns what ``savgol_filter`` gives on those days for the daily series linearly
+    interpolated between the observations (as built by ``fill_gaps``), without building
+    that series. Between two observations the daily values are linear, so each window
+    is a sum over the gaps it overlaps, weighted by prefix sums of the filter weights:
+    every observation weighs in by the days it spans. The cost grows with the number
+    of observations per window instead of the number of days per series.
+
+    Args:
+        values (np.ndarray): Observations (fields x samples); NaN marks samples that are
+            evaluated but not used as observations.
+        days (np.ndarray): Integer day numbers sorted along the rows, shared (samples,) or per
+            field (fields x samples); NaN days (padding) give NaN.
+        window_size (int): Length of the filter window, in days.
+        poly_order (int): Order of the fitted polynomial.
+
+    Returns:
+        np.ndarray: Filtered float64 matrix (fields x samples); NaN for rows whose
+        observations span fewer than ``window_size`` days, and outside that span.
+    """
+    values = np.asarray(values, dtype=float)
+    days = np.broadcast_to(np.asarray(days, dtype=float), values.shape)
+    n_fields, n_samples = values.shape
+    weights, first, last = savgol_weights(window_size, poly_order)
+    half = window_size // 2
+
+    # Filter weights of every edge position and of the centered window, with their prefix sums
+    table = np.vstack([first, weights, last])
+    prefix = np.zeros((2, len(table), window_size + 1))
+    prefix[0, :, 1:] = np.cumsum(table, axis=1)
+    prefix[1, :, 1:] = np.cumsum(table * np.arange(window_size), axis=1)
+
+    # Observations first, in day order, then a copy of the last observation on the following
+    # day (so every day of a series lies in a gap [d0, d1)) and at least one unused column
+    rows = np.arange(n_fields)
+    observed = ~np.isnan(values) & ~np.isnan(days)
+    count = observed.sum(axis=1)
+    order = np.argsort(~observed, axis=1, kind='stable')
+    width = n_samples + 2
+    source_days = np.concatenate([np.take_along_axis(days, order, axis=1), np.zeros((n_fields, 2))], axis=1)
+    source_values = np.concatenate([np.take_along_axis(values, order, axis=1), np.zeros((n_fields, 2))], axis=1)
+    present = count > 0
+    origin = source_days[present, 0].min() if present.any() else 0.0
+    last_column = np.maximum(count - 1, 0)
+    first_day = np.where(present, source_days[:, 0], origin)
+    last_day = np.where(present, source_days[rows, last_column], origin)
+    source_days[rows, count] = last_day + 1
+    source_values[rows, count] = source_values[rows, last_column]
+
+    # Columns beyond the copy lie past every window, at a day below the next row's keys
+    far = (last_day - origin).max(initial=0.0) + window_size + 2
+    unused = np.arange(width) > count[:, None]
+    source_days = np.where(unused, origin + far, source_days)
+    source_values = np.where(unused, 0.0, source_values)
+
+    # Position of every target in its series and the window (start day, filter weights) that evaluates it
+    n_days = last_day - first_day + 1
+    target = np.round(days)
+    position = target - first_day[:, None]
+    valid = (~np.isnan(target) & present[:, None] & (n_days >= window_size)[:, None]
+             & (position >= 0) & (position < n_days[:, None]))
+    position = np.where(valid, position, 0.0)
+    head, tail = position < half, position >= (n_days - half)[:, None]
+    case = np.where(head, position, np.where(tail, half + 1 + position - (n_days - half)[:, None], half))
+    case = case.astype(np.int64)
+    start = np.where(head, first_day[:, None],
+                     np.where(tail, (last_day - window_size + 1)[:, None], target - (window_size - 1) // 2))
+    start = np.where(valid, start, first_day[:, None])
+    end = start + window_size
+
+    # Gap holding the first day of every window: one sorted search over all rows
+    keys = (rows[:, None] * (far + 1) + source_days - origin).ravel()
+    gap = np.searchsorted(keys, (rows[:, None] * (far + 1) + start - origin).ravel(), side='right') - 1
+
+    # Targets still summing, as flat arrays; a target is done once its next gap starts after its window
+    target = np.flatnonzero(valid)
+    gap, start, end, case = gap[target], start.ravel()[target], end.ravel()[target], case.ravel()[target]
+    source_days, source_values = source_days.ravel(), source_values.ravel()
+    smoothed = np.full(values.size, np.nan)
+    smoothed[target] = 0.0
+    while len(target):
+        d0 = source_days[gap]
+        active = d0 < end
+        if not active.all():
+            target, gap, start, end, case, d0 = (array[active] for array in (target, gap, start, end, case, d0))
+        d1, y0, y1 = source_days[gap + 1], source_values[gap], source_values[gap + 1]
+
+        # Days start + k of the window inside the gap, for k in [low, high)
+        low = (np.maximum(d0, start) - start).astype(np.int64)
+        high = (np.minimum(d1, end) - start).astype(np.int64)
+        sum0 = prefix[0, case, high] - prefix[0, case, low]
+        sum1 = prefix[1, case, high] - prefix[1, case, low]
+        slope = (y1 - y0) / (d1 - d0)
+        smoothed[target] += y0 * sum0 + slope * ((start - d0) * sum0 + sum1)
+        gap = gap + 1
+    return smoothed.reshape(values.shape)
+
+
+def weights_from_cloud_fraction(cloud_fraction, min_weight=0.0):
+    """
+    Converts the Fmask cloud/shadow fraction of each observation into smoothing weights.
+
+    Args:
+        cloud_fraction (array-like): Fraction (0-1) of masked pixels, per field or per field and day.
+        min_weight (float): Lower bound of the weight of a valid observation.
+
+    Returns:
+        np.ndarray: Weights in [min_weight, 1]; NaN fractions get weight 0.
+    """
+    cloud_fraction = np.asarray(cloud_fraction, dtype=float)
+    weights = np.clip(1.0 - cloud_fraction, min_weight, 1.0)
+    return np.where(np.isnan(cloud_fraction), 0.0, weights)
+
+
+class Smoother:
+    """
+    Base class of the smoothing stage: filters a (fields x days) matrix along the time axis.
+    """
+
+    name = None
+
+    def smooth(self, values, weights=None, days=None):
+        """
+        Smooths every row of ``values``.
+
+        Args:
+            values (array-like): NDVI series, shape (fields, days) or (days,); NaN marks gaps.
+            weights (array-like, optional): Observation weights, broadcastable to ``values``.
+            days (array-like, optional): Integer day number of every column, shared (samples,) or per
+                field (fields, samples), for series sampled on their observation dates (see
+                ``phenology_batch.day_numbers``). By default every column is one day.
+
+        Returns:
+            np.ndarray: Smoothed matrix (fields x days) with the dtype of ``values``.
+        """
+        raise NotImplementedError
+
+    def smooth_dataframe(self, ndvi_df, column='ndvi', output='savitzky_golay'):
+        """
+        Smooths one field's DataFrame and stores the result in the ``output`` column.
+
+        DataFrames holding observation dates only (``resample_scenes(..., daily=False)``)
+        are smoothed on those dates.
+
+        Returns:
+            pd.DataFrame: The same DataFrame, with the smoothed column added.
+        """
+        with instrumentation.span(f'smoothing.{self.name}', rows_in=len(ndvi_df)) as span:
+            dates = ndvi_df['date'].to_numpy(dtype='datetime64[ns]') if 'date' in ndvi_df else None
+            days = None if dates is None or is_daily(dates) else day_numbers(dates)
+            ndvi_df[output] = self.smooth(ndvi_df[column].to_numpy(dtype=float), days=days)[0]
+            span.add(rows_out=len(ndvi_df))
+        return ndvi_df
+
+
+class SavitzkyGolaySmoother(Smoother):
+    """
+    Savitzky-Golay filter applied along the time axis, after interpolating NaN gaps.
+
+    Weights are not supported by the filter itself; zero-weight observations are
+    treated as gaps. Series given on their observation dates are filtered there
+    directly (``savgol_irregular``), with the same result on those dates as the
+    filter of the daily interpolated series.
+    """
+
+    name = 'savitzky_golay'
+
+    def __init__(self, window_size=30, poly_order=3):
+        self.window_size = window_size
+        self.poly_order = poly_order
+
+    def smooth(self, values, weights=None, days=None):
+        values = np.atleast_2d(np.asarray(values))
+        dtype = values.dtype if values.dtype.kind == 'f' else np.float64
+        if weights is not None:
+            values = np.where(np.broadcast_to(weights, values.shape) > 0, values, np.nan)
+
+        if days is not None:
+            return savgol_irregular(values, days, self.window_size, self.poly_order).astype(dtype, copy=False)
+        return self.filter(fill_gaps(values)).astype(dtype, copy=False)
+
+    def filter(self, filled):
+        """
+        Applies the filter to gap-filled series (as returned by ``fill_gaps``).
+
+        Rows without any valid value stay NaN. Useful to filter the same gap-filled
+        matrix with several window sizes without interpolating it again.
+
+        Returns:
+            np.ndarray: Smoothed float64 matrix (fields x days).
+        """
+        empty = np.isnan(filled).all(axis=1)
+        if empty.any():
+            filled = np.where(empty[:, None], 0.0, filled)
+        smoothed = savgol_filter(filled, self.window_size, self.poly_order)
+        smoothed[empty] = np.nan
+        return smoothed
+
+
+class WhittakerSmoother(Smoother):
+    """
+    Weighted Whittaker smoother: minimizes sum(w * (y - z)**2) + lmbda * sum(diff(z, d)**2).
+
+    Each field is a symmetric banded system (W + lmbda * D'D) z = W y with half
+    bandwidth d. All fields of a chunk are factorized together with a banded
+    Cholesky decomposition that walks the time axis once, vectorized across
+    fields. NaN observations get weight 0, so gaps are filled by the smoother.
+    Series given on their observation dates are placed on the daily grid of their
+    span, with weight 0 on the other days, and read back on their dates.
+    """
+
+    name = 'whittaker'
+
+    def __init__(self, lmbda=100.0, d=2, chunk_size=4096):
+        self.lmbda = lmbda
+        self.d = d
+        self.chunk_size = chunk_size
+
+    def penalty_bands(self, n_days):
+        """
+        Returns the lower bands of the penalty matrix lmbda * D'D of one series.
+
+        Returns:
+            list: ``bands[k][j]`` holds the entry (j + k, j), for k = 0..d.
+        """
+        # Row r of the difference matrix D holds (-1) ** (d - m) * comb(d, m) at column r + m
+        d = self.d
+        coefficients = [(-1) ** (d - m) * comb(d, m) for m in range(d + 1)]
+        bands = []
+        for k in range(d + 1):
+            columns = np.arange(max(n_days - k, 0))
+            band = np.zeros(len(columns))
+            for m in range(d + 1 - k):
+                rows = columns - m
+                band += coefficients[m + k] * coefficients[m] * ((rows >= 0) & (rows < n_days - d))
+            bands.append(self.lmbda * band)
+        return bands
+
+    def solve(self, weights, rhs, bands):
+        """
+        Solves the banded systems of a chunk of fields.
+
+        Args:
+            weights (np.ndarray): Observation weights, shape (days, fields).
+            rhs (np.ndarray): Right-hand sides W y, shape (days, fields).
+            bands (list): Penalty bands from ``penalty_bands``.
+
+        Returns:
+            np.ndarray: Solutions, shape (days, fields).
+        """
+        n_days = weights.shape[0]
+        d = self.d
+
+        # Day i of the factor and of both substitutions depends on the d days before (or after)
+        # it, so the time axis is walked in Python; every step covers all fields of the chunk.
+        # Banded Cholesky factor: factor[k, i] holds L[i, i - k]
+        factor = np.zeros((d + 1,) + weights.shape)
+        for i in range(n_days):
+            for k in range(min(d, i), 0, -1):
+                total = bands[k][i - k] - sum(factor[q, i] * factor[q - k, i - k] for q in range(k + 1, min(d, i) + 1))
+                factor[k, i] = total / factor[0, i - k]
+            total = weights[i] + bands[0][i] - sum(factor[q, i] ** 2 for q in range(1, min(d, i) + 1))
+            factor[0, i] = np.sqrt(total)
+
+        # Forward (L x = b) and backward (L' z = x) substitution, in place
+        solution = np.array(rhs)
+        for i in range(n_days):
+            solution[i] -= sum(factor[q, i] * solution[i - q] for q in range(1, min(d, i) + 1))
+            solution[i] /= factor[0, i]
+        for i in range(n_days - 1, -1, -1):
+            solution[i] -= sum(factor[q, i + q] * solution[i + q] for q in range(1, min(d, n_days - 1 - i) + 1))
+            solution[i] /= factor[0, i]
+        return solution
+
+    def smooth(self, values, weights=None, days=None):
+        values = np.atleast_2d(np.asarray(values))
+        dtype = values.dtype if values.dtype.kind == 'f' else np.float64
+        if days is not None:
+            return self.smooth_days(values, weights, days).astype(dtype, copy=False)
+        values = values.astype(np.float64)
+        n_fields, n_days = values.shape
+
+        weights = np.ones(values.shape) if weights is None else np.broadcast_to(
+            np.asarray(weights, dtype=float), values.shape)
+        weights = np.where(np.isnan(values), 0.0, weights)
+        observed = np.where(weights > 0, values, 0.0)
+
+        # Fewer than d observations leave the system singular; those rows are returned as NaN
+        degenerate = (weights > 0).sum(axis=1) < self.d
+        weights[degenerate] = 1.0
+
+        bands = self.penalty_bands(n_days)
+        smoothed = np.empty(values.shape)
+        for start in range(0, n_fields, self.chunk_size):
+            chunk = slice(start, min(start + self.chunk_size, n_fields))
+            chunk_weights = np.ascontiguousarray(weights[chunk].T)
+            smoothed[chunk] = self.solve(chunk_weights, chunk_weights * observed[chunk].T, bands).T
+
+        smoothed[degenerate] = np.nan
+        return smoothed.astype(dtype, copy=False)
+
+    def smooth_days(self, values, weights, days):
+        """
+        Smooths series sampled on their observation dates through the daily grid they span.
+
+        Returns:
+            np.ndarray: Smoothed float64 matrix (fields x samples), NaN where the day is NaN.
+        """
+        days = np.broadcast_to(np.asarray(days, dtype=float), values.shape)
+        dated = ~np.isnan(days)
+        if not dated.any():
+            return np.full(values.shape, np.nan)
+        columns = np.where(dated, days - np.nanmin(days), 0).astype(np.int64)
+        rows = np.broadcast_to(np.arange(values.shape[0])[:, None], values.shape)
+
+        grid = np.full((values.shape[0], columns.max() + 1), np.nan)
+        grid[rows[dated], columns[dated]] = values[dated]
+        grid_weights = None
+        if weights is not None:
+            grid_weights = np.zeros(grid.shape)
+            grid_weights[rows[dated], columns[dated]] = np.broadcast_to(weights, values.shape)[dated]
+        smoothed = self.smooth(grid, grid_weights)
+        return np.where(dated, smoothed[rows, columns], np.nan)
+
+
+SMOOTHERS = {smoother.name: smoother for smoother in (SavitzkyGolaySmoother, WhittakerSmoother)}
+
+
+def get_smoother(name, **params):
+    """
+    Creates a smoother by name ('savitzky_golay' or 'whittaker').
+
+    Args:
+        name (str): Smoother name.
+        **params: Parameters of the smoother class.
+
+    Returns:
+        Smoother: The configured smoother.
+    """
+    if name not in SMOOTHERS:
+        raise ValueError(f"Unknown smoother '{name}', expected one of {sorted(SMOOTHERS)}")
+    return SMOOTHERS[name](**params)
@@ -0,0 +1,166 @@
+"""
+Vectorized parameter sweeps for calibrating the phenology pipeline.
+
+``ParameterSweep`` evaluates every combination of smoothing window/poly order,
+extrema order and NDVI threshold on many fields at once. Every intermediate is
+computed once per distinct upstream parameter and reused downstream:
+
+    gap-filled series              once per field chunk
+    smoothed series, derivative    once per (window_size, poly_order)
+    extrema, VOS/POS, BOS/EOS der  once per (window_size, poly_order, order_ndvi)
+    BOS/EOS abs                    all thresholds in one broadcast pass per interval
+
+    sweep = ParameterSweep(dates, ndvi, smoothing=[(21, 2), (31, 3)], orders=[5, 10, 20],
+                           thresholds=np.arange(0.3, 0.61, 0.05))
+    results = sweep.run(field_ids)
+    scores = score_sweep(results, labels_df)
+"""
+import numpy as np
+import pandas as pd
+
+from . import instrumentation
+from .metrics_geometrics import BatchPhenologyMetrics
+from .phenology_batch import EVENTS, BatchPhenology, PhenologyEvents, as_float_matrix
+from .smoothing import SavitzkyGolaySmoother, fill_gaps
+
+PARAMETERS = ('window_size', 'poly_order', 'order_ndvi', 'threshold')
+
+
+class ParameterSweep:
+    """
+    Runs the batch phenology workflow for every combination of a parameter grid.
+
+    Attributes:
+        dates (np.ndarray): Shared date axis (datetime64).
+        ndvi (np.ndarray): Daily NDVI matrix (fields x days); NaN gaps are filled linearly before
+            smoothing and the absolute BOS/EOS search, as the daily resampling of ``HLS`` does.
+        smoothing (list): (window_size, poly_order) pairs of the Savitzky-Golay filter.
+        orders (list): ``order_ndvi`` values for the extrema search.
+        thresholds (np.ndarray): NDVI thresholds for the absolute BOS/EOS.
+        metrics (bool): Whether to add the geometric metrics to every row.
+        chunk_size (int): Number of fields processed together.
+        max_cells (int): Upper bound of (thresholds x fields x days) cells evaluated in one pass.
+    """
+
+    def __init__(self, dates, ndvi, smoothing=((30, 3),), orders=(30,), thresholds=(0.3,), metrics=True,
+                 chunk_size=4096, max_cells=2 ** 24):
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.ndvi = as_float_matrix(ndvi)
+        self.smoothing = [(int(window), int(poly)) for window, poly in smoothing]
+        self.orders = [int(order) for order in orders]
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        self.metrics = metrics
+        self.chunk_size = chunk_size
+        self.max_cells = max_cells
+
+        if self.ndvi.shape[1] != len(self.dates):
+            raise ValueError("The date axis must have one entry per column")
+
+    def __len__(self):
+        """Number of parameter combinations."""
+        return len(self.smoothing) * len(self.orders) * len(self.thresholds)
+
+    def threshold_blocks(self, n_fields):
+        """Splits the thresholds so one broadcast pass stays under ``max_cells`` cells."""
+        size = max(1, self.max_cells // max(1, n_fields * len(self.dates)))
+        return [self.thresholds[start:start + size] for start in range(0, len(self.thresholds), size)]
+
+    def run_chunk(self, ndvi, field_ids):
+        """
+        Evaluates every combination on one block of fields.
+
+        Returns:
+            list[pd.DataFrame]: One table per combination, one row per field.
+        """
+        frames = []
+        filled = fill_gaps(ndvi)
+        for window_size, poly_order in self.smoothing:
+            smoothed = SavitzkyGolaySmoother(window_size, poly_order).filter(filled)
+            engine = BatchPhenology(self.dates, filled, smoothed)
+            derivative = engine.derivative()
+
+            for order_ndvi in self.orders:
+                engine.order_ndvi = order_ndvi
+                events = engine.find_vos_pos()
+                events.update(engine.find_bos_eos_der(events, derivative))
+
+                for block in self.threshold_blocks(len(ndvi)):
+                    absolute = engine.find_bos_eos_abs(events, block)
+                    for layer, threshold in enumerate(block):
+                        combination = {**events, **{name: index[layer] for name, index in absolute.items()}}
+                        table = engine.to_dataframe(combination)
+                        if self.metrics:
+                            records = PhenologyEvents.from_indexes(self.dates, smoothed, combination)
+                            table = pd.concat([table, BatchPhenologyMetrics(records, self.dates, smoothed).compute()],
+                                              axis=1)
+                        table.insert(0, 'field_id', field_ids)
+                        for position, (name, value) in enumerate(
+                                zip(PARAMETERS, (window_size, poly_order, order_ndvi, threshold)), start=1):
+                            table.insert(position, name, value)
+                        frames.append(table)
+        return frames
+
+    def run(self, field_ids=None):
+        """
+        Evaluates every combination on every field.
+
+        Args:
+            field_ids (array-like, optional): ID of every row of ``ndvi`` (defaults to the row number).
+
+        Returns:
+            pd.DataFrame: Tidy table with one row per field and combination: 'field_id', the
+            parameters in ``PARAMETERS``, '<event>_date' / '<event>_value' for every event and,
+            if ``metrics`` is set, one column per geometric metric.
+        """
+        n_fields = self.ndvi.shape[0]
+        field_ids = np.arange(n_fields) if field_ids is None else np.asarray(field_ids)
+        with instrumentation.span('sweep', rows_in=self.ndvi.size) as span:
+            frames = []
+            for start in range(0, n_fields, self.chunk_size):
+                chunk = slice(start, start + self.chunk_size)
+                frames.extend(self.run_chunk(self.ndvi[chunk], field_ids[chunk]))
+            results = pd.concat(frames, ignore_index=True)
+            results = results.sort_values([*PARAMETERS, 'field_id'], kind='stable', ignore_index=True)
+            span.add(rows_out=len(results))
+        return results
+
+
+def score_sweep(results, labels, events=('bos_abs', 'eos_abs'), field_column='field_id'):
+    """
+    Scores every parameter combination against labeled event dates.
+
+    Args:
+        results (pd.DataFrame): Output of ``ParameterSweep.run``.
+        labels (pd.DataFrame): One row per labeled field with the field ID and '<event>_date' columns.
+        events (iterable): Events to score (any of ``EVENTS``).
+        field_column (str): Column holding the field ID in ``labels``.
+
+    Returns:
+        pd.DataFrame: One row per combination with, for every event, the mean and median absolute
+        error in days ('<event>_mae', '<event>_median_ae') and the number of fields where it was
+        found ('<event>_found'), sorted by the mean of the mean absolute errors.
+    """
+    unknown = set(events) - set(EVENTS)
+    if unknown:
+        raise ValueError(f"Unknown events: {sorted(unknown)}")
+
+    columns = [f'{name}_date' for name in events]
+    truth = labels[[field_column, *columns]].rename(columns={field_column: 'field_id'})
+    merged = results[['field_id', *PARAMETERS, *columns]].merge(truth, on='field_id', suffixes=('', '_label'))
+
+    errors = {}
+    for name in events:
+        delta = pd.to_datetime(merged[f'{name}_date']) - pd.to_datetime(merged[f'{name}_date_label'])
+        errors[f'{name}_error'] = delta.dt.days.abs()
+    merged = pd.concat([merged[list(PARAMETERS)], pd.DataFrame(errors)], axis=1)
+
+    grouped = merged.groupby(list(PARAMETERS))
+    scores = {}
+    for name in events:
+        error = grouped[f'{name}_error']
+        scores[f'{name}_mae'] = error.mean()
+        scores[f'{name}_median_ae'] = error.median()
+        scores[f'{name}_found'] = error.count()
+    scores = pd.DataFrame(scores).reset_index()
+    overall = scores[[f'{name}_mae' for name in events]].mean(axis=1)
+    return scores.iloc[np.argsort(overall.to_numpy(), kind='stable')].reset_index(drop=True)
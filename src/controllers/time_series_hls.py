@@ -1,9 +1,26 @@
+import json
+
 import ee
 import pandas as pd
 
+from . import instrumentation
+from .hls_scenes import CLOUD_SHADOW_BIT, CLOUDS_BIT, daily_fields, resample_scenes
+
+REDUCERS = {
+    'median': lambda: ee.Reducer.median(),
+    'mean': lambda: ee.Reducer.mean(),
+    'count': lambda: ee.Reducer.count(),
+}
+
 class HLS:
 
-    def __init__(self, geometry, start_date, end_date):
+    COLLECTION_ID = "NASA/HLS/HLSL30/v002"
+    BAND = 'NDVI'
+    CLOUDS_BIT = CLOUDS_BIT
+    CLOUD_SHADOW_BIT = CLOUD_SHADOW_BIT
+
+    def __init__(self, geometry, start_date, end_date, cache=None, bands=('NDVI',), reducers=('median',),
+                 scale=30, min_valid_fraction=None):
         """
         Initializes Landsat class with specified geometry, start date, and end date.
         
@@ -11,10 +28,60 @@ class HLS:
             geometry (ee.Geometry): Geometry for the image collection.
             start_date (str): Start date in "YYYY-MM-DD" format.
             end_date (str): End date in "YYYY-MM-DD" format.
+            cache (HLSCache, optional): Local cache of per-scene NDVI values.
+            bands (tuple): Bands whose statistics are returned; 'NDVI' must be included.
+            reducers (tuple): Statistics to compute: 'median', 'mean', 'count' and/or 'valid_fraction'
+                (fraction of unmasked NDVI pixels). The first statistic fills the 'ndvi' column.
+            scale (float): Reduction scale in meters (HLS is natively 30 m).
+            min_valid_fraction (float, optional): Scenes with a lower valid-pixel fraction are dropped server-side.
         """
         self.geometry = geometry
         self.start_date = start_date
         self.end_date = end_date
+        self.cache = cache
+        self.bands = tuple(bands)
+        self.reducers = tuple(reducers)
+        self.scale = scale
+        self.min_valid_fraction = min_valid_fraction
+
+        self.statistics = [reducer for reducer in self.reducers if reducer != 'valid_fraction']
+        if self.BAND not in self.bands:
+            raise ValueError(f"bands must include '{self.BAND}'")
+        if not self.statistics:
+            raise ValueError("reducers must include at least one of " + ", ".join(REDUCERS))
+        unknown = set(self.statistics) - set(REDUCERS)
+        if unknown:
+            raise ValueError(f"Unknown reducers: {sorted(unknown)}")
+        self.valid_fraction = 'valid_fraction' in self.reducers or min_valid_fraction is not None
+
+    def build_reducer(self):
+        """
+        Combines the requested statistics into a single reducer with shared inputs.
+
+        Returns:
+            ee.Reducer: The combined reducer.
+        """
+        reducer = REDUCERS[self.statistics[0]]()
+        for name in self.statistics[1:]:
+            reducer = reducer.combine(reducer2=REDUCERS[name](), sharedInputs=True)
+        return reducer
+
+    def statistic_columns(self):
+        """
+        Maps the property names returned by Earth Engine to DataFrame columns.
+
+        Returns:
+            list: (property, column) pairs; the first statistic of 'NDVI' maps to 'ndvi'.
+        """
+        columns = []
+        for band in (self.BAND,) + tuple(band for band in self.bands if band != self.BAND):
+            for name in self.statistics:
+                key = band if len(self.statistics) == 1 else f'{band}_{name}'
+                columns.append((key, key.lower()))
+        columns[0] = (columns[0][0], 'ndvi')
+        if self.valid_fraction:
+            columns.append(('valid_fraction', 'valid_fraction'))
+        return columns
 
     def add_ndvi_band(self, image):
         """
@@ -41,9 +108,13 @@ class HLS:
         Returns:
             ee.Feature: Feature containing region statistics as properties.
         """
-        statistics = image.reduceRegion(reducer=ee.Reducer.median(),
-                                        geometry=self.geometry,
-                                        scale=10)
+        statistics = image.select(list(self.bands)).reduceRegion(reducer=self.build_reducer(),
+                                                                 geometry=self.geometry,
+                                                                 scale=self.scale)
+        if self.valid_fraction:
+            valid = image.select(self.BAND).mask().rename('valid_fraction')\
+                         .reduceRegion(reducer=ee.Reducer.mean(), geometry=self.geometry, scale=self.scale)
+            statistics = statistics.combine(valid)
         feature = ee.Feature(None, statistics)
         return feature
 
@@ -57,8 +128,8 @@ class HLS:
         Returns:
             ee.Image: Masked Landsat image.
         """
-        clouds_bit_mask = 1 << 1
-        cloud_shadow_bit_mask = 1 << 3
+        clouds_bit_mask = 1 << self.CLOUDS_BIT
+        cloud_shadow_bit_mask = 1 << self.CLOUD_SHADOW_BIT
         qa = image.select('Fmask')
         mask = qa.bitwiseAnd(cloud_shadow_bit_mask).eq(0) \
                .And(qa.bitwiseAnd(clouds_bit_mask).eq(0))
@@ -86,48 +157,213 @@ class HLS:
         Returns:
             ee.ImageCollection: Collection of processed images.
         """
-        collection = ee.ImageCollection("NASA/HLS/HLSL30/v002")\
+        collection = ee.ImageCollection(self.COLLECTION_ID)\
                         .filterBounds(self.geometry)\
                         .filter(ee.Filter.date(self.start_date, self.end_date))\
                         .map(self.extract_fmask_bitwise)\
                         .map(self.add_ndvi_band)\
                         .map(self.calculate_statistics_for_region)
+        if self.min_valid_fraction is not None:
+            collection = collection.filter(ee.Filter.gte('valid_fraction', self.min_valid_fraction))
         return collection
 
-    def convert_to_dataframe(self):
+    def cache_key_parts(self):
+        """
+        Describes everything that determines the per-scene values, except the date range.
+
+        Returns:
+            dict: Serialized geometry, collection ID, band and mask settings.
+        """
+        return {
+            'geometry': self.geometry.serialize(),
+            'collection': self.COLLECTION_ID,
+            'band': self.BAND,
+            'mask_bits': [self.CLOUDS_BIT, self.CLOUD_SHADOW_BIT],
+            'bands': list(self.bands),
+            'reducers': list(self.reducers),
+            'scale': self.scale,
+            'min_valid_fraction': self.min_valid_fraction,
+        }
+
+    def fetch_scenes(self):
             """
-            Converts the image collection to a pandas DataFrame with NDVI values, dates, and IDs.
+            Fetches the per-scene NDVI values of the image collection from Earth Engine.
 
             Returns:
-                pandas.DataFrame: A DataFrame with columns for date, ID, NDVI values, and satellite name.
+                pandas.DataFrame: One row per scene with 'date' (YYYYMMDD), 'id' and 'ndvi' columns,
+                plus one column per extra statistic.
             """
-            collection_info = self.create_image_collection().getInfo()['features']
+            with instrumentation.span('hls.fetch') as span:
+                collection_info = self.create_image_collection().getInfo()['features']
+                if span.enabled:
+                    span.add(ee_bytes=len(json.dumps(collection_info)), rows_out=len(collection_info))
+            columns = self.statistic_columns()
             
             # Extracting data from each image in the collection
             data = [{
                 'date': image['id'].split('_')[1][:8],
                 'id': image['id'],
-                'ndvi': image['properties']['NDVI']
+                **{column: image['properties'].get(key) for key, column in columns}
             } for image in collection_info]
 
-            # Creating DataFrame and processing
-            df = pd.DataFrame(data)
-            df['satellite'] = 'landsat'
-            df.dropna(inplace=True)
+            return pd.DataFrame(data, columns=['date', 'id'] + [column for key, column in columns])
+
+    def convert_to_dataframe(self, daily=True):
+            """
+            Converts the image collection to a pandas DataFrame with NDVI values, dates, and IDs.
+
+            Args:
+                daily (bool): If False, keeps one row per observation date instead of resampling to daily rows.
+
+            Returns:
+                pandas.DataFrame: A DataFrame with columns for date, ID, NDVI values, and satellite name.
+            """
+            if self.cache is not None:
+                return self.process_dataframe(self.cache.fetch_scenes(self), daily)
+            return self.process_dataframe(self.fetch_scenes(), daily)
+
+    def process_dataframe(self, df, daily=True):
+            """
+            Cleans the per-scene NDVI values of one field and resamples them to daily frequency.
+
+            Args:
+                df (pandas.DataFrame): Per-scene rows with 'date' (YYYYMMDD), 'id' and 'ndvi' columns.
+                daily (bool): If False, keeps one row per observation date.
 
-            # Handling date and sorting
-            df['date'] = pd.to_datetime(df['date'])
-            df.sort_values('date', inplace=True)
-            df = df.drop_duplicates(subset='date').reset_index(drop=True)
+            Returns:
+                pandas.DataFrame: A DataFrame with columns for date, ID, NDVI values, and satellite name.
+            """
+            return resample_scenes(df, daily)
 
-            # Resampling dates to daily frequency
-            df.set_index('date', inplace=True)
-            df = df.resample('D').interpolate(method='linear')
 
-            #Set datestamp and reset index
-            df.reset_index(inplace=True)
+class HLSMultiField(HLS):
 
-            # Convertendo a coluna 'date' para o formato datetime
-            df['timestamps'] = pd.to_datetime(df['date'])
+    def __init__(self, features, start_date, end_date, id_property='field_id', page_size=5000,
+                 bands=('NDVI',), reducers=('median',), scale=30, min_valid_fraction=None):
+        """
+        Initializes the multi-field extractor with all fields in one FeatureCollection.
 
-            return df
+        Args:
+            features (ee.FeatureCollection): Field polygons, each with an ``id_property`` property.
+            start_date (str): Start date in "YYYY-MM-DD" format.
+            end_date (str): End date in "YYYY-MM-DD" format.
+            id_property (str): Name of the property identifying each field.
+            page_size (int): Number of result features fetched per ``getInfo`` call.
+            bands (tuple): Bands whose statistics are returned, as in ``HLS``; 'NDVI' must be included.
+            reducers (tuple): Statistics to compute, as in ``HLS``.
+            scale (float): Reduction scale in meters.
+            min_valid_fraction (float, optional): Field/scene pairs with a lower valid-pixel fraction are dropped.
+        """
+        super().__init__(features.geometry(), start_date, end_date, bands=bands, reducers=reducers, scale=scale,
+                         min_valid_fraction=min_valid_fraction)
+        self.features = features
+        self.id_property = id_property
+        self.page_size = page_size
+
+    def calculate_statistics_for_region(self, image):
+        """
+        Calculates the band statistics of every field for a given image in one server-side call.
+
+        Args:
+            image (ee.Image): The input image with an NDVI band.
+
+        Returns:
+            ee.FeatureCollection: One geometry-less feature per field with its statistics.
+        """
+        image_id = image.get('system:index')
+        date = ee.Date(image.get('system:time_start')).format('YYYYMMdd')
+        keys = [key for key, column in self.statistic_columns()]
+        statistic_keys = [key for key in keys if key != 'valid_fraction']
+
+        # reduceRegions names the outputs of one band after the reducer, and those of several bands
+        # after the bands ('<band>_<statistic>' with several statistics), as ``statistic_columns`` expects
+        reducer = self.build_reducer()
+        if len(self.bands) == 1:
+            reducer = reducer.setOutputs(statistic_keys)
+        statistics = image.select(list(self.bands)).reduceRegions(collection=self.features, reducer=reducer,
+                                                                  scale=self.scale)
+        if self.valid_fraction:
+            statistics = image.select(self.BAND).mask().reduceRegions(
+                collection=statistics,
+                reducer=ee.Reducer.mean().setOutputs(['valid_fraction']),
+                scale=self.scale)
+        return statistics.map(
+            lambda feature: ee.Feature(None, {
+                self.id_property: feature.get(self.id_property),
+                **{key: feature.get(key) for key in keys},
+                'image_id': image_id,
+                'date': date,
+            })
+        )
+
+    def create_image_collection(self):
+        """
+        Creates the per-field statistics for the specified time period and fields.
+
+        Returns:
+            ee.FeatureCollection: Flattened collection with one feature per field and scene.
+        """
+        collection = ee.ImageCollection(self.COLLECTION_ID)\
+                        .filterBounds(self.geometry)\
+                        .filter(ee.Filter.date(self.start_date, self.end_date))\
+                        .map(self.extract_fmask_bitwise)\
+                        .map(self.add_ndvi_band)\
+                        .map(self.calculate_statistics_for_region)\
+                        .flatten()\
+                        .filter(ee.Filter.notNull([self.statistic_columns()[0][0]]))
+        if self.min_valid_fraction is not None:
+            collection = collection.filter(ee.Filter.gte('valid_fraction', self.min_valid_fraction))
+        return collection
+
+    def fetch_features(self):
+        """
+        Pages the per-field statistics back from the server.
+
+        Returns:
+            list: Feature dictionaries as returned by ``getInfo``.
+        """
+        statistics = self.create_image_collection()
+        size = statistics.size().getInfo()
+
+        features = []
+        for offset in range(0, size, self.page_size):
+            with instrumentation.span('hls_multi.fetch_page') as span:
+                page = statistics.toList(self.page_size, offset).getInfo()
+                if span.enabled:
+                    span.add(ee_bytes=len(json.dumps(page)), rows_out=len(page))
+            features.extend(page)
+        return features
+
+    def features_to_dataframe(self, features):
+        """
+        Converts fetched feature dictionaries into per-scene rows.
+
+        Args:
+            features (list): Feature dictionaries as returned by ``fetch_features``.
+
+        Returns:
+            pandas.DataFrame: Rows with the field id, 'date', 'id' and 'ndvi' columns, plus one column
+            per extra statistic.
+        """
+        columns = self.statistic_columns()
+        data = [{
+            self.id_property: feature['properties'][self.id_property],
+            'date': feature['properties']['date'],
+            'id': feature['properties']['image_id'],
+            **{column: feature['properties'].get(key) for key, column in columns}
+        } for feature in features]
+        return pd.DataFrame(data, columns=[self.id_property, 'date', 'id'] + [column for key, column in columns])
+
+    def convert_to_dataframe(self, wide=False, daily=True):
+        """
+        Converts the per-field statistics to daily NDVI series for every field.
+
+        Args:
+            wide (bool): If True, returns one NDVI column per field indexed by date.
+            daily (bool): If False, keeps the observation dates of every field (see ``daily_fields``).
+
+        Returns:
+            pandas.DataFrame: Long table with the field id plus the columns of ``HLS.convert_to_dataframe``,
+            or a wide date x field NDVI table.
+        """
+        return daily_fields(self.features_to_dataframe(self.fetch_features()), self.id_property, wide, daily)
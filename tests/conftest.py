@@ -0,0 +1,16 @@
+import pytest
+
+from benchmarks import fake_ee
+
+# Synthetic scenes served by the fake Earth Engine, by serialized geometry; installed before
+# the test modules import the Earth Engine controllers
+SCENES = {}
+fake_ee.install(lambda geometry: SCENES[geometry.serialize()])
+
+
+@pytest.fixture
+def scenes():
+    """Per-scene tables served by the fake ``ee`` module, by serialized geometry (emptied for every test)."""
+    SCENES.clear()
+    yield SCENES
+    SCENES.clear()
@@ -0,0 +1,66 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.controllers import batch_runner
+from src.controllers.batch_runner import BatchRunner
+
+
+class Polygons:
+    """Stand-in for ``ProcessadorGeoDataFrame`` yielding ``n`` square polygons."""
+
+    def __init__(self, n):
+        self.n = n
+
+    def iterar_poligonos(self, tamanho_lote=1000):
+        for index in range(self.n):
+            yield index, [[index, 0], [index + 1, 0], [index + 1, 1], [index, 0]]
+
+
+class Stage:
+    """Counts the calls of a pipeline stage running at once."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, field_id, *args, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.seconds)
+        finally:
+            with self.lock:
+                self.active -= 1
+        return field_id
+
+
+@pytest.mark.parametrize('fetch_seconds, compute_seconds', [(0.0, 0.02), (0.02, 0.0)])
+def test_fields_in_flight_are_bounded_in_each_stage(tmp_path, monkeypatch, fetch_seconds, compute_seconds):
+    fetch = Stage(fetch_seconds)
+    compute = Stage(compute_seconds)
+
+    def compute_field(field_id, ndvi_df, **kwargs):
+        compute(field_id)
+        return {'pos_date': datetime.date(2023, 1, 15), 'pos_value': 0.8}
+
+    # Threads stand in for the compute processes, so the stage can be observed
+    monkeypatch.setattr(batch_runner, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(batch_runner, 'compute_field', compute_field)
+    runner = BatchRunner(Polygons(40), str(tmp_path), lambda field_id, vertices: [fetch(field_id)], {},
+                         fetch_workers=8, compute_workers=8, max_pending=3, chunk_size=16, season_start_month=7)
+
+    assert runner.run() == 40
+    assert compute.max_active <= 3
+    assert fetch.max_active <= 3
+    with open(tmp_path / 'completed.txt') as file:
+        assert sorted(int(line) for line in file) == list(range(40))
+    assert runner.run() == 0
+    # A POS in January belongs to the season year that started the previous July
+    assert [path.name for path in (tmp_path / 'results').iterdir()] == ['season=2022']
@@ -0,0 +1,88 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+import pandas as pd
+import pytest
+
+from src.controllers.cache_hls import HLSCache
+from src.controllers.time_series_hls import HLS
+
+
+def scene_table(field_id, dates):
+    return pd.DataFrame({
+        'date': dates,
+        'id': [f'HLS_{date}T000000_{field_id}' for date in dates],
+        'ndvi': [0.1 * (index + 1) for index in range(len(dates))],
+    })
+
+
+@pytest.fixture
+def geometry(scenes):
+    geometry = ee.Geometry.Polygon([[[0, 0], [1, 0], [1, 1], [0, 0]]])
+    scenes[geometry.serialize()] = scene_table(0, ['20230105', '20230213', '20230321', '20230410'])
+    return geometry
+
+
+def test_only_missing_dates_are_fetched(tmp_path, geometry, monkeypatch):
+    fetched = []
+    fetch_scenes = HLS.fetch_scenes
+    monkeypatch.setattr(HLS, 'fetch_scenes',
+                        lambda self: fetched.append((self.start_date, self.end_date)) or fetch_scenes(self))
+    cache = HLSCache(str(tmp_path / 'cache.sqlite'))
+
+    first = cache.fetch_scenes(HLS(geometry, '2023-02-01', '2023-03-01'))
+    again = cache.fetch_scenes(HLS(geometry, '2023-02-01', '2023-03-01'))
+    longer = cache.fetch_scenes(HLS(geometry, '2023-01-01', '2023-04-01'))
+
+    assert fetched == [('2023-02-01', '2023-03-01'), ('2023-01-01', '2023-02-01'), ('2023-03-01', '2023-04-01')]
+    assert first['date'].tolist() == again['date'].tolist() == ['20230213']
+    assert longer['date'].tolist() == ['20230105', '20230213', '20230321']
+    assert {key: cache.stats()[key] for key in ('hits', 'partial_hits', 'misses')} == \
+        {'hits': 1, 'partial_hits': 1, 'misses': 1}
+
+
+def test_fetches_run_outside_the_write_transaction(tmp_path, geometry, monkeypatch):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = HLSCache(path)
+    cache.fetch_scenes(HLS(geometry, '2023-02-01', '2023-03-01'))
+
+    fetch_scenes = HLS.fetch_scenes
+
+    def fetch_while_writing(self):
+        # Another writer must get the lock at once while Earth Engine is queried
+        with sqlite3.connect(path, timeout=0) as other:
+            other.execute("BEGIN IMMEDIATE")
+            other.execute("UPDATE series SET last_access = last_access")
+        return fetch_scenes(self)
+
+    monkeypatch.setattr(HLS, 'fetch_scenes', fetch_while_writing)
+    df = cache.fetch_scenes(HLS(geometry, '2023-01-01', '2023-04-01'))
+    assert df['date'].tolist() == ['20230105', '20230213', '20230321']
+
+
+def test_database_uses_wal_and_a_busy_timeout(tmp_path):
+    cache = HLSCache(str(tmp_path / 'cache.sqlite'), busy_timeout=2.5)
+    with cache.connect() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 2500
+
+
+def test_threads_share_the_cache(tmp_path, scenes):
+    geometries = []
+    for field_id in range(16):
+        geometry = ee.Geometry.Polygon([[[field_id, 0], [field_id + 1, 0], [field_id + 1, 1], [field_id, 0]]])
+        scenes[geometry.serialize()] = scene_table(field_id, ['20230105', '20230213'])
+        geometries.append(geometry)
+    cache = HLSCache(str(tmp_path / 'cache.sqlite'))
+
+    def fetch(geometry):
+        return len(cache.fetch_scenes(HLS(geometry, '2023-01-01', '2023-03-01')))
+
+    with ThreadPoolExecutor(8) as executor:
+        counts = list(executor.map(fetch, geometries * 4))
+
+    assert counts == [2] * 64
+    stats = cache.stats()
+    assert stats['hits'] + stats['partial_hits'] + stats['misses'] == 64
+    assert stats['series'] == 16
@@ -0,0 +1,44 @@
+import logging
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_ndvi
+from src.controllers import cli, instrumentation
+from src.controllers.series_store import NDVISeriesStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    dates, curves, observed = synthetic_ndvi(20, seed=3)
+    path = str(tmp_path / 'series')
+    NDVISeriesStore.create(path, dates).append([f'field-{i}' for i in range(20)], curves)
+    yield path
+    instrumentation.disable()
+    instrumentation.INSTRUMENTATION.reset()
+
+
+def stage_lines(caplog):
+    return [record.getMessage() for record in caplog.records if 'calls=' in record.getMessage()]
+
+
+def test_phenology_writes_one_row_per_field(store, tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    output = str(tmp_path / 'results.csv')
+    assert cli.main(['phenology', store, output, '--window-size', '30', '--order-ndvi', '20', '--chunk-size', '8']) == 0
+
+    results = pd.read_csv(output)
+    assert results['field_id'].tolist() == [f'field-{i}' for i in range(20)]
+    # Without --timings nothing is recorded, so no stage totals are logged
+    assert not instrumentation.INSTRUMENTATION.enabled
+    assert stage_lines(caplog) == []
+
+
+def test_phenology_timings_log_the_stage_totals(store, tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    assert cli.main(['phenology', store, str(tmp_path / 'results.csv'), '--order-ndvi', '20', '--chunk-size', '8',
+                     '--timings']) == 0
+
+    # One span per chunk of the batch engines
+    stages = {line.split()[0]: line.split()[1] for line in stage_lines(caplog)}
+    assert stages == {'batch_phenology': 'calls=3', 'batch_phenology_metrics': 'calls=3'}
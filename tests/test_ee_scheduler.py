@@ -0,0 +1,63 @@
+from benchmarks.fake_ee import FlakyEndpoint
+from src.controllers.ee_scheduler import EERequestScheduler
+
+
+def no_backoff(attempt):
+    return 0.0
+
+
+def test_throttled_requests_are_retried():
+    endpoint = FlakyEndpoint(latency=0.001, failures=2)
+    scheduler = EERequestScheduler(max_concurrency=4, rate=1000, max_retries=5)
+    scheduler.backoff = no_backoff
+    results, errors = scheduler.run({key: endpoint.request(key) for key in range(10)})
+
+    assert errors == {}
+    assert results == {key: key for key in range(10)}
+    assert all(count == 3 for count in endpoint.attempts.values())
+    assert all(stat['attempts'] == 3 for stat in scheduler.stats)
+    assert scheduler.summary()['retries'] == 20
+
+
+def test_retries_are_bounded_and_other_errors_fail_at_once():
+    throttled = FlakyEndpoint(latency=0.001, failures=10)
+    broken = FlakyEndpoint(latency=0.001, failures=10, message='Invalid geometry')
+    scheduler = EERequestScheduler(max_concurrency=2, rate=1000, max_retries=2)
+    scheduler.backoff = no_backoff
+    results, errors = scheduler.run({'throttled': throttled.request('throttled'), 'broken': broken.request('broken')})
+
+    assert results == {}
+    assert set(errors) == {'throttled', 'broken'}
+    assert throttled.attempts['throttled'] == 3
+    assert broken.attempts['broken'] == 1
+    assert scheduler.summary()['failed'] == 2
+
+
+def test_rate_limit_bounds_request_starts():
+    endpoint = FlakyEndpoint(latency=0.0)
+    scheduler = EERequestScheduler(max_concurrency=8, rate=50, burst=1)
+    scheduler.run({key: endpoint.request(key) for key in range(26)})
+
+    starts = sorted(start for _, start in endpoint.calls)
+    achieved = (len(starts) - 1) / (starts[-1] - starts[0])
+    # Sleeps can overshoot on a busy machine, so only the upper bound is tight
+    assert 50 * 0.7 <= achieved <= 50 * 1.02
+
+
+def test_concurrency_limit_is_reached_and_never_exceeded():
+    endpoint = FlakyEndpoint(latency=0.05)
+    scheduler = EERequestScheduler(max_concurrency=4, rate=1000)
+    scheduler.run({key: endpoint.request(key) for key in range(16)})
+
+    assert endpoint.max_active == 4
+    assert max(stat['latency'] for stat in scheduler.stats) < 0.5
+
+
+def test_backoff_releases_the_concurrency_slot():
+    endpoint = FlakyEndpoint(latency=0.01, failures={'throttled': 1})
+    scheduler = EERequestScheduler(max_concurrency=1, rate=1000)
+    scheduler.backoff = lambda attempt: 0.2
+    scheduler.run({'throttled': endpoint.request('throttled'), 'other': endpoint.request('other')})
+
+    # The other request runs while the throttled one waits for its retry
+    assert [key for key, _ in endpoint.calls] == ['throttled', 'other', 'throttled']
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('geopandas')
+pytest.importorskip('fiona')
+
+from benchmarks.synthetic import synthetic_geopackage  # noqa: E402
+from src.controllers.geometry import ProcessadorGeoDataFrame  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def gpkg(tmp_path_factory):
+    return synthetic_geopackage(str(tmp_path_factory.mktemp('gpkg') / 'fields.gpkg'), 40, multipart_fraction=0.3)
+
+
+def test_lazy_and_eager_modes_share_ids_and_indexes(gpkg):
+    eager = ProcessadorGeoDataFrame(gpkg)
+    lazy = ProcessadorGeoDataFrame(gpkg, lazy=True)
+
+    eager_polygons = list(eager.iterar_poligonos(tamanho_lote=7))
+    lazy_polygons = list(lazy.iterar_poligonos(tamanho_lote=7))
+    assert lazy_polygons == eager_polygons
+    # Multipolygons are split, so there are more polygons than source rows
+    assert [indice for indice, _ in eager_polygons] == list(range(len(eager.gdf)))
+    assert lazy.contar_poligonos() == eager.contar_poligonos() == len(eager.gdf) > lazy.contar_feicoes() == 40
+
+    for indice, vertices in eager_polygons[::5] + eager_polygons[-1:]:
+        assert eager.extrair_coordenadas(indice)[0] == vertices
+        assert lazy.extrair_coordenadas(indice)[0] == vertices
+
+
+def test_lazy_index_past_the_end_is_an_error(gpkg):
+    lazy = ProcessadorGeoDataFrame(gpkg, lazy=True)
+    with pytest.raises(IndexError):
+        lazy.extrair_coordenadas(lazy.contar_poligonos())
+
+
+def test_frames_carry_the_source_row_part_and_polygon_index(gpkg):
+    eager = ProcessadorGeoDataFrame(gpkg)
+    lazy = ProcessadorGeoDataFrame(gpkg, lazy=True)
+
+    # The synthetic 'field' column is the 0-based source row
+    assert (eager.gdf['indice_origem'] == eager.gdf['field']).all()
+    assert eager.gdf['indice'].tolist() == list(range(len(eager.gdf)))
+    assert (eager.gdf['parte'] > 0).any()
+    columns = ['field', 'indice_origem', 'parte', 'indice']
+    for lote in (lazy.ler_intervalo(10, 20), next(lazy.iterar_lotes(12))):
+        expected = eager.gdf[eager.gdf['indice_origem'].isin(lote['indice_origem'])]
+        assert lote[columns].equals(expected[columns].reset_index(drop=True))
+    np.testing.assert_array_equal(lazy.indices_inicio(), eager.inicios)
+
+
+def test_ler_ids_reads_polygons_by_their_index(gpkg):
+    eager = ProcessadorGeoDataFrame(gpkg)
+    multipart = eager.gdf.loc[eager.gdf['parte'] > 0, 'indice'].tolist()
+    indices = [multipart[0], 0, len(eager.gdf) - 1, multipart[0] - 1, 17]
+
+    for processador in (eager, ProcessadorGeoDataFrame(gpkg, lazy=True)):
+        lido = processador.ler_ids(indices)
+        assert lido['indice'].tolist() == indices
+        expected = eager.gdf.iloc[indices].reset_index(drop=True)
+        assert lido[['field', 'indice_origem', 'parte']].equals(expected[['field', 'indice_origem', 'parte']])
+        assert all(a.equals_exact(b, 1e-9) for a, b in zip(lido.geometry, expected.geometry))
+        with pytest.raises(IndexError):
+            processador.ler_ids([len(eager.gdf)])
+
+
+def test_ler_bbox_keeps_the_indexes_of_the_features_it_reads(gpkg):
+    eager = ProcessadorGeoDataFrame(gpkg)
+    minx, miny, maxx, maxy = eager.gdf.total_bounds
+    bbox = (minx, miny, (minx + maxx) / 2, (miny + maxy) / 2)
+
+    lido = ProcessadorGeoDataFrame(gpkg, lazy=True).ler_bbox(bbox)
+    # Whole source features whose extent intersects the box, with every part
+    extents = eager.gdf.dissolve('indice_origem').bounds
+    rows = extents.index[(extents.minx <= bbox[2]) & (extents.maxx >= bbox[0])
+                         & (extents.miny <= bbox[3]) & (extents.maxy >= bbox[1])]
+    assert 0 < len(rows) < len(extents)
+    assert lido['indice_origem'].tolist() == rows.repeat(np.diff(eager.inicios)[rows]).tolist()
+    expected = eager.gdf[eager.gdf['indice_origem'].isin(rows)].reset_index(drop=True)
+    assert lido[['field', 'parte', 'indice']].equals(expected[['field', 'parte', 'indice']])
+
+    assert eager.ler_bbox((0.0, 0.0, 1.0, 1.0)).empty
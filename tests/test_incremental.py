@@ -0,0 +1,105 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import scene_table, synthetic_ndvi
+from src.controllers.incremental import IncrementalPhenology, PhenologyState, day_dates, parse_day_numbers
+from src.controllers.phenology_batch import day_numbers
+
+
+def test_scene_dates_parse_to_the_day_numbers_of_the_core():
+    days = parse_day_numbers(['20221001', '20230105', '20240229'])
+    dates = day_dates(days)
+
+    assert days.dtype == np.int64
+    np.testing.assert_array_equal(day_numbers(dates), days.astype(float))
+    assert dates.astype('datetime64[D]').astype(str).tolist() == ['2022-10-01', '2023-01-05', '2024-02-29']
+
+
+@pytest.fixture(scope='module')
+def scenes():
+    """Four consecutive synthetic seasons of one field, as per-scene rows."""
+    observed = np.concatenate([synthetic_ndvi(1, seed=seed)[2][0] for seed in range(4)])
+    return scene_table(pd.date_range('2020-10-01', periods=len(observed), freq='D'), observed)
+
+
+def engine():
+    return IncrementalPhenology(window_size=30, poly_order=3, order_ndvi=20, threshold=0.45)
+
+
+def batches(scenes, n_batches):
+    return [scenes.iloc[rows] for rows in np.array_split(np.arange(len(scenes)), n_batches)]
+
+
+def test_updates_in_batches_match_a_full_rerun(scenes):
+    full = PhenologyState('field')
+    engine().update(full, scenes)
+    assert all(event is not None for event in full.events.values())
+
+    for n_batches in (2, 7, 40):
+        state = PhenologyState('field')
+        incremental = engine()
+        for batch in batches(scenes, n_batches):
+            incremental.update(state, batch)
+        assert state.events == full.events
+
+
+def test_update_reports_the_changed_events(scenes):
+    state = PhenologyState('field')
+    incremental = engine()
+    # The first 25 scenes (about 140 days) do not hold a whole valley-peak-valley season yet
+    first, second = scenes.iloc[:25], scenes.iloc[25:]
+    incremental.update(state, first)
+    before = state.event_dates()
+    assert set(before.values()) == {None}
+
+    changes = incremental.update(state, second)
+    assert changes
+    for name, change in changes.items():
+        assert change == {'old': before[name], 'new': state.event_dates()[name]}
+    # Scenes already in the retained tail are skipped
+    assert incremental.update(state, second.iloc[-5:]) == {}
+
+
+def test_state_round_trips_through_json(scenes):
+    parts = batches(scenes, 5)
+    state = PhenologyState('field')
+    incremental = engine()
+    for batch in parts[:3]:
+        incremental.update(state, batch)
+
+    restored = PhenologyState.from_dict(json.loads(json.dumps(state.to_dict())))
+    assert restored.to_dict() == state.to_dict()
+    np.testing.assert_array_equal(restored.smoothed, state.smoothed)
+
+    for batch in parts[3:]:
+        incremental.update(state, batch)
+        incremental.update(restored, batch)
+    assert restored.events == state.events
+    assert restored.to_dict() == state.to_dict()
+
+
+def test_scene_before_the_frozen_tail_is_an_error(scenes):
+    state = PhenologyState('field')
+    engine().update(state, scenes)
+    assert state.frozen_until > parse_day_numbers(scenes['date'])[0]
+
+    late = scenes.iloc[[0]].assign(date='20201005', ndvi=0.3)
+    with pytest.raises(ValueError, match='rerun the full analysis'):
+        engine().update(state, late)
+
+
+def test_pruning_keeps_the_results(scenes):
+    pruned, unpruned = PhenologyState('field'), PhenologyState('field')
+    pruning, keeping = engine(), engine()
+    keeping.margin = 10 ** 6
+    for batch in batches(scenes, 12):
+        pruning.update(pruned, batch)
+        keeping.update(unpruned, batch)
+
+    # The pruned state only keeps the tail of the series
+    assert pruned.origin > unpruned.origin
+    assert len(pruned.ndvi) < len(unpruned.ndvi) / 2
+    assert pruned.events == unpruned.events
@@ -0,0 +1,147 @@
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import scene_table, synthetic_ndvi
+from src.controllers import instrumentation
+from src.controllers.batch_runner import compute_field_instrumented
+from src.controllers.hls_scenes import resample_scenes
+from src.controllers.instrumentation import COUNTERS, NULL_SPAN, Instrumentation
+
+
+@pytest.fixture
+def registry():
+    """The process-wide registry, enabled and emptied for one test."""
+    instrumentation.INSTRUMENTATION.reset()
+    instrumentation.enable()
+    yield instrumentation.INSTRUMENTATION
+    instrumentation.disable()
+    instrumentation.INSTRUMENTATION.reset()
+
+
+def test_disabled_spans_record_nothing():
+    registry = Instrumentation()
+    assert registry.span('stage') is NULL_SPAN
+    with registry.span('stage') as span:
+        span.add(rows_out=3)
+    registry.record('stage')
+    assert registry.summary() == {} and registry.records == []
+
+
+def test_nested_spans_record_both_stages(registry):
+    with instrumentation.field('field-1'):
+        with instrumentation.span('outer', rows_in=10) as outer:
+            with instrumentation.span('inner', rows_in=4) as inner:
+                time.sleep(0.01)
+                inner.add(rows_out=2)
+            with pytest.raises(ValueError):
+                with instrumentation.span('inner', field_id='field-2'):
+                    raise ValueError('no season')
+            outer.add(rows_out=1, ee_bytes=100)
+
+    # Inner spans finish, and are recorded, first
+    records = registry.records
+    assert [(record['stage'], record['field_id'], record['failures']) for record in records] == [
+        ('inner', 'field-1', 0), ('inner', 'field-2', 1), ('outer', 'field-1', 0)]
+    assert records[1]['error'] == 'ValueError: no season'
+    assert records[0]['wall_seconds'] >= 0.01
+    assert records[2]['wall_seconds'] >= records[0]['wall_seconds'] + records[1]['wall_seconds']
+
+    summary = registry.summary()
+    assert list(summary) == ['inner', 'outer']
+    assert summary['inner']['calls'] == 2 and summary['inner']['failures'] == 1
+    assert summary['inner']['rows_in'] == 4 and summary['inner']['rows_out'] == 2
+    assert summary['outer']['rows_out'] == 1 and summary['outer']['ee_bytes'] == 100
+    assert summary['inner']['wall_seconds_mean'] == pytest.approx(summary['inner']['wall_seconds'] / 2)
+
+
+def test_records_beyond_the_limit_only_update_the_totals():
+    registry = Instrumentation(enabled=True, max_records=3)
+    for _ in range(5):
+        registry.record('stage', rows_in=1)
+    assert len(registry.records) == 3 and registry.dropped == 2
+    assert registry.summary()['stage']['rows_in'] == 5
+
+
+def field_scenes(seed):
+    dates, curves, observed = synthetic_ndvi(1, seed=seed)
+    return resample_scenes(scene_table(dates, observed[0]))
+
+
+def test_worker_spans_are_drained_and_merged_into_the_parent(registry):
+    # The synthetic field of seed 0 has no valley before its peak, that of seed 1 has a whole season
+    params = dict(window_size=30, poly_order=3, order_ndvi=30, threshold=0.45)
+    with_season, without_season = field_scenes(1), field_scenes(0)
+    registry.reset()
+
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('fork')) as pool:
+        record, records = pool.submit(compute_field_instrumented, 'ok', with_season, **params).result()
+        with pytest.raises(ValueError, match='No peak') as failure:
+            pool.submit(compute_field_instrumented, 'no-season', without_season, **params).result()
+
+    # The parent recorded nothing itself; the worker spans arrive with the result or with the error
+    assert registry.records == []
+    assert 'pos_date' in record
+    stages = [span['stage'] for span in records]
+    assert {'smoothing.savitzky_golay', 'vos_pos', 'bos_eos', 'phenology_metrics'} <= set(stages)
+    assert {span['field_id'] for span in records} == {'ok'}
+    failed = failure.value.instrumentation_records
+    assert failed and {span['field_id'] for span in failed} == {'no-season'}
+    assert failed[-1]['failures'] == 1
+
+    registry.merge(records)
+    registry.merge(failed)
+    summary = registry.summary()
+    assert summary['vos_pos']['calls'] == 2
+    assert sum(totals['failures'] for totals in summary.values()) == sum(span['failures'] for span in failed) > 0
+    assert registry.drain() == records + failed
+    assert registry.records == [] and registry.summary() == {}
+
+
+def test_jsonl_appends_and_releases_the_records(registry, tmp_path):
+    path = tmp_path / 'spans.jsonl'
+    with instrumentation.span('hls.fetch', field_id=np.int64(7), rows_in=2):
+        pass
+    registry.write_jsonl(str(path))
+    assert registry.records == []
+    with instrumentation.span('bos_eos', field_id='field-8'):
+        pass
+    registry.write_jsonl(str(path))
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['stage'] for line in lines] == ['hls.fetch', 'bos_eos']
+    assert set(lines[0]) == {'stage', 'field_id', 'time', 'error', *COUNTERS}
+    # Field IDs that JSON cannot encode are written as strings
+    assert lines[0]['field_id'] == '7' and lines[0]['rows_in'] == 2 and lines[0]['error'] is None
+    # Totals are kept after the records are written
+    assert registry.summary()['hls.fetch']['calls'] == 1
+
+
+def test_prometheus_text_format(registry, tmp_path):
+    path = tmp_path / 'ndvi.prom'
+    registry.record('hls.fetch', wall_seconds=1.5, ee_bytes=2048)
+    registry.record('hls.fetch', wall_seconds=0.5, failed=True)
+    registry.record('bos_eos', rows_in=400, rows_out=2)
+    registry.write_prometheus(str(path))
+
+    lines = path.read_text().splitlines()
+    assert [path.name] == [entry.name for entry in tmp_path.iterdir()]
+    assert lines[0] == '# TYPE ndvi_stage_calls_total counter'
+    assert len(lines) == len(COUNTERS) * 3
+    samples = dict(line.rsplit(' ', 1) for line in lines if not line.startswith('#'))
+    assert samples['ndvi_stage_calls_total{stage="hls.fetch"}'] == '2'
+    assert samples['ndvi_stage_calls_total{stage="bos_eos"}'] == '1'
+    assert float(samples['ndvi_stage_wall_seconds_total{stage="hls.fetch"}']) == 2.0
+    assert samples['ndvi_stage_ee_bytes_total{stage="hls.fetch"}'] == '2048'
+    assert samples['ndvi_stage_failures_total{stage="hls.fetch"}'] == '1'
+    assert samples['ndvi_stage_rows_out_total{stage="bos_eos"}'] == '2'
+    # Every TYPE line precedes the samples of its metric
+    for name in COUNTERS:
+        metric = f'ndvi_stage_{name}_total'
+        positions = [index for index, line in enumerate(lines) if metric in line]
+        assert lines[positions[0]] == f'# TYPE {metric} counter'
+        assert positions == list(range(positions[0], positions[0] + 3))
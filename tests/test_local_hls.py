@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip('rasterio')
+
+from benchmarks.synthetic import synthetic_hls_scenes, synthetic_ndvi  # noqa: E402
+from src.controllers.local_hls import LocalHLS, find_scenes  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def tiles(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('tiles'))
+    dates, curves, observed = synthetic_ndvi(9, n_days=40, seed=1)
+    polygons, crs = synthetic_hls_scenes(directory, dates, observed, field_pixels=4, pixel_noise=0.0)
+    return directory, dates, observed, polygons, crs
+
+
+def observations(dates, observed):
+    return {(field, date.strftime('%Y%m%d')): observed[field, day]
+            for field, day in zip(*np.nonzero(~np.isnan(observed))) for date in [dates[day]]}
+
+
+def test_field_medians_match_the_observations(tiles):
+    directory, dates, observed, polygons, crs = tiles
+    local = LocalHLS(directory, polygons, crs=crs, reducers=('median', 'count', 'valid_fraction'))
+    raw = local.fetch_scenes()
+
+    # Cloudy field/scene pairs (Fmask cloud bit on every pixel) are dropped
+    expected = observations(dates, observed)
+    got = {(row.field_id, row.date): row.ndvi for row in raw.itertuples()}
+    assert set(got) == set(expected)
+    # Red/NIR are stored as integers, so NDVI is only exact to about 1e-3
+    np.testing.assert_allclose([got[key] for key in expected], list(expected.values()), atol=2e-3)
+    assert set(raw['ndvi_count']) == {16}
+    assert set(raw['valid_fraction']) == {1.0}
+
+
+def test_fmask_cloud_and_shadow_pixels_are_masked(tiles, tmp_path):
+    directory, dates, observed, polygons, crs = tiles
+    scene = next(scene for scene in find_scenes(directory) if (0, scene['date']) in observations(dates, observed))
+
+    # Copy the scene and flag the top half of field 0 as cloud and one pixel as cloud shadow
+    for band in ('B04', 'B05', 'Fmask'):
+        with rasterio.open(f"{directory}/{scene['id']}.{band}.tif") as src:
+            profile, data = src.profile, src.read(1)
+        if band == 'Fmask':
+            data[1:3, 1:5] = 1 << 1
+            data[4, 1] = 1 << 3
+        with rasterio.open(tmp_path / f"{scene['id']}.{band}.tif", 'w', **profile) as dst:
+            dst.write(data, 1)
+
+    raw = LocalHLS(str(tmp_path), polygons, crs=crs, reducers=('median', 'count', 'valid_fraction')).fetch_scenes()
+    field = raw[raw['field_id'] == 0].iloc[0]
+    assert field['ndvi_count'] == 7
+    assert field['valid_fraction'] == pytest.approx(7 / 16)
+
+    dropped = LocalHLS(str(tmp_path), polygons, crs=crs, min_valid_fraction=0.5).fetch_scenes()
+    assert 0 not in set(dropped['field_id'])
+    assert set(dropped['field_id']) == set(raw['field_id']) - {0}
+
+
+def test_polygons_are_rasterized_once_per_grid(tiles, monkeypatch):
+    directory, dates, observed, polygons, crs = tiles
+    calls = []
+    rasterize = LocalHLS.rasterize
+    monkeypatch.setattr(LocalHLS, 'rasterize', lambda self, dataset: calls.append(dataset.name) or rasterize(self, dataset))
+
+    local = LocalHLS(directory, polygons, crs=crs, workers=4)
+    local.fetch_scenes()
+    local.fetch_scenes()
+
+    assert len(find_scenes(directory)) > 1
+    assert len(calls) == 1
+    assert len(local.grids) == 1
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import observation_matrix, synthetic_ndvi
+from src.controllers.metrics_geometrics import (METRICS, BatchPhenologyMetrics, PhenologyMetrics, nanquantile_rows,
+                                                represented_days, weighted_days_above, weighted_quantile_rows)
+from src.controllers.phenology_batch import EVENTS, BatchPhenology, PhenologyEvents
+from src.controllers.smoothing import SavitzkyGolaySmoother, fill_gaps
+
+
+@pytest.fixture(scope='module')
+def fields():
+    """Smoothed daily series of random fields with their events; some fields have no season."""
+    dates, curves, observed = synthetic_ndvi(40, noise=0.04, seed=11)
+    ndvi = fill_gaps(observed)
+    smoothed = SavitzkyGolaySmoother(30, 3).smooth(ndvi)
+    events = BatchPhenology(dates, ndvi, smoothed, order_ndvi=20, threshold=0.45).execute_analysis()
+    return dates, smoothed, events
+
+
+def phenology_df(records, field):
+    return pd.DataFrame({'Date': [records.date(name)[field] for name in EVENTS],
+                         'Value': [records.value(name)[field] for name in EVENTS],
+                         'Phenologic': list(EVENTS)}).dropna()
+
+
+def test_batch_metrics_match_the_per_field_metrics(fields):
+    dates, smoothed, events = fields
+    records = PhenologyEvents.from_indexes(dates, smoothed, events)
+    batch = BatchPhenologyMetrics(records, dates, smoothed).compute()
+    assert list(batch.columns) == [column for column, *_ in METRICS]
+
+    complete = np.flatnonzero((events['bos_abs'] >= 0) & (events['eos_abs'] >= 0))
+    assert 25 < len(complete) < 40
+    for field in complete:
+        ndvi_df = pd.DataFrame({'date': pd.DatetimeIndex(dates), 'savitzky_golay': smoothed[field]})
+        metrics = PhenologyMetrics(phenology_df(records, field), ndvi_df)
+        for column, kind, start_event, end_event, label in METRICS:
+            if kind == 'days':
+                assert batch[column][field] == metrics.days_between(start_event, end_event)
+            elif kind == 'ndvi':
+                assert batch[column][field] == pytest.approx(metrics.vertical_difference(start_event, end_event))
+            else:
+                assert batch[column][field] == metrics.percentil_difference()
+    # The events of fields without a season are missing, not an error
+    assert batch.iloc[np.setdiff1d(np.arange(40), complete)].isna().all().all()
+
+
+def test_percentile_count_matches_pandas(fields):
+    dates, smoothed, events = fields
+    records = PhenologyEvents.from_indexes(dates, smoothed, events)
+    counts = BatchPhenologyMetrics(records, dates, smoothed).percentil_difference('vos_start', 'vos_end')
+
+    for field in np.flatnonzero(events['vos_start'] >= 0):
+        season = pd.Series(smoothed[field], index=pd.DatetimeIndex(dates))
+        season = season[records.date('vos_start')[field]:records.date('vos_end')[field]]
+        assert counts[field] == (season > season.quantile(0.85)).sum() > 0
+
+
+def test_missing_events_give_missing_metrics(fields):
+    dates, smoothed, events = fields
+    complete = np.flatnonzero(events['bos_abs'] >= 0)
+    # Fields of the same run where only BOS, only EOS or both are missing (-1)
+    events = {name: index.copy() for name, index in events.items()}
+    events['bos_abs'][complete[:2]] = -1
+    events['eos_abs'][complete[1:4]] = -1
+    records = PhenologyEvents.from_indexes(dates, smoothed, events)
+    batch = BatchPhenologyMetrics(records, dates, smoothed).compute()
+
+    for column, kind, start_event, end_event, label in METRICS:
+        expected = (events[start_event] < 0) | (events[end_event] < 0)
+        assert batch[column].isna().to_numpy()[complete].tolist() == expected[complete].tolist(), column
+    assert batch['ndvi_bos_abs_pos'].isna().to_numpy()[complete[:4]].tolist() == [True, True, False, False]
+
+    # The per-field metrics refuse a field without one of its events
+    ndvi_df = pd.DataFrame({'date': pd.DatetimeIndex(dates), 'savitzky_golay': smoothed[complete[0]]})
+    with pytest.raises(KeyError, match='bos_abs'):
+        PhenologyMetrics(phenology_df(records, complete[0]), ndvi_df).derivate_metrics()
+
+
+def test_unit_weights_give_the_nanquantile():
+    rng = np.random.default_rng(4)
+    values = rng.random((30, 25))
+    values[rng.random(values.shape) < 0.3] = np.nan
+    # A row with a single value
+    values[0] = np.nan
+    values[0, 3] = 0.5
+    for quantile in (0.0, 0.15, 0.5, 0.85, 1.0):
+        expected = np.nanquantile(values, quantile, axis=1)
+        np.testing.assert_allclose(nanquantile_rows(values, quantile), expected)
+        np.testing.assert_allclose(weighted_quantile_rows(values, np.ones(values.shape), quantile), expected)
+
+
+def test_integer_weights_repeat_the_samples():
+    rng = np.random.default_rng(5)
+    values = rng.random((30, 12))
+    values[rng.random(values.shape) < 0.3] = np.nan
+    weights = rng.integers(1, 6, size=values.shape).astype(float)
+    for quantile in (0.1, 0.5, 0.85):
+        expected = [np.nanquantile(np.repeat(row, counts.astype(int)), quantile) for row, counts in zip(values, weights)]
+        np.testing.assert_allclose(weighted_quantile_rows(values, weights, quantile), expected)
+
+
+def test_unit_weights_count_the_values_above_the_quantile():
+    rng = np.random.default_rng(6)
+    values = rng.random((30, 25))
+    values[rng.random(values.shape) < 0.3] = np.nan
+    for quantile in (0.5, 0.85, 0.9):
+        expected = (values > np.nanquantile(values, quantile, axis=1)[:, None]).sum(axis=1)
+        np.testing.assert_array_equal(weighted_days_above(values, np.ones(values.shape), quantile), expected)
+
+
+def test_days_above_count_the_days_after_the_quantile_position():
+    # Samples of 4 days: the 85th percentile position (16.15 of 0..19) falls in the last sample,
+    # so its days 17, 18 and 19 are above it, as on a daily series rising through the sample
+    values = np.array([[0.1, 0.2, 0.3, 0.4, 0.5]])
+    weights = np.full(values.shape, 4.0)
+    assert weighted_quantile_rows(values, weights, 0.85)[0] == 0.5
+    assert weighted_days_above(values, weights, 0.85)[0] == 3
+    # Position 13.3 falls in the fourth sample (days 12 to 15): days 14 and 15 and the last sample are above
+    assert weighted_days_above(values, weights, 0.7)[0] == 6
+    # Between two samples (position 15.2) the quantile is interpolated and whole samples count
+    assert 0.4 < weighted_quantile_rows(values, weights, 0.8)[0] < 0.5
+    assert weighted_days_above(values, weights, 0.8)[0] == 4
+
+
+def test_observation_dates_count_the_days_of_the_daily_series(fields):
+    dates, smoothed, events = fields
+    observed = ~np.isnan(synthetic_ndvi(40, noise=0.04, seed=11)[2])
+    observation_dates, values = observation_matrix(dates, np.where(observed, smoothed, np.nan))
+    events = {name: index.copy() for name, index in events.items()}
+    events['eos_abs'][np.flatnonzero(events['eos_abs'] >= 0)[:3]] = -1
+    records = PhenologyEvents.from_indexes(dates, smoothed, events)
+
+    for start_event, end_event in (('vos_start', 'vos_end'), ('eos_abs', 'bos_abs')):
+        daily = BatchPhenologyMetrics(records, dates, smoothed).percentil_difference(start_event, end_event)
+        sampled = BatchPhenologyMetrics(records, observation_dates, values).percentil_difference(start_event, end_event)
+        assert sampled.isna().tolist() == daily.isna().tolist()
+        # Only the days between the event dates and the first/last observation inside them differ
+        gap = (sampled - daily).dropna().to_numpy(dtype=int)
+        assert np.abs(gap).max() <= 2
+        assert abs(gap.mean()) < 1
+
+
+def test_represented_days():
+    days = np.array([[0.0, 1, 2, 3, 4, 5],
+                     [0.0, 4, 6, 14, 20, 21]])
+    window = np.array([[False, True, True, True, True, False],
+                       [True, False, True, True, True, False]])
+    weights = represented_days(days, window)
+
+    # Daily axis: one day per observation
+    np.testing.assert_array_equal(weights[0], [0, 1, 1, 1, 1, 0])
+    # Halfway to the neighbours in the window (day 4 is skipped); the ends stand for half a day outside
+    np.testing.assert_array_equal(weights[1], [0.5 + 3, 0, 3 + 4, 4 + 3, 3 + 0.5, 0])
+    np.testing.assert_array_equal(weights.sum(axis=1), [4, 21])
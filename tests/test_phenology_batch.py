@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import observation_matrix, synthetic_ndvi
+from src.controllers.phenology_batch import (BatchPhenology, PhenologyEvents, day_numbers, relative_extrema,
+                                             relative_extrema_days, take_dates, take_values)
+from src.controllers.smoothing import SavitzkyGolaySmoother, fill_gaps
+
+
+def test_day_extrema_match_daily_extrema_on_a_daily_axis():
+    rng = np.random.default_rng(0)
+    values = rng.random((20, 60))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    days = np.arange(60, dtype=float)
+    for comparator in (np.greater, np.less):
+        for order in (1, 3, 10):
+            expected = relative_extrema(values, comparator, order)
+            np.testing.assert_array_equal(relative_extrema_days(values, days, comparator, order), expected)
+
+
+@pytest.mark.parametrize('order', [1, 3, 7, 20])
+def test_day_extrema_match_daily_extrema_of_the_interpolated_series(order):
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        observed = rng.random(120) < rng.uniform(0.05, 0.5)
+        observed[rng.integers(10, 80):][:rng.integers(0, 50)] = False
+        observed[[0, -1]] = True
+        daily = np.where(observed, rng.random(120), np.nan)
+        days = np.flatnonzero(observed)
+        for comparator in (np.greater, np.less):
+            expected = relative_extrema(fill_gaps(daily[None]), comparator, order)[0][days]
+            got = relative_extrema_days(daily[days][None], days[None].astype(float), comparator, order)[0]
+            np.testing.assert_array_equal(got, expected)
+
+
+def test_samples_next_to_a_cloud_gap_are_compared_across_it():
+    # 8-day revisits with no observation between days 180 and 235
+    days = np.array([d for d in range(0, 361, 8) if not 180 <= d <= 235], dtype=float)
+    values = 0.5 + 0.3 * np.sin(2 * np.pi * days / 360)
+    peaks = relative_extrema_days(values[None], days, np.greater, order=30)[0]
+    valleys = relative_extrema_days(values[None], days, np.less, order=30)[0]
+    assert not (peaks & valleys).any()
+    assert days[valleys].tolist() == [272.0]
+    assert days[peaks].tolist() == [88.0]
+
+
+def test_padding_days_are_not_neighbours():
+    values = np.array([[0.2, 0.5, 0.3, 0.9, 0.1], [0.2, 0.5, 0.3, 0.0, 0.0]])
+    days = np.array([[0, 8, 16, 24, 32], [0, 8, 16, np.nan, np.nan]], dtype=float)
+    peaks = relative_extrema_days(values, days, np.greater, order=8)
+    np.testing.assert_array_equal(peaks, [[False, True, False, True, False], [False, True, False, False, False]])
+
+
+def test_fractional_positions_interpolate_dates_and_values():
+    dates = np.array([['2023-01-01', '2023-01-09', '2023-01-13'], ['2023-01-01', '2023-01-05', 'NaT']],
+                     dtype='datetime64[ns]')
+    values = np.array([[0.2, 0.6, 0.4], [0.1, 0.3, np.nan]])
+    index = np.array([0.5, 1.0])
+    np.testing.assert_array_equal(take_dates(dates, index).astype('datetime64[D]').astype(str),
+                                  ['2023-01-05', '2023-01-05'])
+    np.testing.assert_allclose(take_values(values, index), [0.4, 0.3])
+    np.testing.assert_array_equal(take_values(values, np.array([0, 2])), [0.2, np.nan])
+
+
+def daily_and_observation_engines(n_fields, seed):
+    dates, curves, observed = synthetic_ndvi(n_fields, seed=seed)
+    smoother = SavitzkyGolaySmoother(30, 3)
+    daily = fill_gaps(observed)
+    daily_engine = BatchPhenology(dates, daily, smoother.smooth(daily), order_ndvi=5, threshold=0.5)
+    observation_dates, values = observation_matrix(dates, observed)
+    smoothed = smoother.smooth(values, days=day_numbers(observation_dates))
+    return daily_engine, BatchPhenology(observation_dates, values, smoothed, order_ndvi=5, threshold=0.5)
+
+
+def test_absolute_bos_eos_on_observation_dates_are_the_daily_picks():
+    daily_engine, engine = daily_and_observation_engines(300, seed=3)
+    assert not engine.daily
+    events = engine.find_vos_pos()
+    found = events['vos_start'] >= 0
+
+    # The daily engine searches the same interval on the linearly interpolated series
+    daily_events = {name: np.where(found, np.searchsorted(daily_engine.dates, take_dates(engine.dates, index)), -1)
+                    for name, index in events.items()}
+    thresholds = [0.3, 0.5, 0.6]
+    expected = daily_engine.find_bos_eos_abs(daily_events, thresholds=thresholds)
+    got = engine.find_bos_eos_abs(events, thresholds=thresholds)
+    for name in ('bos_abs', 'eos_abs'):
+        assert got[name].dtype.kind == 'f'
+        assert (got[name][:, ~found] == -1).all()
+        for layer in range(len(thresholds)):
+            np.testing.assert_array_equal(take_dates(engine.dates, got[name][layer])[found],
+                                          daily_engine.dates[expected[name][layer]][found])
+
+
+def test_observation_dates_give_the_daily_events_within_a_few_days():
+    daily_engine, engine = daily_and_observation_engines(500, seed=0)
+    daily = PhenologyEvents.from_indexes(daily_engine.dates, daily_engine.smoothed, daily_engine.execute_analysis())
+    observations = PhenologyEvents.from_indexes(engine.dates, engine.smoothed, engine.execute_analysis())
+
+    both = ~np.isnat(daily.date('pos')) & ~np.isnat(observations.date('pos'))
+    assert both.mean() > 0.8
+    for name in ('bos_abs', 'eos_abs'):
+        gap = np.abs((daily.date(name) - observations.date(name))[both].astype('timedelta64[D]').astype(int))
+        assert np.median(gap) == 0
+        assert np.percentile(gap, 80) <= 3
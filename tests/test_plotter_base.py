@@ -0,0 +1,115 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('plotly')
+
+from benchmarks.synthetic import synthetic_ndvi  # noqa: E402
+from src.controllers.phenology_batch import EVENTS, BatchPhenology  # noqa: E402
+from src.controllers.plotter_base import MultiFieldPlotter, lttb  # noqa: E402
+from src.controllers.smoothing import SavitzkyGolaySmoother, fill_gaps  # noqa: E402
+
+
+def reference_lttb(x, y, n_points):
+    """Plain LTTB over the same buckets as ``lttb``, one triangle at a time."""
+    n = len(x)
+    edges = np.linspace(1, n - 1, n_points - 1).astype(int)
+    selected = [0]
+    for bucket in range(n_points - 2):
+        if bucket + 1 < n_points - 2:
+            following = slice(edges[bucket + 1], edges[bucket + 2])
+            next_x, next_y = x[following].mean(), y[following].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        px, py = x[selected[-1]], y[selected[-1]]
+        candidates = np.arange(edges[bucket], edges[bucket + 1])
+        areas = [abs((px - next_x) * (y[j] - py) - (px - x[j]) * (next_y - py)) for j in candidates]
+        selected.append(candidates[int(np.argmax(areas))])
+    return np.array(selected + [n - 1])
+
+
+@pytest.mark.parametrize('n, n_points', [(1000, 100), (1000, 3), (5000, 777), (50, 49)])
+def test_lttb_keeps_the_endpoints_and_returns_the_budget(n, n_points):
+    rng = np.random.default_rng(n_points)
+    x = np.sort(rng.random(n)) * 1000
+    y = np.sin(x / 50) + rng.normal(0, 0.2, n)
+    selected = lttb(x, y, n_points)
+
+    assert len(selected) == n_points
+    assert selected[0] == 0 and selected[-1] == n - 1
+    assert np.all(np.diff(selected) > 0)
+    np.testing.assert_array_equal(selected, reference_lttb(x, y, n_points))
+
+
+def test_lttb_keeps_peaks_and_skips_missing_values():
+    dates = pd.date_range('2022-10-01', periods=400, freq='D').to_numpy()
+    y = np.full(400, 0.3)
+    y[200] = 0.9
+    y[[0, 1, 399]] = np.nan
+
+    selected = lttb(dates, y, 20)
+    assert len(selected) == 20
+    # The endpoints are the first and last valid points
+    assert selected[0] == 2 and selected[-1] == 398
+    assert 200 in selected
+    assert not np.isnan(y[selected]).any()
+    # Short series are returned whole, without their missing values
+    np.testing.assert_array_equal(lttb(dates[:10], y[:10], 20), np.arange(2, 10))
+
+
+@pytest.fixture(scope='module')
+def fields():
+    dates, curves, observed = synthetic_ndvi(3, n_days=400, seed=2)
+    smoothed = SavitzkyGolaySmoother(30, 3).smooth(fill_gaps(observed))
+    ndvi_df = pd.concat([pd.DataFrame({
+        'field_id': f'field-{field}', 'date': dates, 'ndvi': fill_gaps(observed)[field],
+        'savitzky_golay': smoothed[field],
+        'id': np.where(np.isnan(observed[field]), None, 'HLS'),
+    }) for field in range(3)], ignore_index=True)
+    engine = BatchPhenology(dates, fill_gaps(observed), smoothed, order_ndvi=30, threshold=0.45)
+    events = engine.to_dataframe(engine.execute_analysis())
+    # The last field has no events row
+    events.insert(0, 'field_id', [f'field-{field}' for field in range(3)])
+    return ndvi_df, events.iloc[:2], observed
+
+
+def test_plot_field_traces(fields):
+    ndvi_df, events, observed = fields
+    plotter = MultiFieldPlotter(ndvi_df, events, max_points=100)
+    fig = plotter.plot_field('field-1')
+
+    names = [trace.name for trace in fig.data]
+    assert names == ['NDVI', 'Savitzky-Golay', 'HLS Images', *EVENTS]
+    assert {trace.type for trace in fig.data} == {'scattergl'}
+    assert len(fig.data[0].x) == len(fig.data[1].x) == 100
+    assert len(fig.data[2].x) == np.count_nonzero(~np.isnan(observed[1]))
+    pos = fig.data[names.index('pos')]
+    assert pos.y[0] == pytest.approx(events['pos_value'].iloc[1])
+    assert list(pos.text) == ['field-1']
+
+    # Without an events row the event traces are empty
+    fig = plotter.plot_field('field-2', webgl=False)
+    assert {trace.type for trace in fig.data} == {'scatter'}
+    assert all(pd.isna(list(trace.y)).all() for trace in fig.data[3:])
+
+
+def test_export_writes_one_file_per_field(fields, tmp_path):
+    ndvi_df, events, observed = fields
+    plotter = MultiFieldPlotter(ndvi_df, events, max_points=100)
+    paths = plotter.export(str(tmp_path), file_format='html', workers=2, chunk_size=2)
+
+    assert paths == [str(tmp_path / f'field-{field}.html') for field in range(3)]
+    for field, path in enumerate(paths):
+        assert os.path.getsize(path) > 0
+        text = open(path).read()
+        # The figure JSON is embedded in the page: HTML export keeps the WebGL traces
+        data, _ = json.JSONDecoder().raw_decode(text, text.index('[', text.index('Plotly.newPlot')))
+        # Fields without an events row are exported without event traces
+        expected = ['NDVI', 'Savitzky-Golay', 'HLS Images'] + (list(EVENTS) if field < 2 else [])
+        assert [trace['name'] for trace in data] == expected
+        assert {trace['type'] for trace in data} == {'scattergl'}
+        assert len(data[0]['x']) == 100
+        assert (f'"text":["field-{field}"]' in text) == (field < 2)
@@ -0,0 +1,33 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from src.controllers.results_store import PhenologyResultsWriter, read_results, season_of, season_years  # noqa: E402
+
+
+def test_season_years_start_at_the_season_start_month():
+    dates = np.array(['2022-06-30', '2022-07-01', '2023-01-15', '2023-06-30', '2023-07-01'], dtype='datetime64[D]')
+    assert season_years(dates).tolist() == [2022, 2022, 2023, 2023, 2023]
+    assert season_years(dates, season_start_month=7).tolist() == [2021, 2022, 2022, 2022, 2023]
+    assert season_of('2023-02-10', season_start_month=7) == 2022
+    assert season_of(np.datetime64('NaT')) is None
+    with pytest.raises(ValueError):
+        season_years(dates, season_start_month=13)
+
+
+def test_a_southern_summer_season_stays_in_one_partition(tmp_path):
+    # Both fields belong to the 2022/23 season, with POS on either side of the new year
+    table = pd.DataFrame({'field_id': ['b', 'c'],
+                          'pos_date': pd.to_datetime(['2022-12-20', '2023-02-05']),
+                          'pos_value': [0.8, 0.7]})
+    with PhenologyResultsWriter(str(tmp_path), season_start_month=7) as writer:
+        writer.add_record('a', {'pos_date': datetime.date(2023, 1, 10), 'pos_value': 0.9}, region='PR')
+        writer.add_table(table, region='PR')
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['season=2022']
+    df = read_results(str(tmp_path), columns=['field_id', 'season'], filters=[('season', '=', 2022)])
+    assert sorted(df['field_id']) == ['a', 'b', 'c']
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from src.controllers.seasons import MultiSeasonPhenology
+
+
+def yearly_cycles(days):
+    # Valleys near days 300, 600, 900 and 1200, peaks in between; the trend avoids ties
+    return 0.45 - 0.3 * np.cos(2 * np.pi * days / 300) + 1e-5 * days
+
+
+def test_seasons_on_observation_dates_match_the_daily_axis():
+    dates = pd.date_range('2019-01-01', periods=1280, freq='D')
+    days = np.arange(1280, dtype=float)
+    daily = np.tile(yearly_cycles(days), (3, 1))
+    expected = MultiSeasonPhenology(dates, daily, daily, order_ndvi=30, threshold=0.45).to_dataframe()
+
+    # 8-day revisits with a different phase per field, padded with NaT
+    columns = [np.arange(phase, 1280, 8) for phase in (0, 3, 6)]
+    width = max(len(column) for column in columns)
+    obs_dates = np.full((3, width), np.datetime64('NaT'), dtype='datetime64[ns]')
+    obs_values = np.full((3, width), np.nan)
+    for row, column in enumerate(columns):
+        obs_dates[row, :len(column)] = dates[column]
+        obs_values[row, :len(column)] = daily[row, column]
+    seasons = MultiSeasonPhenology(obs_dates, obs_values, obs_values, order_ndvi=30, threshold=0.45).to_dataframe()
+
+    assert len(expected) == 9
+    assert seasons['field_id'].tolist() == expected['field_id'].tolist()
+    assert seasons['season'].tolist() == expected['season'].tolist()
+    for name in ('vos_start', 'pos', 'vos_end'):
+        offset = (seasons[f'{name}_date'] - expected[f'{name}_date']).abs()
+        assert (offset <= pd.Timedelta(days=8)).all()
+
+
+def test_season_ends_at_the_lowest_valley_of_its_falling_limb():
+    knots = [0, 20, 80, 130, 140, 160, 220, 280, 300]
+    values = [0.5, 0.2, 0.8, 0.4, 0.45, 0.15, 0.8, 0.2, 0.5]
+    dates = pd.date_range('2022-01-01', periods=301, freq='D')
+    series = np.interp(np.arange(301), knots, values)
+    seasons = MultiSeasonPhenology(dates, series, series, order_ndvi=5, threshold=0.5).to_dataframe()
+
+    # The bump on day 140 rises less than min_amplitude, so the first season runs on to day 160
+    offsets = {name: (seasons[f'{name}_date'] - dates[0]).dt.days.tolist() for name in ('vos_start', 'pos', 'vos_end')}
+    assert offsets == {'vos_start': [20, 160], 'pos': [80, 220], 'vos_end': [160, 280]}
+    np.testing.assert_allclose(seasons['amplitude'], [0.6, 0.6])
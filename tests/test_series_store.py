@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.controllers.series_store import NDVISeriesStore
+
+DATES = pd.date_range('2023-01-01', periods=10, freq='D')
+
+
+def series(n_fields, offset=0.0):
+    return (offset + np.arange(n_fields)[:, None] + np.linspace(0, 0.9, len(DATES))).astype(np.float32)
+
+
+def test_append_and_reopen(tmp_path):
+    store = NDVISeriesStore.create(str(tmp_path), DATES, layers=('ndvi', 'savitzky_golay'), capacity=2)
+    assert store.append(['a', 'b'], series(2)) == slice(0, 2)
+    # Growing past the capacity keeps the rows already stored
+    assert store.append(['c', 'd', 'e'], series(3, offset=10)) == slice(2, 5)
+    assert store.capacity >= 5
+    with pytest.raises(ValueError):
+        store.append(['c'], series(1))
+    with pytest.raises(ValueError):
+        store.append(['f'], series(1), name='whittaker')
+
+    reopened = NDVISeriesStore(str(tmp_path), mode='r')
+    assert reopened.field_ids == ['a', 'b', 'c', 'd', 'e']
+    np.testing.assert_array_equal(reopened.layer(), np.vstack([series(2), series(3, offset=10)]))
+    np.testing.assert_array_equal(reopened.row('d'), series(3, offset=10)[1])
+    assert np.isnan(reopened.layer('savitzky_golay')).all()
+    assert reopened.to_dataframe('a')['date'].tolist() == list(DATES)
+
+
+def test_interrupted_append_does_not_shift_field_ids(tmp_path):
+    store = NDVISeriesStore.create(str(tmp_path), DATES)
+    store.append(['a', 'b'], series(2))
+    # A crash between writing the IDs and the metadata leaves orphan IDs, the last one partial
+    with open(tmp_path / 'fields.txt', 'a') as file:
+        file.write('lost-1\nlost-2\nlo')
+
+    assert NDVISeriesStore(str(tmp_path), mode='r').field_ids == ['a', 'b']
+    store = NDVISeriesStore(str(tmp_path))
+    assert store.field_ids == ['a', 'b']
+    store.append(['c'], series(1, offset=5))
+
+    reopened = NDVISeriesStore(str(tmp_path), mode='r')
+    assert reopened.field_ids == ['a', 'b', 'c']
+    np.testing.assert_array_equal(reopened.row('c'), series(1, offset=5)[0])
+    assert (tmp_path / 'fields.txt').read_text().splitlines() == ['a', 'b', 'c']
+
+
+def test_append_dataframe_aligns_on_the_date_axis(tmp_path):
+    store = NDVISeriesStore.create(str(tmp_path), DATES)
+    ndvi_df = pd.DataFrame({'date': [pd.Timestamp('2022-12-31'), pd.Timestamp('2023-01-02 13:00'),
+                                     pd.Timestamp('2023-01-05')],
+                            'ndvi': [0.9, 0.2, 0.5]})
+    store.append_dataframe(42, ndvi_df)
+
+    row = store.row('42')
+    assert row.dtype == np.float32
+    np.testing.assert_allclose(row[[1, 4]], [0.2, 0.5])
+    assert np.isnan(np.delete(row, [1, 4])).all()
+
+
+def test_added_layer_is_nan_until_written(tmp_path):
+    store = NDVISeriesStore.create(str(tmp_path), DATES)
+    store.append(['a', 'b'], series(2))
+    layer = store.add_layer('savitzky_golay')
+    assert layer.shape == (2, len(DATES)) and np.isnan(layer).all()
+    layer[:] = 1.0
+    store.flush()
+    assert NDVISeriesStore(str(tmp_path), mode='r').layer_names == ['ndvi', 'savitzky_golay']
+    assert (NDVISeriesStore(str(tmp_path), mode='r').layer('savitzky_golay') == 1.0).all()
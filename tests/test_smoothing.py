@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from src.controllers.smoothing import (SavitzkyGolaySmoother, WhittakerSmoother, fill_gaps, get_smoother,
+                                       savgol_filter, savgol_irregular)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    days = np.arange(120)
+    return 0.5 + 0.3 * np.sin(days / 15.0)[None] + rng.normal(0.0, 0.05, size=(6, 120))
+
+
+@pytest.mark.parametrize('window_size, poly_order', [(5, 2), (30, 3), (31, 3), (31, 0)])
+def test_savgol_filter_matches_scipy(series, window_size, poly_order):
+    signal = pytest.importorskip('scipy.signal')
+    np.testing.assert_allclose(savgol_filter(series, window_size, poly_order),
+                               signal.savgol_filter(series, window_size, poly_order, axis=1), atol=1e-10)
+
+
+def test_savgol_irregular_on_every_day_is_the_regular_filter(series):
+    days = np.arange(series.shape[1], dtype=float) + 19000
+    np.testing.assert_allclose(savgol_irregular(series, days, 31, 3), savgol_filter(series, 31, 3), atol=1e-10)
+
+
+def test_savgol_irregular_filters_the_interpolated_daily_series(series):
+    rng = np.random.default_rng(1)
+    observed = np.where(rng.random(series.shape) < 0.3, series, np.nan)
+    observed[:, [0, -1]] = series[:, [0, -1]]
+    daily = savgol_filter(fill_gaps(observed), 31, 3)
+
+    # Each row keeps its own observation days, left-aligned with NaN padding
+    width = (~np.isnan(observed)).sum(axis=1).max()
+    days = np.full((len(observed), width), np.nan)
+    values = np.full((len(observed), width), np.nan)
+    for row, sample in enumerate(observed):
+        columns = np.flatnonzero(~np.isnan(sample))
+        days[row, :len(columns)], values[row, :len(columns)] = columns, sample[columns]
+
+    smoothed = savgol_irregular(values, days, 31, 3)
+    dated = ~np.isnan(days)
+    np.testing.assert_allclose(smoothed[dated], daily[np.nonzero(dated)[0], days[dated].astype(int)], atol=1e-10)
+    assert np.isnan(smoothed[~dated]).all()
+
+
+def test_savitzky_golay_gaps_and_zero_weights(series):
+    smoother = SavitzkyGolaySmoother(31, 3)
+    gapped = series.copy()
+    gapped[:, 40:60] = np.nan
+    gapped[2] = np.nan
+    weights = np.ones(series.shape)
+    weights[:, 40:60] = 0.0
+
+    smoothed = smoother.smooth(gapped)
+    np.testing.assert_allclose(smoothed[[0, 1]], savgol_filter(fill_gaps(gapped[[0, 1]]), 31, 3))
+    assert np.isnan(smoothed[2]).all()
+    # Zero-weight observations are gaps
+    np.testing.assert_array_equal(smoother.smooth(series, weights=weights)[[0, 1]], smoothed[[0, 1]])
+    assert smoother.smooth(series.astype(np.float32)).dtype == np.float32
+
+
+def dense_whittaker(values, weights, lmbda, d):
+    difference = np.diff(np.eye(len(values)), d, axis=0)
+    return np.linalg.solve(np.diag(weights) + lmbda * difference.T @ difference, weights * values)
+
+
+@pytest.mark.parametrize('lmbda, d', [(100.0, 2), (10.0, 1), (1000.0, 3)])
+def test_whittaker_matches_the_dense_solve(series, lmbda, d):
+    rng = np.random.default_rng(2)
+    weights = rng.uniform(0.2, 1.0, size=series.shape)
+    smoothed = WhittakerSmoother(lmbda, d, chunk_size=4).smooth(series, weights)
+    for row in range(len(series)):
+        np.testing.assert_allclose(smoothed[row], dense_whittaker(series[row], weights[row], lmbda, d), atol=1e-8)
+
+
+def test_whittaker_gaps_and_zero_weights(series):
+    smoother = WhittakerSmoother(100.0, 2)
+    gapped = series.copy()
+    gapped[:, 40:60] = np.nan
+    gapped[2, 1:] = np.nan
+    weights = np.where(np.isnan(gapped), 0.0, 1.0)
+
+    smoothed = smoother.smooth(gapped)
+    # NaN observations get weight 0, and the smoother fills them
+    expected = dense_whittaker(np.nan_to_num(gapped[0]), weights[0], 100.0, 2)
+    np.testing.assert_allclose(smoothed[0], expected, atol=1e-8)
+    assert not np.isnan(smoothed[0, 40:60]).any()
+    np.testing.assert_allclose(smoother.smooth(series, weights=weights)[0], smoothed[0], atol=1e-12)
+    # Fewer than d observations leave the system singular
+    assert np.isnan(smoothed[2]).all()
+
+
+def test_whittaker_on_observation_dates_uses_the_daily_grid(series):
+    smoother = WhittakerSmoother(100.0, 2)
+    days = np.arange(0, series.shape[1], 4, dtype=float)
+    daily = np.full(series.shape, np.nan)
+    daily[:, days.astype(int)] = series[:, days.astype(int)]
+    np.testing.assert_allclose(smoother.smooth(series[:, days.astype(int)], days=days),
+                               smoother.smooth(daily)[:, days.astype(int)], atol=1e-12)
+
+
+def test_get_smoother_by_name():
+    assert isinstance(get_smoother('whittaker', lmbda=10.0), WhittakerSmoother)
+    with pytest.raises(ValueError):
+        get_smoother('loess')
@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_ndvi
+from src.controllers.smoothing import fill_gaps
+from src.controllers.sweep import ParameterSweep
+
+
+def test_gapped_series_are_filled_like_the_daily_resampling():
+    dates, curves, observed = synthetic_ndvi(40, seed=3)
+    grid = dict(smoothing=[(21, 2), (31, 3)], orders=[10, 20], thresholds=[0.35, 0.45])
+
+    gapped = ParameterSweep(dates, observed, **grid).run()
+    filled = ParameterSweep(dates, fill_gaps(observed), **grid).run()
+
+    pd.testing.assert_frame_equal(gapped, filled)
+    assert gapped['bos_abs_date'].notna().mean() > 0.5
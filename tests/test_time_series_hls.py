@@ -0,0 +1,110 @@
+import ee
+import pandas as pd
+import pytest
+
+from benchmarks import fake_ee
+from src.controllers.time_series_hls import HLSMultiField
+
+
+@pytest.fixture
+def features(scenes):
+    collection = []
+    for field_id, observations in enumerate([
+        {'20230105': (0.2, 0.1, 1.0), '20230113': (0.3, 0.1, 0.4), '20230121': (0.5, 0.2, 0.9)},
+        {'20230105': (0.4, 0.3, 0.6), '20230121': (0.6, 0.2, 1.0)},
+        {'20230113': (0.7, 0.4, 0.2)},
+    ]):
+        geometry = ee.Geometry.Polygon([[[field_id, 0], [field_id + 1, 0], [field_id + 1, 1], [field_id, 0]]])
+        dates = list(observations)
+        scenes[geometry.serialize()] = pd.DataFrame({
+            'date': dates,
+            'id': [f'HLS_{date}T000000_{field_id}' for date in dates],
+            'ndvi': [observations[date][0] for date in dates],
+            'b4': [observations[date][1] for date in dates],
+            'valid_fraction': [observations[date][2] for date in dates],
+        })
+        collection.append(ee.Feature(geometry, {'field_id': field_id}))
+    return ee.FeatureCollection(collection)
+
+
+def test_features_are_paged_and_converted(features, monkeypatch):
+    pages = []
+    to_list = fake_ee.FakeFeatureCollection.toList
+    monkeypatch.setattr(fake_ee.FakeFeatureCollection, 'toList',
+                        lambda self, count, offset=0: pages.append((count, offset)) or to_list(self, count, offset))
+    hls = HLSMultiField(features, '2023-01-01', '2023-02-01', page_size=2)
+    fetched = hls.fetch_features()
+
+    assert pages == [(2, 0), (2, 2), (2, 4)]
+    assert len(fetched) == 6
+
+    df = hls.features_to_dataframe(fetched).sort_values(['field_id', 'date'], ignore_index=True)
+    assert list(df.columns) == ['field_id', 'date', 'id', 'ndvi']
+    assert df['field_id'].tolist() == [0, 0, 0, 1, 1, 2]
+    assert df['date'].tolist() == ['20230105', '20230113', '20230121', '20230105', '20230121', '20230113']
+    assert df['ndvi'].tolist() == [0.2, 0.3, 0.5, 0.4, 0.6, 0.7]
+    assert df['id'].tolist() == ['HLS_20230105T000000', 'HLS_20230113T000000', 'HLS_20230121T000000',
+                                 'HLS_20230105T000000', 'HLS_20230121T000000', 'HLS_20230113T000000']
+
+
+def test_extra_bands_and_statistics_become_columns(features):
+    hls = HLSMultiField(features, '2023-01-01', '2023-02-01', bands=('NDVI', 'B4'), reducers=('median', 'count'))
+    df = hls.features_to_dataframe(hls.fetch_features()).sort_values(['field_id', 'date'], ignore_index=True)
+
+    assert list(df.columns) == ['field_id', 'date', 'id', 'ndvi', 'ndvi_count', 'b4_median', 'b4_count']
+    assert df['ndvi'].tolist() == [0.2, 0.3, 0.5, 0.4, 0.6, 0.7]
+    assert df['b4_median'].tolist() == [0.1, 0.1, 0.2, 0.3, 0.2, 0.4]
+    assert df['ndvi_count'].tolist() == [1] * 6
+
+
+def test_low_coverage_scenes_are_dropped(features):
+    hls = HLSMultiField(features, '2023-01-01', '2023-02-01', reducers=('median', 'valid_fraction'),
+                        min_valid_fraction=0.5)
+    df = hls.features_to_dataframe(hls.fetch_features()).sort_values(['field_id', 'date'], ignore_index=True)
+
+    assert df['field_id'].tolist() == [0, 0, 1, 1]
+    assert df['valid_fraction'].tolist() == [1.0, 0.9, 0.6, 1.0]
+
+
+def test_convert_to_dataframe_keeps_observation_dates(features):
+    ndvi_df = HLSMultiField(features, '2023-01-01', '2023-02-01', page_size=4).convert_to_dataframe(daily=False)
+    assert ndvi_df.groupby('field_id').size().tolist() == [3, 2, 1]
+
+
+def test_bands_must_include_ndvi(features):
+    with pytest.raises(ValueError, match='NDVI'):
+        HLSMultiField(features, '2023-01-01', '2023-02-01', bands=('B4',))
+
+
+def test_extra_statistics_survive_the_conversion(features, scenes):
+    # A scene without a B4 value is kept, a scene without NDVI is dropped
+    field_0, field_1 = list(scenes.values())[:2]
+    field_0.loc[field_0['date'] == '20230113', 'b4'] = float('nan')
+    field_1.loc[field_1['date'] == '20230105', 'ndvi'] = float('nan')
+    hls = HLSMultiField(features, '2023-01-01', '2023-02-01', bands=('NDVI', 'B4'),
+                        reducers=('median', 'count', 'valid_fraction'), min_valid_fraction=0.5)
+
+    ndvi_df = hls.convert_to_dataframe(daily=False)
+    assert list(ndvi_df.columns) == ['field_id', 'date', 'id', 'ndvi', 'ndvi_count', 'b4_median', 'b4_count',
+                                     'valid_fraction', 'satellite', 'timestamps']
+    # Field 0 loses 20230113 to the coverage filter only, field 1 its scene without NDVI
+    assert ndvi_df['field_id'].tolist() == [0, 0, 1]
+    assert ndvi_df['date'].dt.strftime('%Y%m%d').tolist() == ['20230105', '20230121', '20230121']
+    assert ndvi_df['ndvi'].tolist() == [0.2, 0.5, 0.6]
+    assert ndvi_df['b4_median'].tolist() == [0.1, 0.2, 0.2]
+    assert ndvi_df['valid_fraction'].tolist() == [1.0, 0.9, 1.0]
+
+    hls.min_valid_fraction = None
+    ndvi_df = hls.convert_to_dataframe(daily=False)
+    field = ndvi_df[ndvi_df['field_id'] == 0]
+    assert field['ndvi'].tolist() == [0.2, 0.3, 0.5]
+    assert field['b4_median'].isna().tolist() == [False, True, False]
+    assert field['valid_fraction'].tolist() == [1.0, 0.4, 0.9]
+
+    daily_df = hls.convert_to_dataframe(daily=True)
+    field = daily_df[daily_df['field_id'] == 0].set_index('date')
+    assert len(field) == 17
+    # Extra statistics are interpolated like NDVI, across the missing B4 value too
+    assert field.loc['2023-01-13', 'ndvi'] == pytest.approx(0.3)
+    assert field.loc['2023-01-13', 'b4_median'] == pytest.approx(0.15)
+    assert field.loc['2023-01-09', 'valid_fraction'] == pytest.approx(0.7)